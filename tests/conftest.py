@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+MODELS = {"Basic": ["Front", "Back"], "vocabsieve-notes": ["Word", "Sentence", "Definition"]}
+
+
+class FakeAnkiConnect(BaseHTTPRequestHandler):
+    "Minimal stand-in for the AnkiConnect add-on"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def handle_action(self, action, params):
+        if action == "version":
+            return {"result": 6, "error": None}
+        if action == "modelFieldNames":
+            if params["modelName"] not in self.server.models:
+                return {"result": None, "error": "model was not found: " + params["modelName"]}
+            return {"result": self.server.models[params["modelName"]], "error": None}
+        if action == "notesInfo":
+            return {"result": [self.server.notes.get(note, {"noteId": note}) for note in params["notes"]],
+                    "error": None}
+        if action == "notesModTime":
+            return {"result": [{"noteId": note, "mod": self.server.notes[note]["mod"]}
+                               for note in params["notes"] if note in self.server.notes],
+                    "error": None}
+        if action == "deckNames":
+            return {"result": self.server.decks, "error": None}
+        if action == "modelNames":
+            return {"result": list(self.server.models), "error": None}
+        if action == "findNotes":
+            return {"result": self.server.found.get(params["query"], []), "error": None}
+        if action == "addNote":
+            return self.add_note(params["note"])
+        if action == "addNotes":
+            results = [self.add_note(note) for note in params["notes"]]
+            errors = [result["error"] for result in results if result["error"]]
+            if errors:
+                return {"result": None, "error": str(errors)}
+            return {"result": [result["result"] for result in results], "error": None}
+        if action == "multi":
+            return {"result": [self.handle_action(a["action"], a.get("params", {})) for a in params["actions"]],
+                    "error": None}
+        return {"result": None, "error": "unsupported action"}
+
+    def add_note(self, note):
+        first_field = next(iter(note["fields"].values()), "")
+        allow_duplicate = note.get("options", {}).get("allowDuplicate", False)
+        if not allow_duplicate and any(
+                next(iter(added["fields"].values()), "") == first_field for added in self.server.added.values()):
+            return {"result": None, "error": "cannot create note because it is a duplicate"}
+        note_id = len(self.server.added) + 1
+        self.server.added[note_id] = note
+        return {"result": note_id, "error": None}
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.actions.append(body["action"])
+        data = json.dumps(self.handle_action(body["action"], body.get("params", {}))).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeAnkiConnect)
+    httpd.connections = set()
+    httpd.actions = []
+    httpd.models = dict(MODELS)
+    httpd.decks = ["Default"]
+    httpd.notes = {}
+    httpd.added = {}
+    httpd.found = {}  # findNotes query -> note ids
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
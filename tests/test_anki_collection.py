@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+import pytest
+from PyQt5.QtCore import QSettings
+
+from vocabsieve.record import Record
+from vocabsieve.anki_collection import AnkiCollection, UnsupportedQuery
+
+# note id, note type id, deck id, fields, card type, interval
+NOTES = [
+    (1, 100, 10, ["Haus", "Das Haus ist groß"], 2, 30),
+    (2, 100, 10, ["Baum", "Ein Baum"], 2, 5),
+    (3, 100, 11, ["Auto", "Mein Auto"], 0, 0),
+    (4, 200, 10, ["Hund", "Der Hund"], 2, 100),
+]
+
+
+def make_collection(path, legacy):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, mid INTEGER, mod INTEGER, flds TEXT)")
+    conn.execute("CREATE TABLE cards (id INTEGER PRIMARY KEY, nid INTEGER, did INTEGER, "
+                 "type INTEGER, queue INTEGER, ivl INTEGER, reps INTEGER, lapses INTEGER, factor INTEGER)")
+    for nid, mid, did, fields, card_type, ivl in NOTES:
+        conn.execute("INSERT INTO notes VALUES (?,?,?,?)", (nid, mid, 1000 + nid, "\x1f".join(fields)))
+        conn.execute("INSERT INTO cards VALUES (?,?,?,?,?,?,0,0,2500)", (nid, nid, did, card_type, card_type, ivl))
+    if legacy:
+        conn.execute("CREATE TABLE col (models TEXT, decks TEXT)")
+        models = {"100": {"name": "Vocab", "flds": [{"name": "Sentence", "ord": 1}, {"name": "Word", "ord": 0}]},
+                  "200": {"name": "Other", "flds": [{"name": "Front", "ord": 0}, {"name": "Back", "ord": 1}]}}
+        decks = {"10": {"name": "German"}, "11": {"name": "German::Cars"}}
+        conn.execute("INSERT INTO col VALUES (?,?)", (json.dumps(models), json.dumps(decks)))
+    else:
+        conn.execute("CREATE TABLE notetypes (id INTEGER PRIMARY KEY, name TEXT COLLATE NOCASE)")
+        conn.execute("CREATE TABLE fields (ntid INTEGER, ord INTEGER, name TEXT)")
+        conn.execute("CREATE TABLE decks (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO notetypes VALUES (?,?)", [(100, "Vocab"), (200, "Other")])
+        conn.executemany("INSERT INTO fields VALUES (?,?,?)",
+                         [(100, 1, "Sentence"), (100, 0, "Word"), (200, 0, "Front"), (200, 1, "Back")])
+        conn.executemany("INSERT INTO decks VALUES (?,?)", [(10, "German"), (11, "German\x1fCars")])
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_collection(tmp_path, legacy):
+    path = str(tmp_path / "collection.anki2")
+    make_collection(path, legacy)
+    with AnkiCollection(path) as collection:
+        assert collection.findNotes("prop:ivl>=14") == [1, 4]
+        assert collection.findNotes("prop:ivl<14 is:review") == [2]
+        assert collection.findNotes("deck:German") == [1, 2, 3, 4]
+        assert collection.findNotes('"deck:german::cars"') == [3]
+        assert collection.findNotes("note:Vocab -is:new") == [1, 2]
+        with pytest.raises(UnsupportedQuery):
+            collection.findNotes("tag:vocab")
+
+        assert collection.notesModTime([1, 2]) == {1: 1001, 2: 1002}
+        [infos] = list(collection.iterNotesInfo([1]))
+        assert infos == [{"noteId": 1, "mod": 1001, "modelName": "Vocab",
+                          "fields": {"Word": {"value": "Haus", "order": 0},
+                                     "Sentence": {"value": "Das Haus ist groß", "order": 1}}}]
+
+
+def test_collection_note_lemmas(tmp_path):
+    path = str(tmp_path / "collection.anki2")
+    make_collection(path, legacy=False)
+    rec = Record(QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat), tmp_path)
+    with AnkiCollection(path) as collection:
+        lemmas = rec.getAnkiNoteLemmas(collection, [1, 4], {"Vocab": ["Word", "Sentence"]}, "xx")
+    assert lemmas == {1: ("Haus", ["Das", "groß", "ist"]), 4: ("", [])}
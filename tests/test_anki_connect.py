@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from vocabsieve.anki_connect import AnkiConnect, AnkiConnectError
+from vocabsieve.tools import iterNotesInfo
+
+
+def make_client(server):
+    return AnkiConnect(server.url)
+
+
+def test_invoke_reuses_connection(server):
+    client = make_client(server)
+    for _ in range(5):
+        assert client.invoke("version") == 6
+    assert len(server.connections) == 1
+    stats = client.stats()["version"]
+    assert stats.calls == 5
+    assert stats.errors == 0
+    assert stats.max_time >= stats.average_time > 0
+
+
+def test_error(server):
+    client = make_client(server)
+    with pytest.raises(AnkiConnectError, match="model was not found"):
+        client.invoke("modelFieldNames", modelName="Missing")
+
+
+def test_multi(server):
+    client = make_client(server)
+    results = client.multi([("modelFieldNames", {"modelName": name}) for name in server.models])
+    assert results == list(server.models.values())
+    assert server.actions == ["multi"]
+    assert client.multi([]) == []
+    with pytest.raises(AnkiConnectError):
+        client.multi([("version", {}), ("modelFieldNames", {"modelName": "Missing"})])
+
+
+def test_concurrent_calls_are_batched(server):
+    client = make_client(server)
+    release = threading.Event()
+    post = client._post
+
+    def slow_post(action, payload):
+        if action == "version":
+            release.wait(5)
+        return post(action, payload)
+
+    client._post = slow_post
+    results = {}
+
+    def call(name):
+        try:
+            results[name] = client.invoke("modelFieldNames", modelName=name)
+        except AnkiConnectError as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=client.invoke, args=("version",))]
+    threads[0].start()
+    while not client._sending:
+        time.sleep(0.001)
+    # Queued while the first request is running
+    names = [*server.models, "Missing"]
+    threads.extend(threading.Thread(target=call, args=(name,)) for name in names)
+    for thread in threads[1:]:
+        thread.start()
+    while len(client._pending) < len(names):
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert server.actions == ["version", "multi"]
+    assert {name: results[name] for name in server.models} == server.models
+    assert isinstance(results["Missing"], AnkiConnectError)
+
+
+def test_iter_notes_info(server):
+    chunks = list(iterNotesInfo(server.url, list(range(25)), chunk_size=10, max_requests=2))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert [info["noteId"] for chunk in chunks for info in chunk] == list(range(25))
+    assert server.actions == ["notesInfo"] * 3
@@ -0,0 +1,30 @@
+from PyQt5.QtCore import QSettings
+import vocabsieve.anki_health
+from vocabsieve.anki_health import AnkiHealthMonitor, HEALTH_CHECK_INTERVAL, HEALTH_MAX_DELAY
+
+
+def test_anki_health(tmp_path, server, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("anki_api", "http://127.0.0.1:1")
+    monkeypatch.setattr(vocabsieve.anki_health, "settings", settings)
+    monitor = AnkiHealthMonitor()
+    states = []
+    monitor.stateChanged.connect(lambda available, version: states.append((available, version)))
+    assert monitor.available is None
+
+    # Probes are spaced out more and more while Anki is unreachable
+    assert not monitor.probe()
+    first_delay = monitor.nextDelay()
+    assert not monitor.probe()
+    assert monitor.nextDelay() == 2 * first_delay
+    for _ in range(10):
+        monitor.probe()
+    assert monitor.nextDelay() == HEALTH_MAX_DELAY
+    assert states == [(False, None)]
+
+    settings.setValue("anki_api", server.url)
+    assert monitor.probe()
+    assert monitor.available
+    assert monitor.version == 6
+    assert monitor.nextDelay() == HEALTH_CHECK_INTERVAL
+    assert states == [(False, None), (True, 6)]
@@ -0,0 +1,36 @@
+from PyQt5.QtCore import QSettings
+import vocabsieve.anki_schema
+from vocabsieve.anki_schema import AnkiSchema
+
+
+def test_anki_schema(tmp_path, server, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("anki_api", server.url)
+    monkeypatch.setattr(vocabsieve.anki_schema, "settings", settings)
+    server.decks = ["Default", "German"]
+
+    schema = AnkiSchema()
+    assert schema.noteTypes() == []
+    updates = []
+    schema.updated.connect(lambda: updates.append(True))
+    assert schema.refresh()
+    assert schema.decks() == ["Default", "German"]
+    assert schema.fields("Basic") == ["Front", "Back"]
+    assert len(updates) == 1
+
+    # Served from the settings without asking Anki
+    server.actions.clear()
+    schema = AnkiSchema()
+    assert schema.noteTypes() == list(server.models)
+    assert schema.fields("vocabsieve-notes") == ["Word", "Sentence", "Definition"]
+    assert server.actions == []
+
+    # Note types created after the last refresh are requested once
+    server.models["New"] = ["A", "B"]
+    assert schema.fields("New") == ["A", "B"]
+    assert schema.fields("New") == ["A", "B"]
+    assert server.actions == ["modelFieldNames"]
+
+    # Changing the AnkiConnect address invalidates the cache
+    settings.setValue("anki_api", "http://127.0.0.1:1")
+    assert schema.decks() == []
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import vocabsieve.audio_cache
+from PyQt5.QtCore import QCoreApplication, QSettings
+from vocabsieve.audio_cache import (audio_cache_path, download_audio, prefetch_audios, AudioCache,
+                                    AUDIO_PREFETCH_COUNT)
+
+
+class AudioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+        time.sleep(0.05)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.path)))
+        self.end_headers()
+        self.wfile.write(self.path.encode())
+
+
+def test_audio_cache(tmp_path, monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), AudioHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setattr(vocabsieve.audio_cache, "forvopath", str(tmp_path))
+    monkeypatch.setattr(vocabsieve.audio_cache, "audio_cache", AudioCache(str(tmp_path)))
+    try:
+        # Concurrent downloads of the same file make one request
+        fpath = audio_cache_path("user::x/word.mp3", "de")
+        assert fpath == os.path.join(str(tmp_path), "de", "user__x/word.mp3")
+        threads = [threading.Thread(target=download_audio, args=(f"{url}/word.mp3", fpath)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert httpd.requests == ["/word.mp3"]
+        assert open(fpath, "rb").read() == b"/word.mp3"
+        assert download_audio(f"{url}/word.mp3", fpath) == fpath
+        assert len(httpd.requests) == 1
+
+        audios = {f"user{i}/word.mp3": f"https://example.invalid/{i}.mp3" for i in range(5)}
+        audios["local/word.mp3"] = "/tmp/word.mp3"
+        # Only https URLs are prefetched, they are sent to the test server instead
+        monkeypatch.setattr(vocabsieve.audio_cache, "download_audio",
+                            lambda u, p: download_audio(u.replace("https://example.invalid", url), p))
+        futures = prefetch_audios(audios, "de")
+        assert len(futures) == AUDIO_PREFETCH_COUNT
+        for i, future in enumerate(futures):
+            assert future.result(5) == audio_cache_path(f"user{i}/word.mp3", "de")
+        assert sorted(httpd.requests[1:]) == [f"/{i}.mp3" for i in range(AUDIO_PREFETCH_COUNT)]
+    finally:
+        httpd.shutdown()
+
+
+def test_audio_cache_eviction(tmp_path, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("audio_cache_max_mb", 1)
+    settings.setValue("audio_cache_max_files", 5)
+    monkeypatch.setattr(vocabsieve.audio_cache, "settings", settings)
+    cache = AudioCache(str(tmp_path / "forvo"))
+    paths = [str(tmp_path / "forvo" / "de" / f"{i}.mp3") for i in range(5)]
+    os.makedirs(os.path.dirname(paths[0]))
+    for i, path in enumerate(paths):
+        with open(path, "wb") as f:
+            f.write(b"x" * 1000)
+        os.utime(path, (1000 + i, 1000 + i))
+    # The first scan runs in the background and is reported by signal, queued to this thread
+    app = QCoreApplication.instance() or QCoreApplication([])
+    assert cache.cachedUsage() is None
+    reported = []
+    cache.usageChanged.connect(reported.append)
+    cache.usageInBackground()
+    deadline = time.time() + 5
+    while not reported and time.time() < deadline:
+        app.processEvents()
+    assert reported == [(5000, 5)]
+    assert cache.cachedUsage() == cache.usage() == (5000, 5)
+    assert cache.evict() == 0
+
+    # The oldest file is used by a note that was not sent yet, the second oldest was played
+    cache.protected = lambda: {paths[0]}
+    cache.touch(paths[1])
+    new = str(tmp_path / "forvo" / "de" / "new.mp3")
+    with open(new, "wb") as f:
+        f.write(b"x" * 1000)
+    cache.added(1000)
+    remaining = sorted(os.listdir(tmp_path / "forvo" / "de"))
+    assert remaining == ["0.mp3", "1.mp3", "4.mp3", "new.mp3"]
+    assert cache.usage() == (4000, 4)
+
+
+def test_audio_player(tmp_path, monkeypatch):
+    import pytest
+    pytest.importorskip("PyQt5.QtMultimedia", exc_type=ImportError)
+    from PyQt5.QtCore import QCoreApplication
+    import vocabsieve.audio_player
+    from vocabsieve.audio_player import AudioPlayer
+    app = QCoreApplication.instance() or QCoreApplication([])
+    monkeypatch.setattr(vocabsieve.audio_player, "audio_cache_path", lambda name, lang: str(tmp_path / name))
+    release = threading.Event()
+
+    def slow_download(url, fpath):
+        release.wait(5)
+        return fpath
+    monkeypatch.setattr(vocabsieve.audio_player, "download_audio", slow_download)
+    player = AudioPlayer()
+    played = []
+    monkeypatch.setattr(player, "crossplatform_play_sound", played.append)
+    audios = {"a.mp3": "https://example.invalid/a.mp3", "b.mp3": "https://example.invalid/b.mp3"}
+
+    # Playing does not wait for the download
+    start = time.monotonic()
+    assert player.play_audio("a.mp3", audios, "de") == str(tmp_path / "a.mp3")
+    assert player.play_audio("b.mp3", audios, "de") == str(tmp_path / "b.mp3")
+    assert time.monotonic() - start < 1
+    assert played == []
+    release.set()
+    deadline = time.monotonic() + 5
+    while not played and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    time.sleep(0.1)
+    app.processEvents()
+    # Only the file selected last is played
+    assert played == [str(tmp_path / "b.mp3")]
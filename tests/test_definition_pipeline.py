@@ -0,0 +1,111 @@
+import threading
+import time
+from PyQt5.QtCore import QCoreApplication
+from vocabsieve.definition_pipeline import DefinitionPipeline
+from vocabsieve.lookup_executor import ONLINE_SOURCE_CONCURRENCY
+from vocabsieve.models import (AudioLookupResult, AudioSource, DictionarySource, DisplayMode, LemmaPolicy,
+                               LookupResult, SourceOptions)
+
+OPTIONS = SourceOptions(LemmaPolicy.no_lemma, DisplayMode.raw, 0, 0)
+
+
+class SlowDictionary(DictionarySource):
+    def __init__(self, name, entries, delay=0.01):
+        super().__init__(name, "en", OPTIONS)
+        self.entries = entries
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def _lookup(self, word):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if word in self.entries:
+            return LookupResult(definition=self.entries[word])
+        return LookupResult(error="not found")
+
+
+class FakeAudio(AudioSource):
+    INTERNET = False
+
+    def __init__(self):
+        super().__init__("audio", "en", LemmaPolicy.no_lemma)
+
+    def _lookup(self, word):
+        return AudioLookupResult(audios={word: f"/audio/{word}.mp3"})
+
+
+def run(pipeline, words):
+    "Signals from the workers are queued, so events are processed until the pipeline is done"
+    app = QCoreApplication.instance() or QCoreApplication([])
+    results = {}
+    done = threading.Event()
+    pipeline.resolved.connect(lambda index, result: results.__setitem__(index, result))
+    pipeline.done.connect(done.set)
+    pipeline.start(words)
+    deadline = time.time() + 10
+    while not done.is_set() and time.time() < deadline:
+        app.processEvents()
+    assert done.is_set()
+    return results
+
+
+def test_definition_pipeline():
+    words = [f"word{i}" for i in range(40)]
+    online = SlowDictionary("online", {"word1": "first"}, delay=0.1)
+    local = SlowDictionary("local", {word: word.upper() for word in words[::2]}, delay=0.002)
+    local.INTERNET = False
+    pipeline = DefinitionPipeline([local, online], [], [FakeAudio()])
+    results = run(pipeline, words)
+
+    assert len(results) == len(words) == pipeline.completed
+    assert results[0].definition1.definition == "WORD0"
+    assert results[1].definition1.definition == "first"
+    assert results[3].definition1 is None
+    assert results[5].audio_path == "/audio/word5.mp3"
+    assert local.max_running == 1
+    assert 1 < online.max_running <= ONLINE_SOURCE_CONCURRENCY
+
+
+def test_local_sources_one_at_a_time():
+    "Local sources share the dictionary database, so two of them must not run at the same time"
+    words = [f"word{i}" for i in range(30)]
+    lock = threading.Lock()
+    running = [0, 0]  # running, max running
+
+    class LocalDictionary(SlowDictionary):
+        INTERNET = False
+
+        def _lookup(self, word):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.002)
+            with lock:
+                running[0] -= 1
+            return LookupResult(error="not found")
+
+    pipeline = DefinitionPipeline([LocalDictionary("local1", {})], [LocalDictionary("local2", {})], [FakeAudio()])
+    results = run(pipeline, words)
+    assert len(results) == len(words)
+    assert running[1] == 1
+
+
+def test_definition_pipeline_cancel():
+    source = SlowDictionary("online", {})
+    pipeline = DefinitionPipeline([source], [], [])
+    done = threading.Event()
+    results = []
+    pipeline.resolved.connect(lambda index, result: results.append(index))
+    pipeline.done.connect(done.set)
+    pipeline.start([f"word{i}" for i in range(500)])
+    pipeline.cancel()
+    assert done.is_set() and pipeline.cancelled
+    time.sleep(0.1)
+    QCoreApplication.processEvents()
+    assert len(results) < 10
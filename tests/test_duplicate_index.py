@@ -0,0 +1,55 @@
+import time
+from PyQt5.QtCore import QCoreApplication, QSettings
+import vocabsieve.anki_schema
+from vocabsieve.record import Record
+from vocabsieve.duplicate_index import DuplicateIndex
+
+
+def make_note(note_id, word, sentence):
+    return {"noteId": note_id, "mod": 1, "modelName": "vocabsieve-notes",
+            "fields": {"Word": {"value": word, "order": 0}, "Sentence": {"value": sentence, "order": 1}}}
+
+
+def test_duplicate_index(tmp_path, server, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("anki_api", server.url)
+    monkeypatch.setattr(vocabsieve.anki_schema, "settings", settings)
+    rec = Record(settings, tmp_path)
+    server.notes = {1: make_note(1, "<b>Haus</b>", "das Haus")}
+    rec.getAnkiNoteLemmas(server.url, [1], {"vocabsieve-notes": ["Word", "Sentence"]}, "de")
+
+    index = DuplicateIndex(rec)
+    # Seeded from the note cache, without asking Anki
+    server.actions.clear()
+    assert index.find("vocabsieve-notes", "Haus ") == [1]
+    # Anki's duplicate check is case-sensitive
+    assert index.find("vocabsieve-notes", "haus") == []
+    assert index.find("vocabsieve-notes", "Baum") == []
+    assert index.find("Basic", "Haus") == []
+    assert server.actions == []
+
+    index.add("vocabsieve-notes", "Baum", 2)
+    assert index.find("vocabsieve-notes", "Baum") == [2]
+
+    # Note 2 was deleted in Anki in the meantime
+    server.notes = {}
+    assert index.confirm(server.url, "vocabsieve-notes", "Baum") == []
+    assert index.find("vocabsieve-notes", "Baum") == []
+
+    # Notes that are not tracked are not in the index. The answer does not wait for Anki,
+    # which is asked in the background
+    app = QCoreApplication.instance() or QCoreApplication([])
+    confirmed = []
+    index.confirmed.connect(lambda model, value, note_ids: confirmed.append((value, note_ids)))
+    server.found = {'"note:vocabsieve-notes" "Word:Tisch"': [3]}
+    assert index.lookup(server.url, "vocabsieve-notes", "Tisch") == []
+    deadline = time.monotonic() + 5
+    while not confirmed and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert confirmed == [("Tisch", [3])]
+    assert index.find("vocabsieve-notes", "Tisch") == [3]
+
+    # Values are matched literally
+    server.found = {r'"note:vocabsieve-notes" "Word:\*a\_b\:c\"d"': [4]}
+    assert index.confirm(server.url, "vocabsieve-notes", '*a_b:c"d') == [4]
@@ -0,0 +1,59 @@
+import time
+import pytest
+import requests
+from vocabsieve.http_cache import HttpCache, CachedResponse, HOST_TTLS, NEGATIVE_TTL, cacheable, ttl_for
+
+
+def response(url, body=b"x" * 100, status=200):
+    return CachedResponse(url, status, body, "utf-8")
+
+
+def test_http_cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.db"), max_bytes=1000)
+    url = "https://kaikki.org/dictionary/German/meaning/h/ha/Haus.json"
+    assert cache.get(url) is None
+    cache.put(url, response(url, b'{"word": "Haus"}'))
+    assert cache.get(url).json() == {"word": "Haus"}
+    # Headers are part of the key
+    assert cache.get(url, {"User-Agent": "test"}) is None
+
+    # Kept across sessions
+    cache = HttpCache(str(tmp_path / "http_cache.db"), max_bytes=1000)
+    assert cache.get(url).text == '{"word": "Haus"}'
+
+    # Missing words are cached, but rate limiting is not
+    missing = "https://kaikki.org/dictionary/German/meaning/x/xy/xyz.json"
+    cache.put(missing, response(missing, b"Not found", 404))
+    with pytest.raises(requests.HTTPError):
+        cache.get(missing).raise_for_status()
+    cache.put(missing + "2", response(missing, b"Slow down", 429))
+    assert cache.get(missing + "2") is None
+
+    # Hits do not write to the database right away
+    changes = cache.conn.total_changes
+    for _ in range(10):
+        assert cache.get(url) is not None
+    assert cache.conn.total_changes == changes
+
+    # The least recently used entries are evicted first
+    urls = [f"https://forvo.com/word/{i}" for i in range(9)]
+    for u in urls:
+        cache.put(u, response(u))
+        time.sleep(0.001)
+    cache.get(urls[0])
+    cache.put("https://forvo.com/word/new", response("https://forvo.com/word/new"))
+    assert cache.size <= 1000
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[1]) is None
+    assert cache.get("https://forvo.com/word/new") is not None
+
+
+def test_ttl():
+    assert ttl_for("https://kaikki.org/dictionary/x.json", 200) == HOST_TTLS["kaikki.org"]
+    assert ttl_for("https://audio00.forvo.com/mp3/x.mp3", 200) == HOST_TTLS["forvo.com"]
+    assert ttl_for("https://kaikki.org/dictionary/x.json", 404) == NEGATIVE_TTL
+
+
+def test_cacheable():
+    assert cacheable(200) and cacheable(404) and cacheable(410)
+    assert not any(cacheable(status) for status in (401, 403, 408, 429, 500, 503))
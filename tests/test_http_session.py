@@ -0,0 +1,53 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from vocabsieve.http_session import HttpSessions
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            self.server.running += 1
+            self.server.max_running = max(self.server.max_running, self.server.running)
+        time.sleep(0.05)
+        with self.server.lock:
+            self.server.running -= 1
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+def test_http_sessions():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    httpd.lock = threading.Lock()
+    httpd.connections = set()
+    httpd.running = httpd.max_running = 0
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        sessions = HttpSessions()
+        sessions.configure("127.0.0.1", concurrency=2)
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda i: sessions.get(f"{url}/{i}").text, range(8)))
+        assert results == ["ok"] * 8
+        assert httpd.max_running == 2
+        # Connections are kept alive and reused
+        assert len(httpd.connections) <= 2
+
+        assert sessions.get(f"{url}/missing").status_code == 404
+        stats = sessions.stats()["127.0.0.1"]
+        assert stats.calls == 9
+        assert stats.errors == 1
+        assert stats.max_time >= 0.05
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
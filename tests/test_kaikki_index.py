@@ -0,0 +1,86 @@
+import gzip
+import json
+import struct
+import zlib
+import pytest
+import vocabsieve.dictformats
+import vocabsieve.sources.kaikki_file_source
+from vocabsieve.dictformats import kaikki_line_to_textdef, parseKaikkiMulti
+from vocabsieve.kaikki_index import open_dump, BgzfDump, PlainDump
+from vocabsieve.local_dictionary import LocalDictionary
+from vocabsieve.models import DisplayMode, LemmaPolicy, SourceOptions
+from vocabsieve.sources import KaikkiFileSource
+
+ENTRIES = [
+    {"word": "Haus", "lang_code": "de", "pos": "noun", "senses": [{"glosses": ["house"]}]},
+    {"word": "house", "lang_code": "en", "pos": "noun", "senses": [{"glosses": ["a building"]}]},
+    {"word": "gehen", "lang_code": "de", "pos": "verb", "senses": [{"glosses": ["to go " * 50]}]},
+    {"word": "Haus", "lang_code": "de", "pos": "name", "senses": [{"glosses": ["a surname"]}]},
+]
+
+
+def write_bgzf(path, data, block_size):
+    "Like bgzip, with small blocks so that lines span several blocks"
+    with open(path, "wb") as f:
+        for start in range(0, len(data) + 1, block_size):
+            chunk = data[start:start + block_size]
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+            compressed = compressor.compress(chunk) + compressor.flush()
+            f.write(b"\x1f\x8b\x08\x04" + struct.pack("<IBBH", 0, 0, 255, 6)
+                    + b"BC" + struct.pack("<HH", 2, 18 + len(compressed) + 8 - 1))
+            f.write(compressed + struct.pack("<II", zlib.crc32(chunk), len(chunk)))
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_kaikki_file_source(tmp_path, monkeypatch, compressed):
+    data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in ENTRIES).encode()
+    path = str(tmp_path / ("dump.jsonl.gz" if compressed else "dump.jsonl"))
+    if compressed:
+        write_bgzf(path, data, 100)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+    dump = open_dump(path)
+    assert isinstance(dump, BgzfDump if compressed else PlainDump)
+    lines = list(dump.lines())
+    assert [json.loads(line) for _, line in lines] == ENTRIES
+    assert [json.loads(dump.readLine(offset)) for offset, _ in reversed(lines)] == ENTRIES[::-1]
+    dump.close()
+
+    db = LocalDictionary(tmp_path)
+    monkeypatch.setattr(vocabsieve.sources.kaikki_file_source, "dictdb", db)
+    db.dictimport(path, "wiktindex", "de", "kaikki-de")
+    assert db.countEntriesDict("kaikki-de") == 2
+    source = KaikkiFileSource("de", SourceOptions(LemmaPolicy.no_lemma, DisplayMode.raw, 0, 0), "kaikki-de", path)
+    definition = source._lookup("Haus").definition
+    assert definition.startswith("<i>Noun</i>") and "house" in definition and "a surname" in definition
+    assert "go" in source._lookup("gehen").definition
+    assert source._lookup("house").error
+    db.dictdelete("kaikki-de")
+    assert db.countEntriesDict("kaikki-de") == 0
+
+
+def test_gzip_is_rejected(tmp_path):
+    path = str(tmp_path / "dump.json.gz")
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps(ENTRIES[0]) + "\n")
+    with pytest.raises(ValueError):
+        open_dump(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_kaikki_multi(tmp_path, workers, monkeypatch):
+    monkeypatch.setattr(vocabsieve.dictformats, "KAIKKI_CHUNK_LINES", 1)
+    path = str(tmp_path / "dump.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in ENTRIES)
+    result = parseKaikkiMulti(path, ["de", "en", "fr"], workers=workers)
+    assert result["fr"] == {}
+    assert list(result["en"]) == ["house"]
+    # Entries of the same headword are combined even when they are not next to each other
+    assert result["de"]["Haus"] == kaikki_line_to_textdef(ENTRIES[0]) + "\n\n" + kaikki_line_to_textdef(ENTRIES[3])
+
+    db = LocalDictionary(tmp_path)
+    db.importKaikkiLanguages(path, {"de": "wikt-de", "en": "wikt-en"})
+    assert db.define("gehen", "de", "wikt-de") == kaikki_line_to_textdef(ENTRIES[2])
+    assert db.define("house", "en", "wikt-en") == kaikki_line_to_textdef(ENTRIES[1])
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from vocabsieve.local_dictionary import LocalDictionary
 
 
@@ -12,6 +13,22 @@ def test_local_dictionary(tmp_path):
     assert db.countDicts() == 0
 
 
+def test_local_dictionary_threads(tmp_path):
+    "Lookups from the UI thread and from lookup threads share one cursor"
+    db = LocalDictionary(tmp_path)
+    db.importdict({f"word{i}": f"definition{i}" for i in range(100)}, "de", "test-dict")
+
+    def lookups(_):
+        for _ in range(20):
+            for i in range(100):
+                assert db.define(f"word{i}", "de", "test-dict") == f"definition{i}"
+            db.getNamesForLang("de")
+        return True
+
+    with ThreadPoolExecutor(4) as executor:
+        assert all(executor.map(lookups, range(4)))
+
+
 def test_import_stardict_normal(tmp_path):
     db = LocalDictionary(tmp_path)
     assert db.countDicts() == 0
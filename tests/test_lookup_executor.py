@@ -0,0 +1,44 @@
+import threading
+import time
+from vocabsieve.lookup_executor import LookupExecutor, Priority
+
+
+def test_lookup_executor():
+    executor = LookupExecutor(workers=4)
+    executor.setLimit("slow", 1)
+    lock = threading.Lock()
+    running = {"slow": 0, "fast": 0}
+    max_running = {"slow": 0, "fast": 0}
+    order = []
+
+    def task(queue, name, delay):
+        def run():
+            with lock:
+                running[queue] += 1
+                max_running[queue] = max(max_running[queue], running[queue])
+            time.sleep(delay)
+            with lock:
+                running[queue] -= 1
+                order.append(name)
+            return name
+        return run
+
+    # Occupy the only slot of the slow queue, then queue prefetches before an interactive lookup
+    first = executor.submit("slow", task("slow", "first", 0.1))
+    time.sleep(0.02)
+    prefetches = [executor.submit("slow", task("slow", f"prefetch{i}", 0.01), Priority.prefetch) for i in range(3)]
+    interactive = executor.submit("slow", task("slow", "interactive", 0.01))
+    cancelled = executor.submit("slow", task("slow", "cancelled", 0.01), Priority.prefetch)
+    assert cancelled.cancel()
+    # Other queues are not held up by the slow one
+    fast = [executor.submit("fast", task("fast", f"fast{i}", 0.01)) for i in range(4)]
+    assert [future.result(1) for future in fast] == ["fast0", "fast1", "fast2", "fast3"]
+    assert "first" not in order
+
+    assert first.result(1) == "first"
+    assert interactive.result(1) == "interactive"
+    assert [future.result(1) for future in prefetches] == ["prefetch0", "prefetch1", "prefetch2"]
+    slow_order = [name for name in order if not name.startswith("fast")]
+    assert slow_order == ["first", "interactive", "prefetch0", "prefetch1", "prefetch2"]
+    assert max_running["slow"] == 1
+    assert max_running["fast"] == 2
@@ -0,0 +1,10 @@
+import pytest
+
+
+def test_import_main():
+    "Catches import errors in modules that the other tests do not import"
+    # Not available on headless machines without audio
+    pytest.importorskip("PyQt5.QtMultimedia", exc_type=ImportError)
+    pytest.importorskip("pynput.keyboard", exc_type=ImportError)
+    import vocabsieve.main
+    assert vocabsieve.main.MainWindow
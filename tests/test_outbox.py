@@ -0,0 +1,91 @@
+import time
+from PyQt5.QtCore import QSettings
+import vocabsieve.outbox
+from vocabsieve.models import SRSNote
+from vocabsieve.outbox import NoteOutbox, OUTBOX_MAX_DELAY
+from vocabsieve.record import Record
+
+
+def make_note(word, **options):
+    return {"deckName": "Default", "modelName": "Basic",
+            "fields": {"Front": word, "Back": ""}, **options}, SRSNote(word=word)
+
+
+def test_outbox(tmp_path, server, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("anki_api", "http://127.0.0.1:1")
+    monkeypatch.setattr(vocabsieve.outbox, "settings", settings)
+    rec = Record(settings, tmp_path)
+    outbox = NoteOutbox(rec)
+    added, failed = [], []
+    outbox.noteAdded.connect(lambda note_id, content: added.append(note_id))
+    outbox.noteFailed.connect(lambda id_, content, error: failed.append(content["fields"]["Front"]))
+
+    assert outbox.enqueue([make_note("Haus"), make_note("Baum")], batch="import") == 2
+    assert outbox.enqueue([make_note("Haus")]) == 1
+    assert outbox.counts() == (3, 0)
+    assert outbox.counts("import") == (2, 0)
+
+    # Anki cannot be reached, so the notes are kept and retried later
+    outbox._send(rec.getDueOutbox(25))
+    assert outbox.counts() == (3, 0)
+    assert rec.getDueOutbox(25) == []
+    assert rec.nextOutboxAttempt() > 0
+
+    # The duplicate is refused, the other notes are added and recorded
+    settings.setValue("anki_api", server.url)
+    with monkeypatch.context() as m:
+        # Once the retry delay has passed
+        now = time.time()
+        m.setattr(time, "time", lambda: now + OUTBOX_MAX_DELAY)
+        due = rec.getDueOutbox(25)
+    outbox._send(due)
+    assert server.actions == ["multi"]
+    assert added == [1, 2]
+    assert failed == ["Haus"]
+    assert outbox.counts() == (0, 1)
+    assert outbox.counts("import") == (0, 0)
+    assert "duplicate" in rec.lastOutboxError()
+    assert rec.countNotesToday() == 2
+
+    # Failed notes are only sent again on request
+    assert rec.getDueOutbox(25) == []
+    server.added.clear()
+    outbox.retryFailed()
+    outbox._send(rec.getDueOutbox(25))
+    assert outbox.counts() == (0, 0)
+    assert len(added) == 3
+
+    # Retrying failed notes does not send postponed ones early
+    outbox.enqueue([make_note("Haus"), make_note("Haus")])
+    outbox._send(rec.getDueOutbox(25))
+    assert outbox.counts() == (0, 2)
+    outbox.enqueue([make_note("Tisch")])
+    settings.setValue("anki_api", "http://127.0.0.1:1")
+    outbox._send(rec.getDueOutbox(25))
+    outbox.retryFailed()
+    assert outbox.counts() == (3, 0)
+    assert [content["fields"]["Front"] for _, content, _, _ in rec.getDueOutbox(25)] == ["Haus", "Haus"]
+
+    # The user decides to add one duplicate anyway, and discards the other
+    settings.setValue("anki_api", server.url)
+    failed.clear()
+    ids = []
+    outbox.noteFailed.connect(lambda id_, content, error: ids.append(id_))
+    outbox._send(rec.getDueOutbox(25))
+    assert failed == ["Haus", "Haus"]
+    outbox.addAnyway(ids[0])
+    outbox._send(rec.getDueOutbox(25))
+    assert outbox.counts() == (1, 1)
+    assert len(added) == 4
+    outbox.discardFailed()
+    assert outbox.counts() == (1, 0)
+
+
+def test_drop_missing_audio(tmp_path):
+    from vocabsieve.outbox import drop_missing_audio
+    (tmp_path / "kept.mp3").write_bytes(b"")
+    content = {"audio": [{"path": str(tmp_path / "kept.mp3")}, {"path": str(tmp_path / "missing.mp3")},
+                         {"url": "https://example.invalid/a.mp3"}]}
+    drop_missing_audio(content)
+    assert content["audio"] == [{"path": str(tmp_path / "kept.mp3")}, {"url": "https://example.invalid/a.mp3"}]
@@ -0,0 +1,51 @@
+import threading
+import time
+from PyQt5.QtCore import QCoreApplication, QSettings
+import vocabsieve.prefetcher
+from vocabsieve.models import DictionarySource, DisplayMode, LemmaPolicy, LookupResult, SourceOptions
+from vocabsieve.prefetcher import Prefetcher
+
+
+class OnlineDictionary(DictionarySource):
+    INTERNET = True
+
+    def __init__(self):
+        super().__init__("prefetch-test", "en", SourceOptions(LemmaPolicy.no_lemma, DisplayMode.raw, 0, 0))
+        self.looked_up = []
+        self.lock = threading.Lock()
+
+    def _lookup(self, word):
+        with self.lock:
+            self.looked_up.append((word, time.monotonic()))
+        return LookupResult(definition=word)
+
+
+def test_prefetcher(tmp_path, monkeypatch):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat)
+    settings.setValue("prefetch_rate", 600)  # one lookup every 100 ms
+    monkeypatch.setattr(vocabsieve.prefetcher, "settings", settings)
+    source = OnlineDictionary()
+    source.define("warm up")  # The first lookup is slow
+    source.looked_up.clear()
+    prefetcher = Prefetcher()
+
+    def task(word):
+        return source, lambda: source.define(word)
+
+    prefetcher.replace([task("old1"), task("old2"), task("old3")])
+    # The first lookup is submitted right away and may run before it is cancelled,
+    # the rest are replaced by the next sentence
+    prefetcher.replace([task("new1"), task("new2"), task("new3")])
+    deadline = time.monotonic() + 5
+    while len(source.looked_up) < 3 and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    time.sleep(0.2)
+    app.processEvents()
+
+    words = [word for word, _ in source.looked_up if word != "old1"]
+    assert words == ["new1", "new2", "new3"]
+    times = [started for word, started in source.looked_up if word.startswith("new")]
+    assert all(b - a >= 0.08 for a, b in zip(times, times[1:]))
+    prefetcher.cancel()
@@ -0,0 +1,159 @@
+from PyQt5.QtCore import QSettings
+from vocabsieve.record import Record
+
+
+def make_record(tmp_path):
+    return Record(QSettings(str(tmp_path / "settings.ini"), QSettings.IniFormat), tmp_path)
+
+
+def test_modifiers(tmp_path):
+    rec = make_record(tmp_path)
+    assert rec.getModifier("de", "haus") == 1.0
+    rec.setModifier("de", "haus", 0.0)
+    rec.setModifier("de", "baum", 2.5)
+    rec.setModifier("fr", "maison", 0.0)
+    assert rec.getModifier("de", "haus") == 0.0
+    assert rec.getModifiers("de", ["haus", "baum", "auto"]) == {"haus": 0.0, "baum": 2.5, "auto": 1.0}
+
+    # Modifiers are persisted, not only kept in memory
+    assert make_record(tmp_path).getModifiers("de", ["haus", "baum"]) == {"haus": 0.0, "baum": 2.5}
+
+    rec.deleteModifiers("de")
+    assert rec.getModifier("de", "haus") == 1.0
+    assert rec.getModifier("fr", "maison") == 0.0
+    assert make_record(tmp_path).getModifier("de", "baum") == 1.0
+
+
+def test_maintenance(tmp_path):
+    from vocabsieve.maintenance import maintain_database
+    rec = make_record(tmp_path)
+    for i in range(200):
+        rec.setModifier("de", f"word{i}", 0.0)
+    rec.deleteModifiers("de")
+    maintain_database(rec.path)
+    assert rec.c.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert rec.c.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert rec.getModifier("de", "word1") == 1.0
+
+
+def test_maintenance_conversion(tmp_path):
+    import sqlite3
+    from vocabsieve.maintenance import maintain_database
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x)")
+    conn.commit()
+    conn.close()
+    # Databases from older versions are only converted on request, it needs a full VACUUM
+    maintain_database(path)
+    assert sqlite3.connect(path).execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    maintain_database(path, convert=True)
+    assert sqlite3.connect(path).execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_read_during_write(tmp_path):
+    import threading
+    from vocabsieve.models import LookupRecord
+    rec = make_record(tmp_path)
+    rec.recordLookup(LookupRecord(word="Haus", language="de", source="test"), commit=False)
+    counts = []
+    # Readers see the last committed state instead of waiting for the writer
+    reader = threading.Thread(target=lambda: counts.append(rec.countLookups("de")))
+    reader.start()
+    reader.join(timeout=5)
+    assert counts == [0]
+    rec.commit()
+    assert rec.countLookups("de") == 1
+    rec.close()
+
+
+def test_write_behind(tmp_path):
+    from vocabsieve.models import LookupRecord
+    rec = make_record(tmp_path)
+    for i in range(5):
+        rec.recordLookup(LookupRecord(word="Haus", language="de", source="test"), timestamp=float(i))
+    rec.flush()
+    assert rec.countLookups("de") == 5
+    rec.recordLookup(LookupRecord(word="Baum", language="de", source="test"), timestamp=10.0)
+    # Queued records are committed on close
+    rec.close()
+    assert make_record(tmp_path).countLookups("de") == 6
+
+
+def test_record_lookups(tmp_path):
+    from vocabsieve.models import LookupRecord
+    rec = make_record(tmp_path)
+    lookups = [(LookupRecord(word=word, language="de", source="test"), float(i))
+               for i, word in enumerate(["Haus", "Baum", "Haus"])]
+    assert rec.recordLookups(lookups) == 3
+    # Lookups with the same timestamp and lemma are only recorded once
+    assert rec.recordLookups(lookups + [(LookupRecord(word="Auto", language="de", source="test"), 9.0)]) == 1
+    assert rec.countLookups("de") == 4
+
+
+def make_note(note_id, mod, word, sentence):
+    return {"noteId": note_id, "mod": mod, "modelName": "vocabsieve-notes",
+            "fields": {"Word": {"value": word}, "Sentence": {"value": sentence}}}
+
+
+def test_anki_note_cache(tmp_path, server):
+    rec = make_record(tmp_path)
+    fieldmap = {"vocabsieve-notes": ["Word", "Sentence"]}
+    server.notes = {1: make_note(1, 100, "cat", "the <b>cat</b> sat"),
+                    2: make_note(2, 100, "dog", "a dog")}
+    assert rec.getAnkiNoteLemmas(server.url, [1, 2], fieldmap, "xx") == {
+        1: ("cat", ["sat", "the"]), 2: ("dog", ["a"])}
+
+    server.notes[2] = make_note(2, 200, "dog", "big dog")
+    server.actions.clear()
+    lemmas = make_record(tmp_path).getAnkiNoteLemmas(server.url, [1, 2], fieldmap, "xx")
+    assert lemmas == {1: ("cat", ["sat", "the"]), 2: ("dog", ["big"])}
+    # Only the changed note is downloaded again
+    assert server.actions == ["notesModTime", "notesInfo"]
+
+    # Changing which fields are used invalidates the cache
+    server.actions.clear()
+    assert rec.getAnkiNoteLemmas(server.url, [1], {"vocabsieve-notes": ["Word", "<Ignore>"]}, "xx") == {1: ("cat", [])}
+    assert server.actions == ["notesModTime", "notesInfo"]
+
+
+def test_writer_errors(tmp_path, monkeypatch):
+    import sqlite3
+    import vocabsieve.record
+    from vocabsieve.models import LookupRecord
+    monkeypatch.setattr(vocabsieve.record, "WRITER_RETRY_DELAY", 0.01)
+    rec = make_record(tmp_path)
+    rec.c.execute("PRAGMA busy_timeout = 10")
+    # A bad record is dropped without losing the others
+    rec.recordLookup(LookupRecord(word="Haus", language="de", source="test"), timestamp=1.0)
+    rec.writer.put("INSERT INTO no_such_table VALUES(?)", (1,))
+    rec.recordLookup(LookupRecord(word="Baum", language="de", source="test"), timestamp=2.0)
+    assert rec.countLookups("de") == 2
+
+    # Records are kept while another connection holds the write lock
+    other = sqlite3.connect(rec.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    rec.recordLookup(LookupRecord(word="Auto", language="de", source="test"), timestamp=3.0)
+    assert rec.countLookups("de") == 2
+    other.execute("COMMIT")
+    assert rec.countLookups("de") == 3
+    other.close()
+    rec.close()
+
+
+def test_reader_connections(tmp_path):
+    import gc
+    import threading
+    rec = make_record(tmp_path)
+    threads = [threading.Thread(target=rec.countLookups, args=("de",)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+    # The connections of threads that ended are closed
+    assert len(rec._readers) == 0
+    assert rec.countLookups("de") == 0
+    assert len(rec._readers) == 1
+    rec.close()
+    assert len(rec._readers) == 0
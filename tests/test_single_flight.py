@@ -0,0 +1,34 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from vocabsieve.single_flight import SingleFlight
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(key):
+        def run():
+            with lock:
+                calls.append(key)
+            time.sleep(0.1)
+            if key == "bad":
+                raise ValueError(key)
+            return key.upper()
+        return run
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(flight.do, key, fetch(key)) for key in ["a", "a", "b", "a", "bad", "bad"]]
+        assert [future.result() for future in futures[:4]] == ["A", "A", "B", "A"]
+        for future in futures[4:]:
+            with pytest.raises(ValueError):
+                future.result()
+    assert sorted(calls) == ["a", "b", "bad"]
+    assert flight.inFlight() == 0
+
+    # Nothing is remembered once the call finished
+    assert flight.do("a", fetch("a")) == "A"
+    assert calls.count("a") == 2
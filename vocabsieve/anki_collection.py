@@ -0,0 +1,193 @@
+"""
+Read-only access to an Anki collection file (collection.anki2), used as an
+alternative to AnkiConnect for computing known data. It works when Anki is closed,
+and avoids the JSON round-trips of AnkiConnect.
+"""
+import os
+import re
+import shlex
+import shutil
+import sqlite3
+import tempfile
+import json
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .global_names import logger
+
+# Notes are read from the collection in chunks of this size
+NOTES_CHUNK_SIZE = 5000
+
+# Anki card types and queues
+CARD_TYPE_NEW = 0
+CARD_TYPE_REVIEW = 2
+CARD_TYPE_RELEARNING = 3
+QUEUE_SUSPENDED = -1
+
+_PROP_RE = re.compile(r"prop:(ivl|reps|lapses|ease)(>=|<=|!=|=|<|>)(-?\d+(?:\.\d+)?)")
+_PROP_COLUMNS = {"ivl": "c.ivl", "reps": "c.reps", "lapses": "c.lapses", "ease": "c.factor"}
+_IS_CONDITIONS = {
+    "new": f"c.type = {CARD_TYPE_NEW}",
+    "review": f"c.type IN ({CARD_TYPE_REVIEW}, {CARD_TYPE_RELEARNING})",
+    "learn": "c.queue IN (1, 3)",
+    "suspended": f"c.queue = {QUEUE_SUSPENDED}",
+    "buried": "c.queue IN (-2, -3)",
+}
+
+
+class UnsupportedQuery(Exception):
+    "The search string uses syntax that cannot be evaluated without Anki"
+
+
+class AnkiCollection:
+    """
+    Opens a collection.anki2 file read-only. If Anki is running and holds a lock
+    on the collection, a snapshot copy is read instead.
+    Only a subset of the Anki search syntax is supported, see query_to_sql.
+    """
+
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Anki collection not found: {path}")
+        self.path = path
+        self._snapshot_dir: Optional[str] = None
+        try:
+            self.conn = self._connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+            self.conn.execute("SELECT COUNT(*) FROM notes").fetchone()
+        except sqlite3.OperationalError as e:
+            logger.info(f"Cannot read Anki collection directly ({repr(e)}), reading a snapshot instead")
+            # The snapshot is our own copy, so it may be opened read-write to replay its WAL
+            self.conn = self._connect(self._snapshot(path))
+        self._load_models()
+        self._load_decks()
+
+    @staticmethod
+    def _connect(database: str, uri: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(database, uri=uri, check_same_thread=False)
+        # Anki's case-insensitive collation, used in indices on names
+        conn.create_collation("unicase", lambda a, b: (a.lower() > b.lower()) - (a.lower() < b.lower()))
+        return conn
+
+    def _snapshot(self, path: str) -> str:
+        self._snapshot_dir = tempfile.mkdtemp(prefix="vocabsieve-anki-")
+        copy = os.path.join(self._snapshot_dir, "collection.anki2")
+        for suffix in ("", "-wal"):
+            if os.path.exists(path + suffix):
+                shutil.copyfile(path + suffix, copy + suffix)
+        return copy
+
+    def close(self) -> None:
+        self.conn.close()
+        if self._snapshot_dir:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def __enter__(self) -> "AnkiCollection":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _has_table(self, name: str) -> bool:
+        return bool(self.conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone()[0])
+
+    def _load_models(self) -> None:
+        "Note type id -> name, and note type id -> field names in order"
+        self.model_names: dict[int, str] = {}
+        self.model_fields: dict[int, list[str]] = {}
+        if self._has_table("notetypes"):  # Schema 18 and later
+            for ntid, name in self.conn.execute("SELECT id, name FROM notetypes"):
+                self.model_names[ntid] = name
+            fields: dict[int, list[tuple[int, str]]] = {}
+            for ntid, ord_, name in self.conn.execute("SELECT ntid, ord, name FROM fields"):
+                fields.setdefault(ntid, []).append((ord_, name))
+            self.model_fields = {ntid: [name for _, name in sorted(f)] for ntid, f in fields.items()}
+        else:
+            models = json.loads(self.conn.execute("SELECT models FROM col").fetchone()[0])
+            for ntid, model in models.items():
+                self.model_names[int(ntid)] = model['name']
+                self.model_fields[int(ntid)] = [f['name'] for f in sorted(model['flds'], key=lambda f: f['ord'])]
+
+    def _load_decks(self) -> None:
+        self.deck_names: dict[int, str] = {}
+        if self._has_table("decks"):  # Schema 18 and later, levels are separated by \x1f
+            for did, name in self.conn.execute("SELECT id, name FROM decks"):
+                self.deck_names[did] = name.replace("\x1f", "::")
+        else:
+            decks = json.loads(self.conn.execute("SELECT decks FROM col").fetchone()[0])
+            self.deck_names = {int(did): deck['name'] for did, deck in decks.items()}
+
+    def _ids_matching(self, names: dict[int, str], pattern: str, children: bool = False) -> str:
+        pattern = pattern.lower()
+        ids = [str(id_) for id_, name in names.items()
+               if fnmatchcase(name.lower(), pattern)
+               or (children and fnmatchcase(name.lower(), pattern + "::*"))]
+        return ",".join(ids) or "NULL"
+
+    def query_to_sql(self, query: str) -> tuple[str, list]:
+        """
+        Translate an Anki search string into a SQL condition on cards (c) and notes (n).
+        Terms are combined with AND, and can be negated with a leading '-'.
+        Supported terms: prop:ivl/reps/lapses/ease comparisons,
+        is:new/review/learn/suspended/buried, deck:name and note:name (with * wildcards).
+        Raises UnsupportedQuery for anything else.
+        """
+        try:
+            terms = shlex.split(query)
+        except ValueError as e:
+            raise UnsupportedQuery(query) from e
+        conditions = []
+        params: list = []
+        for term in terms:
+            negate = term.startswith("-")
+            term = term.lstrip("-")
+            if match := _PROP_RE.fullmatch(term):
+                prop, operator, value = match.groups()
+                if prop == "ease":  # Stored as permille
+                    value = str(float(value) * 1000)
+                condition = f"{_PROP_COLUMNS[prop]} {operator} ?"
+                params.append(float(value))
+            elif term.startswith("is:") and term[3:] in _IS_CONDITIONS:
+                condition = _IS_CONDITIONS[term[3:]]
+            elif term.startswith("deck:"):
+                condition = f"c.did IN ({self._ids_matching(self.deck_names, term[5:], children=True)})"
+            elif term.startswith("note:"):
+                condition = f"n.mid IN ({self._ids_matching(self.model_names, term[5:])})"
+            else:
+                raise UnsupportedQuery(f"Cannot evaluate '{term}' without Anki")
+            conditions.append(f"NOT ({condition})" if negate else f"({condition})")
+        return " AND ".join(conditions) or "1", params
+
+    def findNotes(self, query: str) -> list[int]:
+        "Ids of notes with at least one card matching the query"
+        condition, params = self.query_to_sql(query)
+        return [nid for nid, in self.conn.execute(
+            f"SELECT DISTINCT n.id FROM cards c JOIN notes n ON c.nid = n.id WHERE {condition} ORDER BY n.id",
+            params)]
+
+    def notesModTime(self, notes: list[int]) -> dict[int, int]:
+        result: dict[int, int] = {}
+        for i in range(0, len(notes), NOTES_CHUNK_SIZE):
+            chunk = notes[i:i + NOTES_CHUNK_SIZE]
+            result.update(self.conn.execute(
+                f"SELECT id, mod FROM notes WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return result
+
+    def iterNotesInfo(self, notes: list[int]) -> Iterator[list[dict]]:
+        "Yield notes in chunks, in the same format as AnkiConnect's notesInfo"
+        for i in range(0, len(notes), NOTES_CHUNK_SIZE):
+            chunk = notes[i:i + NOTES_CHUNK_SIZE]
+            infos = []
+            for nid, mid, mod, flds in self.conn.execute(
+                    f"SELECT id, mid, mod, flds FROM notes WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                field_names = self.model_fields.get(mid, [])
+                infos.append({
+                    "noteId": nid,
+                    "mod": mod,
+                    "modelName": self.model_names.get(mid, ""),
+                    "fields": {name: {"value": value, "order": order}
+                               for order, (name, value) in enumerate(zip(field_names, flds.split("\x1f")))}
+                })
+            yield infos
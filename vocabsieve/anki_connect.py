@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .global_names import logger
+
+# (connect, read) timeouts in seconds. Reads can be slow on large collections.
+TIMEOUT = (3.05, 120)
+# Calls that take longer than this are logged
+SLOW_CALL_SECONDS = 1.0
+
+
+class AnkiConnectError(Exception):
+    "Raised when AnkiConnect returns an error or a malformed response"
+
+
+@dataclass
+class ActionStats:
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+def _parse_response(response: Any) -> Any:
+    if not isinstance(response, dict) or len(response) != 2:
+        raise AnkiConnectError('response has an unexpected number of fields')
+    if 'error' not in response:
+        raise AnkiConnectError('response is missing required error field')
+    if 'result' not in response:
+        raise AnkiConnectError('response is missing required result field')
+    if response['error'] is not None:
+        raise AnkiConnectError(response['error'])
+    return response['result']
+
+
+class AnkiConnect:
+    """
+    Client for the AnkiConnect API.
+    It keeps a persistent HTTP session so that consecutive calls reuse the
+    same connection, and records the time taken by each action.
+    Anki handles requests one at a time, so only one request is sent at a time:
+    calls made from other threads while a request is running are queued, and
+    sent together as a single multi action once it is done.
+    """
+
+    def __init__(self, server: str, timeout=TIMEOUT) -> None:
+        self.server = server
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._stats: dict[str, ActionStats] = {}
+        self._stats_lock = threading.Lock()
+        # Calls waiting for the running request to finish
+        self._batch = threading.Condition()
+        self._pending: list[tuple[str, dict, Future]] = []
+        self._sending = False
+
+    def _post(self, action: str, payload: dict) -> Any:
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.post(self.server, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+            failed = False
+            return result
+        finally:
+            self._record(action, time.perf_counter() - start, failed)
+
+    def _record(self, action: str, elapsed: float, failed: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(action, ActionStats())
+            stats.calls += 1
+            stats.errors += failed
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+        if elapsed > SLOW_CALL_SECONDS:
+            logger.debug(f"AnkiConnect action {action} took {elapsed:.2f} seconds")
+
+    def invoke(self, action: str, **params) -> Any:
+        """
+        Run an action. If another request is running, the call is sent along
+        with the other calls queued in the meantime once it is done.
+        """
+        future: Future = Future()
+        with self._batch:
+            self._pending.append((action, params, future))
+            while self._sending and not future.done():
+                self._batch.wait()
+            leader = not future.done()
+            if leader:
+                # Send all the calls queued so far, including this one
+                calls, self._pending = self._pending, []
+                self._sending = True
+        if leader:
+            try:
+                self._send(calls)
+            finally:
+                with self._batch:
+                    self._sending = False
+                    self._batch.notify_all()
+        return future.result()
+
+    def _send(self, calls: list[tuple[str, dict, Future]]) -> None:
+        try:
+            results = self.multi([(action, params) for action, params, _ in calls], raise_errors=False)
+        except BaseException as e:
+            for _, _, future in calls:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(calls, results):
+            if isinstance(result, AnkiConnectError):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _invokeNow(self, action: str, params: dict) -> Any:
+        return _parse_response(self._post(action, {'action': action, 'params': params, 'version': 6}))
+
+    def multi(self, calls: list[tuple[str, dict]], raise_errors: bool = True) -> list[Any]:
+        """
+        Run several independent actions in a single request with AnkiConnect's
+        multi action. Returns their results in the same order.
+        Raises AnkiConnectError if any of them failed, unless raise_errors is False,
+        in which case the AnkiConnectError of a failed action is returned as its result.
+        """
+        if not calls:
+            return []
+        if len(calls) == 1:
+            action, params = calls[0]
+            try:
+                return [self._invokeNow(action, params)]
+            except AnkiConnectError as e:
+                if raise_errors:
+                    raise
+                return [e]
+        actions = [{'action': action, 'params': params, 'version': 6} for action, params in calls]
+        name = "multi(" + ",".join(sorted({action for action, _ in calls})) + ")"
+        payload = {'action': 'multi', 'params': {'actions': actions}, 'version': 6}
+        results = _parse_response(self._post(name, payload))
+        if len(results) != len(calls):
+            raise AnkiConnectError(f'expected {len(calls)} results from multi, got {len(results)}')
+        if raise_errors:
+            return [_parse_response(result) for result in results]
+        outcomes: list[Any] = []
+        for result in results:
+            try:
+                outcomes.append(_parse_response(result))
+            except AnkiConnectError as e:
+                outcomes.append(e)
+        return outcomes
+
+    def stats(self) -> dict[str, ActionStats]:
+        "Timing statistics per action since the client was created"
+        with self._stats_lock:
+            return {action: ActionStats(**vars(stats)) for action, stats in self._stats.items()}
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: dict[str, AnkiConnect] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(server: str) -> AnkiConnect:
+    "Shared client for an AnkiConnect address"
+    with _clients_lock:
+        client: Optional[AnkiConnect] = _clients.get(server)
+        if client is None:
+            client = _clients[server] = AnkiConnect(server)
+        return client
@@ -0,0 +1,74 @@
+import threading
+from typing import Optional
+from PyQt5.QtCore import QObject, pyqtSignal
+from .anki_connect import get_client
+from .global_names import settings, logger
+
+# Seconds between probes while AnkiConnect is reachable
+HEALTH_CHECK_INTERVAL = 30
+# Seconds to wait after the first failed probe, doubled on every failure
+HEALTH_BASE_DELAY = 2
+HEALTH_MAX_DELAY = 60
+
+
+class AnkiHealthMonitor(QObject):
+    """
+    Checks whether AnkiConnect is reachable on a background thread, so that
+    the UI can read the last known state instead of waiting for a connection.
+    While Anki is unreachable it is probed again with exponential backoff.
+    stateChanged is emitted with the availability and AnkiConnect version.
+    """
+    stateChanged = pyqtSignal(bool, object)  # available, version
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.available: Optional[bool] = None  # None until the first probe finished
+        self.version: Optional[int] = None
+        self._failures = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="AnkiHealthMonitor", daemon=True)
+
+    def start(self) -> None:
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def probeNow(self) -> None:
+        "Probe again without waiting for the next scheduled check, e.g. after the settings changed"
+        self._wake.set()
+
+    def probe(self) -> bool:
+        "Ask AnkiConnect for its version. This blocks, it is normally called by the monitor thread"
+        api = settings.value("anki_api", "http://127.0.0.1:8765")
+        try:
+            version: Optional[int] = get_client(api).invoke("version")
+        except Exception as e:
+            logger.debug(f"AnkiConnect at {api} is not available: {repr(e)}")
+            version = None
+        available = version is not None
+        self._failures = 0 if available else self._failures + 1
+        changed = (available, version) != (self.available, self.version)
+        self.available, self.version = available, version
+        if changed:
+            logger.info(f"AnkiConnect is {'available, version ' + str(version) if available else 'not available'}")
+            self.stateChanged.emit(available, version)
+        return available
+
+    def nextDelay(self) -> float:
+        if self._failures == 0:
+            return HEALTH_CHECK_INTERVAL
+        return float(min(HEALTH_BASE_DELAY * 2 ** (self._failures - 1), HEALTH_MAX_DELAY))
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            if settings.value("enable_anki", True, type=bool):
+                self.probe()
+            self._wake.wait(self.nextDelay())
+            self._wake.clear()
+
+
+anki_health = AnkiHealthMonitor()
@@ -0,0 +1,106 @@
+import json
+import threading
+from typing import Optional
+from PyQt5.QtCore import QObject, QThreadPool, pyqtSignal
+from .global_names import settings, logger
+from .tools import invokeMulti, getFieldsOfModels, getFields
+
+# How often the schema is refreshed in the background
+SCHEMA_REFRESH_INTERVAL_MS = 10 * 60 * 1000
+
+
+class AnkiSchema(QObject):
+    """
+    Cache of the decks, note types and note type fields of the Anki profile.
+    It is persisted in the settings, so it is available instantly on startup,
+    and refreshed on a background thread. updated is emitted when it changes.
+    """
+    updated = pyqtSignal()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        data = json.loads(settings.value("internal/anki_schema", "{}"))
+        self._server: str = data.get("server", "")
+        self._decks: list[str] = data.get("decks", [])
+        self._models: dict[str, list[str]] = data.get("models", {})
+
+    @staticmethod
+    def _api() -> str:
+        return str(settings.value("anki_api", "http://127.0.0.1:8765"))
+
+    def _valid(self) -> bool:
+        "Must be called with the lock held"
+        return self._server == self._api()
+
+    def decks(self) -> list[str]:
+        with self._lock:
+            return list(self._decks) if self._valid() else []
+
+    def noteTypes(self) -> list[str]:
+        with self._lock:
+            return list(self._models) if self._valid() else []
+
+    def fields(self, model: str) -> list[str]:
+        """
+        Field names of a note type. Note types that are not cached yet, for example
+        one that was just created, are requested from Anki directly.
+        """
+        with self._lock:
+            if self._valid() and model in self._models:
+                return list(self._models[model])
+        fields = getFields(self._api(), model)
+        with self._lock:
+            if self._valid():
+                self._models[model] = fields
+                self._save()
+        return fields
+
+    def cachedFields(self, model: str) -> Optional[list[str]]:
+        "Field names of a note type without asking Anki, None if it is not cached"
+        with self._lock:
+            if self._valid() and model in self._models:
+                return list(self._models[model])
+        return None
+
+    def _save(self) -> None:
+        settings.setValue("internal/anki_schema", json.dumps(
+            {"server": self._server, "decks": self._decks, "models": self._models}))
+
+    def refresh(self) -> bool:
+        """
+        Request the schema from Anki. This blocks, see refreshInBackground.
+        Returns True if the schema was refreshed.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        try:
+            api = self._api()
+            decks, models = invokeMulti(api, [('deckNames', {}), ('modelNames', {})])
+            fields = getFieldsOfModels(api, list(models))
+        except Exception as e:
+            logger.debug(f"Could not refresh Anki schema: {repr(e)}")
+            return False
+        finally:
+            self._refreshing.release()
+        with self._lock:
+            changed = (api, decks, fields) != (self._server, self._decks, self._models)
+            self._server, self._decks, self._models = api, list(decks), fields
+            if changed:
+                self._save()
+        if changed:
+            logger.info(f"Anki schema changed: {len(decks)} decks, {len(fields)} note types")
+            self.updated.emit()
+        return True
+
+    def refreshInBackground(self) -> None:
+        if settings.value("enable_anki", True, type=bool):
+            QThreadPool.globalInstance().start(self._refreshQuietly)
+
+    def _refreshQuietly(self) -> None:
+        "refresh for QThreadPool.start, which takes a function that returns None"
+        self.refresh()
+
+
+anki_schema = AnkiSchema()
@@ -0,0 +1,175 @@
+"""
+Local copies of online audio files, so that they play without waiting for the network.
+Files are stored in forvopath/<language>/ under the name shown in the audio list.
+"""
+import os
+import threading
+from concurrent.futures import Future
+from functools import partial
+from itertools import islice
+from typing import Callable, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from .constants import FORVO_HEADERS
+from .global_names import forvopath, settings, logger
+from .http_session import http_sessions
+from .lookup_executor import lookup_executor, Priority
+from .single_flight import SingleFlight
+
+# Number of files of a pronunciation list downloaded in the background, from the top
+AUDIO_PREFETCH_COUNT = 3
+AUDIO_QUEUE = "audio downloads"
+# Scans and clean-ups of the cache directory, one at a time
+AUDIO_CACHE_QUEUE = "audio cache"
+AUDIO_DOWNLOAD_TIMEOUT = (3.05, 5)
+# Default limits of the downloaded files
+AUDIO_CACHE_MAX_MB = 500
+AUDIO_CACHE_MAX_FILES = 20000
+# When a limit is exceeded, files are evicted until the cache is this full
+AUDIO_CACHE_EVICT_TO = 0.9
+
+lookup_executor.setLimit(AUDIO_QUEUE, AUDIO_PREFETCH_COUNT)
+lookup_executor.setLimit(AUDIO_CACHE_QUEUE, 1)
+# A file that is played while it is being prefetched is not downloaded twice
+downloads_in_flight = SingleFlight()
+
+
+class AudioCache(QObject):
+    """
+    Keeps the downloaded audio files below a total size and a number of files.
+    The modification time of a file is its last access: files are touched when they
+    are played, and the least recently used ones are deleted first. Files returned by
+    protected, the audio of notes that are not in Anki yet, are never deleted.
+    Scanning the directory can be slow, so usageChanged is emitted whenever the
+    usage is known or changes, and the UI asks for it with usageInBackground.
+    """
+    usageChanged = pyqtSignal(object)  # (bytes, files), which may not fit in a C int
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self.protected: Callable[[], set[str]] = set
+        self._lock = threading.Lock()
+        self._usage: Optional[tuple[int, int]] = None  # bytes, files. None until the first scan
+
+    @staticmethod
+    def limits() -> tuple[int, int]:
+        "Maximum size in bytes and number of files"
+        return (settings.value("audio_cache_max_mb", AUDIO_CACHE_MAX_MB, type=int) * 1024 * 1024,
+                settings.value("audio_cache_max_files", AUDIO_CACHE_MAX_FILES, type=int))
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        "Last access, size and path of every file. Downloads in progress are left out"
+        files = []
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                if name.endswith(".part"):
+                    continue
+                fpath = os.path.join(root, name)
+                try:
+                    stat = os.stat(fpath)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, fpath))
+        return files
+
+    def usage(self) -> tuple[int, int]:
+        "Total size in bytes and number of files. Blocks while the directory is scanned the first time"
+        with self._lock:
+            scanned = self._usage is None
+            if self._usage is None:
+                files = self._scan()
+                self._usage = (sum(size for _, size, _ in files), len(files))
+            usage = self._usage
+        if scanned:
+            self.usageChanged.emit(usage)
+        return usage
+
+    def cachedUsage(self) -> Optional[tuple[int, int]]:
+        "Total size in bytes and number of files, None if the directory was not scanned yet"
+        with self._lock:
+            return self._usage
+
+    def usageInBackground(self) -> None:
+        lookup_executor.submit(AUDIO_CACHE_QUEUE, self.usage)
+
+    def evictInBackground(self) -> None:
+        lookup_executor.submit(AUDIO_CACHE_QUEUE, self.evict)
+
+    def touch(self, fpath: str) -> None:
+        try:
+            os.utime(fpath)
+        except OSError:
+            pass
+
+    def added(self, size: int) -> None:
+        "Count a downloaded file, and evict files if that exceeds a limit"
+        total, count = self.usage()
+        with self._lock:
+            self._usage = total, count = total + size, count + 1
+        self.usageChanged.emit((total, count))
+        max_bytes, max_files = self.limits()
+        if total > max_bytes or count > max_files:
+            self.evict()
+
+    def evict(self) -> int:
+        "Delete the least recently used files if a limit is exceeded. Returns the number of deleted files"
+        max_bytes, max_files = self.limits()
+        protected = {os.path.normcase(os.path.abspath(path)) for path in self.protected()}
+        removed = 0
+        with self._lock:
+            files = sorted(self._scan())
+            total, count = sum(size for _, size, _ in files), len(files)
+            if total > max_bytes or count > max_files:
+                for _, size, fpath in files:
+                    if total <= max_bytes * AUDIO_CACHE_EVICT_TO and count <= max_files * AUDIO_CACHE_EVICT_TO:
+                        break
+                    if os.path.normcase(os.path.abspath(fpath)) in protected:
+                        continue
+                    try:
+                        os.remove(fpath)
+                    except OSError:
+                        continue
+                    total, count = total - size, count - 1
+                    removed += 1
+                logger.debug(f"Evicted {removed} audio files, {count} files and {total} bytes left")
+            self._usage = total, count
+        self.usageChanged.emit((total, count))
+        return removed
+
+
+audio_cache = AudioCache(forvopath)
+
+
+def audio_cache_path(name: str, lang: str) -> str:
+    name = name.replace("::", "__")  # Windows doesn't like colons in filenames
+    return os.path.join(forvopath, lang, name)
+
+
+def download_audio(url: str, fpath: str) -> str:
+    "Download url to fpath, unless it is there already. Blocks until it is done"
+    def download():
+        if os.path.exists(fpath):
+            audio_cache.touch(fpath)
+            return fpath
+        res = http_sessions.get(url, headers=FORVO_HEADERS, timeout=AUDIO_DOWNLOAD_TIMEOUT)
+        res.raise_for_status()
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        # Written under another name first, so that a partial file is never played
+        with open(fpath + ".part", 'bw') as file:
+            file.write(res.content)
+        os.replace(fpath + ".part", fpath)
+        audio_cache.added(len(res.content))
+        return fpath
+    return str(downloads_in_flight.do(fpath, download))
+
+
+def prefetch_audios(audios: dict[str, str], lang: str) -> list[Future]:
+    "Download the first online files of an audio list in the background"
+    online = ((name, url) for name, url in audios.items() if url.startswith("https://"))
+    return [
+        lookup_executor.submit(AUDIO_QUEUE, partial(download_audio, url, audio_cache_path(name, lang)),
+                               Priority.prefetch)
+        for name, url in islice(online, AUDIO_PREFETCH_COUNT)
+    ]
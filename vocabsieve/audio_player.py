@@ -1,38 +1,70 @@
 import os
 from threading import Thread
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtCore import QUrl
+from PyQt5.QtCore import QObject, QUrl, pyqtSignal
+from concurrent.futures import Future
+from functools import partial
 from typing import Dict
-import requests
-from .constants import FORVO_HEADERS
-from .global_names import forvopath
+from .audio_cache import AUDIO_QUEUE, audio_cache, audio_cache_path, download_audio
+from .global_names import logger
+from .lookup_executor import lookup_executor
 
 
-class AudioPlayer:
-    def __init__(self) -> None:
+class AudioPlayer(QObject):
+    # Emitted from a download thread, and handled on the thread of the player
+    downloaded = pyqtSignal(str, str)  # path, error
+    # A local file started playing, so it can be used in a note
+    played = pyqtSignal(str)  # path
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
         self.player = QMediaPlayer()
+        # File to play once it is downloaded, files selected before it are not played
+        self.waiting_for = ""
+        self.downloaded.connect(self.onDownloaded)
 
     def crossplatform_play_sound(self, path):
         content = QUrl.fromLocalFile(path)
         self.player.setMedia(QMediaContent(content))
         Thread(target=self.player.play).start()
+        self.played.emit(path)
 
     def play_audio(self, name: str, data: Dict[str, str], lang: str) -> str:
+        """
+        Play an audio file of the list. Online files that are not downloaded yet,
+        usually because they are still being prefetched, play once the download is done,
+        without blocking, and played is only emitted then. Returns the local path of the file,
+        which does not exist yet in that case.
+        """
         audiopath: str = data.get(name, "")
+        self.waiting_for = ""
         if not audiopath:
             return ""
 
         if audiopath.startswith("https://"):
-            name = name.replace("::", "__")  # Windows doesn't like colons in filenames
-            fpath = os.path.join(forvopath, lang, name)
-            if not os.path.exists(fpath):
-                res = requests.get(audiopath, headers=FORVO_HEADERS, timeout=5)
-                res.raise_for_status()
-
-                os.makedirs(os.path.dirname(fpath), exist_ok=True)
-                with open(fpath, 'bw') as file:
-                    file.write(res.content)
-            audiopath = fpath
+            url, audiopath = audiopath, audio_cache_path(name, lang)
+            if not os.path.exists(audiopath):
+                self.waiting_for = audiopath
+                # Joins the prefetch of this file if there is one, see audio_cache.prefetch_audios
+                future = lookup_executor.submit(AUDIO_QUEUE, partial(download_audio, url, audiopath))
+                future.add_done_callback(partial(self._emitDownloaded, audiopath))
+                return audiopath
+            audio_cache.touch(audiopath)
 
         self.crossplatform_play_sound(audiopath)
         return audiopath
+
+    def _emitDownloaded(self, audiopath: str, future: Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        self.downloaded.emit(audiopath, repr(error) if error else "")
+
+    def onDownloaded(self, audiopath: str, error: str) -> None:
+        if audiopath != self.waiting_for:
+            return
+        self.waiting_for = ""
+        if error:
+            logger.error(f"Failed to download {audiopath}: {error}")
+            return
+        self.crossplatform_play_sound(audiopath)
@@ -1,17 +1,34 @@
-from functools import lru_cache
-import requests
 from .constants import FORVO_HEADERS
+from .http_cache import http_cache, cache_key, CachedResponse
+from .http_session import http_sessions
+from .single_flight import SingleFlight
 
+# Identical requests made at the same time, e.g. by the same source in both
+# source groups, share one network request
+requests_in_flight = SingleFlight()
 
-@lru_cache(maxsize=5000)
-def cached_get(url, forvo_headers=False):
+
+def cached_get(url, forvo_headers=False, cache=True) -> CachedResponse:
     """
-    Cached requests.get
-    Note this will throw an exception, which is not cached
+    requests.get with a persistent cache, see http_cache
+    Error responses are cached too, and raise requests.HTTPError every time.
+    Connection errors are not cached.
+    With cache=False, the response is neither read from nor written to the cache,
+    for callers that cache what they make of it instead.
     """
-    if forvo_headers:
-        res = requests.get(url, headers=FORVO_HEADERS, timeout=10)
-    else:
-        res = requests.get(url, timeout=10)
+    headers = FORVO_HEADERS if forvo_headers else None
+    res = http_cache.get(url, headers) if cache else None
+    if res is None:
+        res = requests_in_flight.do(cache_key(url, headers), lambda: fetch(url, headers, cache))
     res.raise_for_status()
     return res
+
+
+def fetch(url, headers, cache=True) -> CachedResponse:
+    # The request may have finished just before this one started
+    res = http_cache.get(url, headers) if cache else None
+    if res is None:
+        res = CachedResponse.from_response(http_sessions.get(url, headers=headers))
+        if cache:
+            http_cache.put(url, res, headers)
+    return res
@@ -1,7 +1,9 @@
 from .base_tab import BaseTab
 from PyQt5.QtWidgets import QLabel, QFormLayout, QPushButton, QComboBox, QCheckBox, QLineEdit
 from PyQt5.QtCore import pyqtSlot
-from ..tools import addDefaultModel, getDeckList, getNoteTypes, getFields, getVersion
+from ..tools import addDefaultModel
+from ..anki_schema import anki_schema
+from ..anki_health import anki_health
 from ..global_names import settings, logger
 
 
@@ -17,6 +19,8 @@ class AnkiTab(BaseTab):
                 pass
 
     def initWidgets(self):
+        # The schema is global, so its signal is disconnected when the dialog closes
+        self.following_schema = False
         self.enable_anki = QCheckBox("Enable sending notes to Anki")
         self.anki_api = QLineEdit()
         self.deck_name = QComboBox()
@@ -40,8 +44,7 @@ class AnkiTab(BaseTab):
 
     def loadDecks(self):
         logger.debug("Loading decks")
-        api = self.anki_api.text()
-        decks = getDeckList(api)
+        decks = anki_schema.decks()
         logger.info(f"Decks: {decks}")
         self.deck_name.blockSignals(True)
         self.deck_name.clear()
@@ -49,22 +52,29 @@ class AnkiTab(BaseTab):
         self.deck_name.setCurrentText(settings.value("deck_name"))
         self.deck_name.blockSignals(False)
 
-        note_types = getNoteTypes(api)
+        note_types = anki_schema.noteTypes()
         self.note_type.blockSignals(True)
         self.note_type.clear()
         self.note_type.addItems(note_types)
         self.note_type.setCurrentText(settings.value("note_type"))
         self.note_type.blockSignals(False)
 
+    def reloadSchema(self):
+        "Show decks and fields that changed in Anki while the settings are open"
+        self.deck_name.blockSignals(True)
+        self.note_type.blockSignals(True)
+        self.loadDecks()
+        self.deck_name.blockSignals(False)
+        self.note_type.blockSignals(False)
+        self.loadFields()
+
     def loadFields(self):
         logger.debug("Loading fields")
-        api = self.anki_api.text()
-
         current_type = self.note_type.currentText()
         if current_type == "":
             return
 
-        fields = getFields(api, current_type)
+        fields = anki_schema.fields(current_type)
         # Temporary store fields
         sent = self.sentence_field.currentText()
         word = self.word_field.currentText()
@@ -140,11 +150,17 @@ class AnkiTab(BaseTab):
         self.image_field.blockSignals(False)
         logger.debug("Fields loaded")
 
+    def stopFollowingSchema(self) -> None:
+        if self.following_schema:
+            anki_schema.updated.disconnect(self.reloadSchema)
+            self.following_schema = False
+
     def onDefaultNoteType(self):
         try:
             addDefaultModel(settings.value("anki_api", 'http://127.0.0.1:8765'))
         except Exception as e:
             logger.error(e)
+        anki_schema.refresh()
         self.loadDecks()
         self.loadFields()
         self.note_type.setCurrentText("vocabsieve-notes")
@@ -215,15 +231,18 @@ class AnkiTab(BaseTab):
         self.register_config_handler(self.enable_anki, 'enable_anki', True)
         self.enable_anki.clicked.connect(self.toggle_anki_settings)
         self.toggle_anki_settings(self.enable_anki.isChecked())
-        api = self.anki_api.text()
-        try:
-            _ = getVersion(api)
-        except Exception:
+        if not anki_health.available:
             logger.warning("AnkiConnect API is not available, disabling Anki settings for now")
             self.toggle_anki_settings(False)
         else:
+            if not anki_schema.noteTypes():
+                anki_schema.refresh()
+            else:
+                anki_schema.refreshInBackground()
             self.loadDecks()
             self.loadFields()
+            anki_schema.updated.connect(self.reloadSchema)
+            self.following_schema = True
             self.register_config_handler(
                 self.deck_name, 'deck_name', 'Default')
             self.register_config_handler(self.tags, 'tags', 'vocabsieve')
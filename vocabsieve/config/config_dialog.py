@@ -60,8 +60,17 @@ class ConfigDialog(QDialog):
         self.tab_g.sources_reloaded_signal.connect(self.tab_p.setupSelector)
         self.tab_m.nuke.connect(self.nuke_profile)
         self.tab_m.reset.connect(self.reset_settings)
+        self.tab_m.maintain.connect(self.run_maintenance)
+        self._parent.maintainer.maintained.connect(self.tab_m.showLastMaintained)
+        self.finished.connect(self.onFinished)
         self.tab_g.load_dictionaries()
 
+    def onFinished(self) -> None:
+        "Disconnect the tabs from global objects, which outlive the dialog"
+        self.tab_a.stopFollowingSchema()
+        self.tab_m.stopFollowingAudioCache()
+        self._parent.maintainer.maintained.disconnect(self.tab_m.showLastMaintained)
+
     def reset_settings(self):
         answer = QMessageBox.question(
             self,
@@ -76,6 +85,10 @@ class ConfigDialog(QDialog):
             settings.clear()
             self.close()
 
+    def run_maintenance(self):
+        if self._parent.maintainer.runNow():
+            self.tab_m.last_maintained_label.setText("Maintenance is running..")
+
     def nuke_profile(self):
         datapath = self._parent.datapath
         answer = QMessageBox.question(
@@ -98,7 +98,7 @@ to be reimported, otherwise this operation will fail.\
         fdialog = QFileDialog()
         fdialog.setFileMode(QFileDialog.ExistingFile)
         fdialog.setNameFilter(
-            "Dictionary files (*.json *.ifo *.mdx *.dsl *.dsl.dz *.csv *.tsv *.json.xz *.json.bz2 *.json.gz)")
+            "Dictionary files (*.json *.jsonl *.ifo *.mdx *.dsl *.dsl.dz *.csv *.tsv *.json.xz *.json.bz2 *.json.gz *.jsonl.gz)")
         fdialog.exec()
         if fdialog.selectedFiles() == []:
             return
@@ -210,47 +210,68 @@ class AddDictDialog(QDialog):
         else:
             self.lang.setCurrentText(
                 langcodes[settings.value("target_language", 'en')])
+        self.extra_langs = QLineEdit()
+        self.extra_langs.setPlaceholderText("e.g. fr,es")
+        self.extra_langs.setToolTip(
+            "Wiktionary dumps from Kaikki can contain many languages.\n"
+            "Each language listed here is imported in the same pass, as a separate dictionary.")
+        self.type.currentTextChanged.connect(self.setAvailable)
+        self.setAvailable()
         self.commit_button = QPushButton("Add")
         self.commit_button.clicked.connect(self.commit)
 
+    def setAvailable(self):
+        self.extra_langs.setEnabled(supported_dict_formats.inverse[self.type.currentText()] == "wiktdump")
+
     def setupWidgets(self):
         self._layout = QFormLayout(self)
         self._layout.addRow(QLabel("Name"), self.name)
         self._layout.addRow(QLabel("Type"), self.type)
         self._layout.addRow(QLabel("Language"), self.lang)
+        self._layout.addRow(QLabel("Also import languages"), self.extra_langs)
         self._layout.addRow(self.commit_button)
 
     def commit(self):
         "Give it a name, then add dictionary"
         name = self.name.text()
         dicts = json.loads(settings.value("custom_dicts", '[]'))
+        dicttype = supported_dict_formats.inverse[self.type.currentText()]
         lang = langcodes.inverse[self.lang.currentText()]
-        existing_names = getDictsForLang(lang, dicts)\
-            + getFreqlistsForLang(lang, dicts)\
-            + getAudioDictsForLang(lang, dicts)\
-            + ['wikt-en', 'gtrans', '####METAINFO']
-        if name.lower() in [n.lower() for n in existing_names]:
-            # Name conflict!!
-            QMessageBox.critical(
-                self,
-                "Name conflict",
-                f"A dictionary with name '{name}' already exists. "
-                + "Please choose a different name",
-            )
-            return
+        # Name of the dictionary of each language to import
+        names = {lang: name}
+        if self.extra_langs.isEnabled():
+            for extra_lang in filter(None, map(str.strip, self.extra_langs.text().split(","))):
+                if extra_lang not in langcodes:
+                    self.warn(f"Unknown language code '{extra_lang}'")
+                    return
+                names.setdefault(extra_lang, f"{name}-{extra_lang}")
+        for lang_, name_ in names.items():
+            existing_names = getDictsForLang(lang_, dicts)\
+                + getFreqlistsForLang(lang_, dicts)\
+                + getAudioDictsForLang(lang_, dicts)\
+                + ['wikt-en', 'gtrans', '####METAINFO']
+            if name_.lower() in [n.lower() for n in existing_names]:
+                # Name conflict!!
+                QMessageBox.critical(
+                    self,
+                    "Name conflict",
+                    f"A dictionary with name '{name_}' already exists. "
+                    + "Please choose a different name",
+                )
+                return
 
-        dictdb.dictimport(
-            self.path,
-            supported_dict_formats.inverse[self.type.currentText()],
-            lang,
-            self.name.text())
-        dicts.append({"name": self.name.text(),
-                      "type": supported_dict_formats.inverse[self.type.currentText()],
-                      "path": self.path,
-                      "lang": langcodes.inverse[self.lang.currentText()],
-                      })
+        if len(names) > 1:
+            dictdb.importKaikkiLanguages(self.path, names)
+        else:
+            dictdb.dictimport(self.path, dicttype, lang, name)
+        for lang_, name_ in names.items():
+            dicts.append({"name": name_,
+                          "type": dicttype,
+                          "path": self.path,
+                          "lang": lang_,
+                          })
         settings.setValue("custom_dicts", json.dumps(dicts))
-        self.parent.status(f"Importing {self.name.text()} to database..")
+        self.parent.status(f"Importing {', '.join(names.values())} to database..")
         self.parent.refresh()
         self.parent.status("Importing done.")
         self.parent.showStats()
@@ -1,6 +1,6 @@
 from PyQt5.QtWidgets import QDialog, QGridLayout, QLabel, QComboBox
 import json
-from ..tools import getNoteTypes, getFields
+from ..anki_schema import anki_schema
 from ..global_names import settings
 
 
@@ -8,13 +8,10 @@ class FieldMatcher(QDialog):
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
-        api = settings.value("anki_api", "http://127.0.0.1:8765")
-        self.models = getNoteTypes(api)
+        self.models = anki_schema.noteTypes()
         if not self.models:
             return
-        self.fields = {}
-        for model in self.models:
-            self.fields[model] = getFields(api, model)
+        self.fields = {model: anki_schema.fields(model) for model in self.models}
         self._layout = QGridLayout(self)
 
         self.word_comboboxes = {}
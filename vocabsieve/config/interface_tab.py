@@ -23,6 +23,9 @@ class InterfaceTab(BaseTab):
 
         self.text_scale_label = QLabel("1.00x")
         self.text_scale_box = QWidget()
+        self.hover_lookup_delay = QSpinBox()
+        self.prefetch_enabled = QCheckBox("Prefetch unknown words of new sentences")
+        self.prefetch_rate = QSpinBox()
 
     def setupWidgets(self):
         self.freq_display_mode.addItems([
@@ -49,6 +52,21 @@ class InterfaceTab(BaseTab):
         self.minimum_main_window_width.setToolTip(
             "Set desired minimum window width of the main application - useful to make window snipping easier.")
 
+        self.hover_lookup_delay.setMinimum(0)
+        self.hover_lookup_delay.setMaximum(2000)
+        self.hover_lookup_delay.setSingleStep(50)
+        self.hover_lookup_delay.setSuffix(" ms")
+        self.hover_lookup_delay.setToolTip(
+            "When looking up words by hovering, only look up a word after the cursor stayed on it this long.")
+
+        self.prefetch_enabled.setToolTip(
+            "When a new sentence is copied, look up its unknown words in the online sources in the background,\n"
+            "so that looking them up later is instant.")
+        self.prefetch_rate.setMinimum(1)
+        self.prefetch_rate.setMaximum(600)
+        self.prefetch_rate.setSuffix(" lookups/min")
+        self.prefetch_rate.setToolTip("Limits the bandwidth used by prefetching.")
+
         self.theme.currentTextChanged.connect(self.setupTheme)
         self.text_scale.valueChanged.connect(
             lambda _: self.text_scale_label.setText(format(self.text_scale.value() / 100, "1.2f") + "x")
@@ -92,6 +110,9 @@ class InterfaceTab(BaseTab):
         layout.addRow("Accent color", self.accent_color)
         layout.addRow(self.allow_editing)
         layout.addRow(QLabel("Frequency display mode"), self.freq_display_mode)
+        layout.addRow(QLabel("Hover lookup delay"), self.hover_lookup_delay)
+        layout.addRow(self.prefetch_enabled)
+        layout.addRow(QLabel("Prefetch rate"), self.prefetch_rate)
         #layout.addRow(QLabel("*Interface layout orientation"), self.orientation)
         layout.addRow(QLabel("*Text scale"), self.text_scale_box)
 
@@ -102,3 +123,6 @@ class InterfaceTab(BaseTab):
         self.register_config_handler(self.text_scale, 'text_scale', '100')
         self.register_config_handler(self.theme, 'theme', 'auto')
         self.register_config_handler(self.minimum_main_window_width, 'minimum_width', 550)
+        self.register_config_handler(self.hover_lookup_delay, 'hover_lookup_delay', 200)
+        self.register_config_handler(self.prefetch_enabled, 'prefetch_enabled', False)
+        self.register_config_handler(self.prefetch_rate, 'prefetch_rate', 120)
@@ -2,12 +2,16 @@ from PyQt5.QtWidgets import (QFormLayout, QCheckBox, QLabel,
                              QSpinBox, QPushButton, QComboBox)
 from PyQt5.QtGui import QImageWriter
 from PyQt5.QtCore import pyqtSignal
+from typing import Optional
 from .base_tab import BaseTab
+from ..maintenance import DatabaseMaintainer
+from ..audio_cache import audio_cache, AUDIO_CACHE_MAX_MB, AUDIO_CACHE_MAX_FILES
 
 
 class MiscTab(BaseTab):
     nuke = pyqtSignal()
     reset = pyqtSignal()
+    maintain = pyqtSignal()
 
     def initWidgets(self):
         self.capitalize_first_letter = QCheckBox(
@@ -24,6 +28,22 @@ class MiscTab(BaseTab):
 
         self.img_quality = QSpinBox()
 
+        self.last_maintained_label = QLabel()
+        self.maintain_button = QPushButton("Run maintenance now")
+        self.maintain_button.setToolTip(
+            "Optimize the databases and give unused space back to the disk. "
+            "This normally happens automatically in the background when VocabSieve is idle.\n"
+            "Running it by hand also converts databases from older versions once, "
+            "which can take a while for large dictionaries.")
+
+        self.audio_cache_label = QLabel()
+        self.audio_cache_max_mb = QSpinBox()
+        self.audio_cache_max_files = QSpinBox()
+        self.audio_cache_button = QPushButton("Clean up now")
+        self.audio_cache_button.setToolTip(
+            "Delete the least recently played audio files until the limits are met. "
+            "This normally happens automatically when audio files are downloaded.")
+
     def setupWidgets(self):
         supported_img_formats = list(map(lambda s: bytes(s).decode(), QImageWriter.supportedImageFormats()))
         self.img_format.addItems(
@@ -36,6 +56,37 @@ class MiscTab(BaseTab):
         self.img_quality.setMaximum(100)
         self.reset_button.clicked.connect(self.reset.emit)
         self.nuke_button.clicked.connect(self.nuke.emit)
+        self.maintain_button.clicked.connect(self.maintain.emit)
+        self.showLastMaintained()
+        self.audio_cache_max_mb.setMinimum(10)
+        self.audio_cache_max_mb.setMaximum(100000)
+        self.audio_cache_max_mb.setSuffix(" MB")
+        self.audio_cache_max_files.setMinimum(100)
+        self.audio_cache_max_files.setMaximum(10000000)
+        self.audio_cache_button.clicked.connect(self.cleanAudioCache)
+        audio_cache.usageChanged.connect(self.showAudioCacheUsage)
+        self.showAudioCacheUsage()
+
+    def showAudioCacheUsage(self, usage: Optional[tuple[int, int]] = None) -> None:
+        "The audio directory is scanned in the background the first time"
+        if usage is None:
+            usage = audio_cache.cachedUsage()
+        if usage is None:
+            self.audio_cache_label.setText("Downloaded audio: counting files..")
+            audio_cache.usageInBackground()
+            return
+        size, count = usage
+        self.audio_cache_label.setText(f"Downloaded audio: {count} files, {size / 1024 / 1024:.1f} MB")
+
+    def cleanAudioCache(self):
+        self.audio_cache_label.setText("Downloaded audio: cleaning up..")
+        audio_cache.evictInBackground()
+
+    def stopFollowingAudioCache(self) -> None:
+        audio_cache.usageChanged.disconnect(self.showAudioCacheUsage)
+
+    def showLastMaintained(self, _=None):
+        self.last_maintained_label.setText("Last maintained: " + DatabaseMaintainer.lastMaintainedText())
 
     def setupLayout(self):
         layout = QFormLayout(self)
@@ -45,6 +96,13 @@ class MiscTab(BaseTab):
         layout.addRow(QLabel("<i>◊ WebP, JPG, GIF are lossy, which create smaller files.</i>"))
         layout.addRow(QLabel("Image quality"), self.img_quality)
         layout.addRow(QLabel("<i>◊ Between 0 and 100. -1 uses the default value from Qt.</i>"))
+        layout.addRow(QLabel("<h3>Database maintenance</h3>"))
+        layout.addRow(self.last_maintained_label, self.maintain_button)
+        layout.addRow(QLabel("<h3>Audio cache</h3>"))
+        layout.addRow(self.audio_cache_label, self.audio_cache_button)
+        layout.addRow(QLabel("Maximum size"), self.audio_cache_max_mb)
+        layout.addRow(QLabel("Maximum number of files"), self.audio_cache_max_files)
+        layout.addRow(QLabel("<i>◊ Audio of notes that are not in Anki yet is never deleted.</i>"))
         layout.addRow(QLabel("<h3>Reset</h3>"))
         layout.addRow(QLabel("Your data will be lost forever! There is NO cloud backup."))
         layout.addRow(QLabel("<strong>Reset all settings to defaults</strong>"), self.reset_button)
@@ -54,3 +112,5 @@ class MiscTab(BaseTab):
         self.register_config_handler(self.capitalize_first_letter, 'capitalize_first_letter', False)
         self.register_config_handler(self.img_format, 'img_format', 'jpg')
         self.register_config_handler(self.img_quality, 'img_quality', -1)
+        self.register_config_handler(self.audio_cache_max_mb, 'audio_cache_max_mb', AUDIO_CACHE_MAX_MB)
+        self.register_config_handler(self.audio_cache_max_files, 'audio_cache_max_files', AUDIO_CACHE_MAX_FILES)
@@ -1,8 +1,9 @@
 from PyQt5.QtWidgets import (QFormLayout, QLabel, QLineEdit,
-                             QSpinBox, QPushButton)
+                             QSpinBox, QPushButton, QComboBox, QFileDialog)
 from .base_tab import BaseTab
 from .fieldmatcher import FieldMatcher
-from ..tools import findNotes, getVersion, guiBrowse
+from ..tools import findNotes, guiBrowse
+from ..anki_collection import AnkiCollection
 from ..global_names import settings, logger
 
 
@@ -12,6 +13,14 @@ class TrackingTab(BaseTab):
         self.getMatchedCards()
 
     def initWidgets(self):
+        self.tracking_source = QComboBox()
+        self.tracking_source.setToolTip(
+            "AnkiConnect requires Anki to be running.\n"
+            "Reading the collection file directly is much faster and works with Anki closed, "
+            "but only supports simple queries using prop:ivl, is:, deck: and note:.")
+        self.anki_collection_path = QLineEdit()
+        self.anki_collection_path.setPlaceholderText("Path to collection.anki2 in your Anki profile folder")
+        self.anki_collection_browse = QPushButton("Browse")
         self.anki_query_mature = QLineEdit()
         self.mature_count_label = QLabel("")
         self.anki_query_young = QLineEdit()
@@ -54,6 +63,8 @@ class TrackingTab(BaseTab):
             "Comma-separated list of languages that you know. These will be used to determine whether a word is cognate or not.")
 
     def setupWidgets(self):
+        self.tracking_source.addItems(["AnkiConnect", "Collection file"])
+        self.anki_collection_browse.clicked.connect(self.browseCollection)
         self.anki_query_mature.editingFinished.connect(self.getMatchedCards)
         self.anki_query_young.editingFinished.connect(self.getMatchedCards)
         self.preview_young_button.clicked.connect(self.previewYoung)
@@ -64,15 +75,27 @@ class TrackingTab(BaseTab):
         fieldmatcher = FieldMatcher(self)
         fieldmatcher.exec()
 
+    def browseCollection(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Select Anki collection", self.anki_collection_path.text(), "Anki collection (*.anki2)")
+        if path:
+            self.anki_collection_path.setText(path)
+            self.getMatchedCards()
+
     def getMatchedCards(self):
         if settings.value("enable_anki", True):
             try:
-                api = settings.value('anki_api', 'http://127.0.0.1:8765')
                 query_mature = self.anki_query_mature.text()
-                mature_notes = findNotes(api, query_mature)
-                self.mature_count_label.setText(f"Matched {str(len(mature_notes))} notes")
                 query_young = self.anki_query_young.text()
-                young_notes = findNotes(api, query_young)
+                if self.tracking_source.currentText() == "Collection file":
+                    with AnkiCollection(self.anki_collection_path.text()) as collection:
+                        mature_notes = collection.findNotes(query_mature)
+                        young_notes = collection.findNotes(query_young)
+                else:
+                    api = settings.value('anki_api', 'http://127.0.0.1:8765')
+                    mature_notes = findNotes(api, query_mature)
+                    young_notes = findNotes(api, query_young)
+                self.mature_count_label.setText(f"Matched {str(len(mature_notes))} notes")
                 young_notes = [note for note in young_notes if note not in mature_notes]
                 self.young_count_label.setText(f"Matched {str(len(young_notes))} notes")
             except Exception as e:
@@ -84,6 +107,8 @@ class TrackingTab(BaseTab):
         layout.addRow(QLabel("Use the Anki Card Browser to make a query string. "
                              "<br>Mature cards are excluded from the list of young cards automatically"))
 
+        layout.addRow(QLabel("Read Anki data from"), self.tracking_source)
+        layout.addRow(self.anki_collection_browse, self.anki_collection_path)
         layout.addRow(QLabel("Query string for 'mature' cards"), self.anki_query_mature)
         layout.addRow(self.mature_count_label, self.preview_mature_button)
         layout.addRow(QLabel("Query string for 'young' cards"), self.anki_query_young)
@@ -103,20 +128,21 @@ class TrackingTab(BaseTab):
 
     def previewMature(self):
         try:
-            _ = getVersion(api := settings.value('anki_api', 'http://127.0.0.1:8765'))
-            guiBrowse(api, self.anki_query_mature.text())
+            guiBrowse(settings.value('anki_api', 'http://127.0.0.1:8765'), self.anki_query_mature.text())
         except Exception as e:
             logger.warning(repr(e))
 
     def previewYoung(self):
         try:
-            _ = getVersion(api := settings.value('anki_api', 'http://127.0.0.1:8765'))
-            guiBrowse(api, self.anki_query_young.text())
+            guiBrowse(settings.value('anki_api', 'http://127.0.0.1:8765'), self.anki_query_young.text())
         except Exception as e:
             logger.warning(repr(e))
 
     def setupAutosave(self):
 
+        self.register_config_handler(self.tracking_source, 'tracking/source', "AnkiConnect")
+        self.register_config_handler(self.anki_collection_path, 'tracking/anki_collection_path', "")
+        self.tracking_source.currentTextChanged.connect(self.getMatchedCards)
         self.register_config_handler(self.anki_query_mature, 'tracking/anki_query_mature', "prop:ivl>=14")
         self.register_config_handler(self.anki_query_young, 'tracking/anki_query_young', "prop:ivl<14 is:review")
         self.register_config_handler(self.known_threshold, 'tracking/known_threshold', 100)
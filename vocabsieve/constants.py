@@ -204,3 +204,6 @@ langcodes['ceb'] = "Cebuano"
 langcodes['hmn'] = "Hmong"
 langcodes['grc'] = "Ancient Greek"
 langcodes['<all>'] = "<all languages>"
+
+# Languages written without spaces between words, so sentences cannot be split into words with str.split
+NO_SPACE_LANGS = {'zh', 'zh_HANT', 'ja', 'th', 'lo', 'km', 'my', 'bo'}
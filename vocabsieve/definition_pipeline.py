@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Optional, Sequence
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from .global_names import logger
+from .lookup_executor import Priority, lookup_executor
+from .models import Definition, DictionarySource, AudioSource, Source
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedWord:
+    '''Definitions and audio found for one word of an import'''
+    definition1: Optional[Definition] = None
+    definition2: Optional[Definition] = None
+    audio_path: str = ""
+
+
+class DefinitionPipeline(QObject):
+    """
+    Looks up the words of an import on the shared lookup executor, so that
+    the concurrency limit of each source is shared with the other lookups of the
+    application, and words being looked up by the user are handled first.
+    The sources of a word are tried one after the other, each as a separate task,
+    so no worker ever waits for another one.
+    resolved is emitted with the index of each word as soon as it is looked up,
+    which is not necessarily in order, and done when all words are handled or
+    the pipeline was cancelled.
+    """
+    resolved = pyqtSignal(int, object)  # index, ResolvedWord
+    done = pyqtSignal()
+
+    def __init__(self,
+                 sources1: Sequence[DictionarySource],
+                 sources2: Sequence[DictionarySource],
+                 audio_sources: Sequence[AudioSource]) -> None:
+        super().__init__()
+        self.sources1 = list(sources1)
+        self.sources2 = list(sources2)
+        self.audio_sources = list(audio_sources)
+        # Lookups of a word, in order: the field that is filled and the source
+        self._steps: list[tuple[str, Source]] = [
+            *(("definition1", source) for source in self.sources1),
+            *(("definition2", source) for source in self.sources2),
+            *(("audio_path", source) for source in self.audio_sources),
+        ]
+        self._cancelled = threading.Event()
+        self._futures: set[Future] = set()
+        self._lock = threading.Lock()
+        self.total = 0
+        self.completed = 0
+        self.started_at = 0.0
+
+    def start(self, words: list[str]) -> None:
+        self.total = len(words)
+        self.completed = 0
+        self.started_at = time.time()
+        if not words:
+            self.done.emit()
+            return
+        for index, word in enumerate(words):
+            self._next(index, word, 0, ResolvedWord())
+
+    def cancel(self) -> None:
+        "Stop looking up new words. Words that are being looked up are finished, but not reported"
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        with self._lock:
+            futures, self._futures = self._futures, set()
+        for future in futures:
+            future.cancel()
+        self.done.emit()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def throughput(self) -> float:
+        "Words looked up per second since the start"
+        elapsed = time.time() - self.started_at
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def _next(self, index: int, word: str, step: int, result: ResolvedWord) -> None:
+        "Submit the first lookup from step on whose field is not found yet"
+        while step < len(self._steps) and getattr(result, self._steps[step][0]):
+            step += 1
+        if step == len(self._steps):
+            self._finish(index, result)
+            return
+        source = self._steps[step][1]
+        future = lookup_executor.submitLookup(source, partial(source.define, word), Priority.prefetch)
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+                return
+            self._futures.add(future)
+        future.add_done_callback(partial(self._onLookedUp, index, word, step, result))
+
+    def _onLookedUp(self, index: int, word: str, step: int, result: ResolvedWord, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        if future.cancelled() or self.cancelled:
+            return
+        field = self._steps[step][0]
+        try:
+            definitions = future.result()
+            if field == "audio_path":
+                if definitions:
+                    # Only the first audio source with any result is used
+                    audios = definitions[0].audios
+                    result = replace(result, audio_path=audios[next(iter(audios))] if audios else "")
+                    step = len(self._steps) - 1
+            else:
+                # Same as MultiDefinitionWidget.getFirstDefinition
+                found = next((defi for defi in definitions if defi.definition is not None), None)
+                if found is not None:
+                    result = replace(result, **{field: found})
+        except Exception as e:
+            if field != "audio_path":
+                logger.error(f"Could not look up {word}: {repr(e)}")
+                self._finish(index, ResolvedWord())
+                return
+            logger.debug(f"Could not get audio for {word}: {repr(e)}")
+            step = len(self._steps) - 1
+        self._next(index, word, step + 1, result)
+
+    def _finish(self, index: int, result: ResolvedWord) -> None:
+        if self.cancelled:
+            return
+        with self._lock:
+            self.completed += 1
+            finished = self.completed == self.total
+        self.resolved.emit(index, result)
+        if finished:
+            self.done.emit()
@@ -1,4 +1,4 @@
-from typing import TextIO
+from typing import Callable, Collection, Iterable, Iterator, Optional, TextIO
 from loguru import logger
 from readmdict import MDX
 from bidict import bidict
@@ -9,8 +9,11 @@ import gzip
 import bz2
 import csv
 import json
-from itertools import groupby
-from operator import itemgetter
+from collections import deque
+from contextlib import nullcontext
+from itertools import islice
+from multiprocessing import Pool
+from .kaikki_index import is_bgzf
 
 
 supported_dict_formats = bidict({
@@ -18,6 +21,7 @@ supported_dict_formats = bidict({
     "json": "Simple JSON",
     "migaku": "Migaku Dictionary",
     "wiktdump": "Wiktionary dump",
+    "wiktindex": "Wiktionary dump (indexed, no import)",
     "freq": "Frequency list",
     "audiolib": "Audio Library",
     "mdx": "MDX",
@@ -27,8 +31,11 @@ supported_dict_formats = bidict({
     "cognates": "Cognate data"
 })
 
+# Lines of a Kaikki dump sent to a worker process at a time
+KAIKKI_CHUNK_LINES = 2000
+
 supported_dict_extensions = [
-    ".json", ".ifo", ".mdx", ".dsl", ".dz", ".csv", ".tsv", ".xz", ".bz2", ".gz"
+    ".json", ".jsonl", ".ifo", ".mdx", ".dsl", ".dz", ".csv", ".tsv", ".xz", ".bz2", ".gz"
 ]
 
 
@@ -84,8 +91,19 @@ def dictinfo(path) -> dict[str, str]:
         return {"type": "audiolib", "basename": basename, "path": path}
     if ext not in supported_dict_extensions:
         raise NotImplementedError("Unsupported format")
-    if ext in ('.json', '.xz', '.bz2', '.gz'):
+    if ext in ('.json', '.jsonl', '.xz', '.bz2', '.gz'):
         with zopen(path) as f:
+            # Kaikki dumps are lines of JSON objects and can be huge, so they are
+            # recognized by their first line instead of trying to parse them whole
+            try:
+                first = json.loads(f.readline())
+            except json.decoder.JSONDecodeError:
+                first = None
+            if isinstance(first, dict) and "word" in first and "lang_code" in first:
+                # Compressed with bgzip, it can be used without importing it
+                dicttype = "wiktindex" if is_bgzf(path) else "wiktdump"
+                return {"type": dicttype, "basename": basename, "path": path}
+            f.seek(0)
             try:
                 d = json.load(f)
                 if isinstance(d, list):
@@ -249,21 +267,61 @@ def parseKaikki(path, lang) -> dict[str, str]:
     (https://github.com/tatuylonen/wiktextract)
     The format is lines of json objects, each containing a word and its definition
     '''
-    print("Parsing Kaikki wiktionary dump at " + path)
-    items: list[tuple[str, str]] = []
-    with zopen(path) as f:
-        logger.debug("Parsing Kaikki wiktionary dump at " + path)
-        logger.debug("Only importing entries in language " + lang)
-        for line in f:
-            data = json.loads(line)
-            # Kaikki dumps may have multiple languages, skip others for now
-            if data.get("lang_code") == lang:
-                items.append((data['word'], kaikki_line_to_textdef(data)))
-        logger.debug(f"Found {len(items)} entries")
+    return parseKaikkiMulti(path, [lang])[lang]
+
+
+def _parse_kaikki_lines(args: tuple[list[str], frozenset[str]]) -> list[tuple[str, str, str]]:
+    "Language, headword and definition of the entries in the given languages"
+    lines, langs = args
+    items = []
+    for line in lines:
+        data = json.loads(line)
+        if data.get("lang_code") in langs:
+            items.append((data['lang_code'], data['word'], kaikki_line_to_textdef(data)))
+    return items
+
+
+def _chunks(f: TextIO, size: int) -> Iterator[list[str]]:
+    while chunk := list(islice(f, size)):
+        yield chunk
+
+
+def _bounded_imap(pool, fn: Callable, tasks: Iterable, window: int) -> Iterator:
+    "Like pool.imap, but reading at most window tasks ahead, so that huge inputs are not read into memory"
+    pending: deque = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(fn, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def parseKaikkiMulti(path, langs: Collection[str], workers: Optional[int] = None) -> dict[str, dict[str, str]]:
+    '''
+    Parse the entries of several languages from a Kaikki dump in one pass.
+    Lines are decoded by a pool of worker processes, since decoding takes most of
+    the time for dumps with all languages. Definitions of the same headword are
+    combined in the order they appear in, wherever they are in the dump.
+    '''
+    logger.debug(f"Parsing Kaikki wiktionary dump at {path} for languages {', '.join(langs)}")
+    lang_set = frozenset(langs)
+    entries: dict[str, dict[str, list[str]]] = {lang: {} for lang in lang_set}
+    if workers is None:
+        workers = max((os.cpu_count() or 2) - 1, 1)
+    with zopen(path) as f, (Pool(workers) if workers > 1 else nullcontext()) as pool:
+        tasks = ((chunk, lang_set) for chunk in _chunks(f, KAIKKI_CHUNK_LINES))
+        # Results come in the order of the chunks, so definitions stay in dump order
+        results = (_bounded_imap(pool, _parse_kaikki_lines, tasks, workers * 2) if pool
+                   else map(_parse_kaikki_lines, tasks))
+        for items in results:
+            for lang, word, definition in items:
+                entries[lang].setdefault(word, []).append(definition)
     # Combine all definitions for each headword
-    res = dict((word, "\n\n".join([item[1] for item in itr]))
-               for word, itr in groupby(items, itemgetter(0)))
-    logger.debug(f"For {len(res)} headwords")
+    res = {lang: {word: "\n\n".join(definitions) for word, definitions in words.items()}
+           for lang, words in entries.items()}
+    for lang, words in res.items():
+        logger.debug(f"Found {len(words)} headwords in language {lang}")
     return res
 
 
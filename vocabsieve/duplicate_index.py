@@ -0,0 +1,98 @@
+import re
+import threading
+from functools import partial
+from PyQt5.QtCore import QObject, pyqtSignal
+from .global_names import logger
+from .tools import findNotes, escape_search
+from .anki_schema import anki_schema
+from .lookup_executor import lookup_executor
+
+# Queue of the lookup executor for duplicate checks with AnkiConnect
+DUPLICATE_QUEUE = "anki duplicates"
+
+
+def normalize_field(value: str) -> str:
+    "Anki compares the first field without formatting, but case-sensitively, when looking for duplicates"
+    return re.sub(r"<.*?>", "", value).strip()
+
+
+class DuplicateIndex(QObject):
+    """
+    In-memory index of the first field values of Anki notes, per note type.
+    It is seeded from the Anki note cache in the records database and updated when
+    notes are added, so that checking for duplicates does not wait for AnkiConnect.
+    The note cache only has the tracked notes, so lookup() also asks Anki in the
+    background, and confirmed is emitted if Anki's answer differs from the index.
+    """
+    confirmed = pyqtSignal(str, str, list)  # note type, value, note ids
+
+    def __init__(self, rec, parent=None) -> None:
+        super().__init__(parent)
+        self.rec = rec
+        # note type -> {normalized first field -> note ids}
+        self._values: dict[str, dict[str, set[int]]] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, model: str) -> dict[str, set[int]]:
+        "Must be called with the lock held"
+        if model not in self._values:
+            index: dict[str, set[int]] = {}
+            for note_id, value in self.rec.getAnkiFirstFields(model):
+                index.setdefault(normalize_field(value), set()).add(note_id)
+            self._values[model] = index
+            logger.debug(f"Loaded {len(index)} first field values of note type {model}")
+        return self._values[model]
+
+    def reload(self) -> None:
+        "Merge notes that were cached since the index was loaded"
+        with self._lock:
+            for model, index in self._values.items():
+                for note_id, value in self.rec.getAnkiFirstFields(model):
+                    index.setdefault(normalize_field(value), set()).add(note_id)
+
+    def find(self, model: str, value: str) -> list[int]:
+        with self._lock:
+            return sorted(self._index(model).get(normalize_field(value), ()))
+
+    def lookup(self, api: str, model: str, value: str) -> list[int]:
+        "Notes of this type with this first field value in the index. Anki is asked in the background"
+        self.confirmInBackground(api, model, value)
+        return self.find(model, value)
+
+    def add(self, model: str, value: str, note_id: int) -> None:
+        with self._lock:
+            self._index(model).setdefault(normalize_field(value), set()).add(note_id)
+
+    def confirm(self, api: str, model: str, value: str) -> list[int]:
+        """
+        Ask Anki which notes of this type have this first field value, and update the index.
+        This blocks, see confirmInBackground.
+        """
+        return self._ask(api, model, value)[0]
+
+    def confirmInBackground(self, api: str, model: str, value: str) -> None:
+        lookup_executor.submit(DUPLICATE_QUEUE, partial(self._confirm, api, model, value))
+
+    def _ask(self, api: str, model: str, value: str) -> tuple[list[int], bool]:
+        "Note ids from Anki, and whether they differ from the index"
+        fields = anki_schema.fields(model)
+        if not fields:
+            return [], False
+        note_ids: list[int] = findNotes(api, f'"note:{escape_search(model)}" "{fields[0]}:{escape_search(value)}"')
+        with self._lock:
+            index = self._index(model)
+            changed = index.get(normalize_field(value), set()) != set(note_ids)
+            if note_ids:
+                index[normalize_field(value)] = set(note_ids)
+            else:
+                index.pop(normalize_field(value), None)
+        return note_ids, changed
+
+    def _confirm(self, api: str, model: str, value: str) -> None:
+        try:
+            note_ids, changed = self._ask(api, model, value)
+        except Exception as e:
+            logger.debug(f"Could not confirm duplicates of \"{value}\" with Anki: {repr(e)}")
+            return
+        if changed:
+            self.confirmed.emit(model, value, note_ids)
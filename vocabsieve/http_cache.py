@@ -0,0 +1,193 @@
+"""
+Disk cache for the responses of online sources, so that words looked up
+before cost no network time, even after a restart.
+Only the status, encoding and body of responses are stored.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from .global_names import datapath, logger
+
+# Total size of the cached bodies
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# When the cache is full, entries are evicted until it is this full
+HTTP_CACHE_EVICT_TO = 0.9
+# How long successful responses are kept, per host
+HOST_TTLS = {
+    "kaikki.org": 30 * 24 * 60 * 60,
+    "forvo.com": 7 * 24 * 60 * 60,
+}
+DEFAULT_TTL = 24 * 60 * 60
+# How long missing words are remembered
+NEGATIVE_TTL = 24 * 60 * 60
+# Errors that mean the word is missing. Other errors, such as authentication failures
+# or rate limiting, say nothing about the requested word and are never cached
+MISSING_STATUSES = {404, 410}
+# Last use times of cache hits are kept in memory and written at most this often (seconds),
+# or together with the next response put in the cache, so that hits do not wait for a disk sync
+LAST_USED_WRITE_INTERVAL = 60
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    '''The parts of a requests.Response that sources use'''
+    url: str
+    status_code: int
+    content: bytes
+    encoding: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}")
+
+    @classmethod
+    def from_response(cls, res: requests.Response) -> "CachedResponse":
+        return cls(res.url, res.status_code, res.content, res.encoding)
+
+
+def cache_key(url: str, headers: Optional[dict] = None) -> str:
+    return hashlib.sha1((url + "\n" + json.dumps(headers or {}, sort_keys=True)).encode()).hexdigest()
+
+
+def cacheable(status_code: int) -> bool:
+    return 200 <= status_code < 400 or status_code in MISSING_STATUSES
+
+
+def ttl_for(url: str, status_code: int) -> float:
+    if not 200 <= status_code < 400:
+        return NEGATIVE_TTL
+    host = urlsplit(url).hostname or ""
+    for suffix, ttl in HOST_TTLS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return ttl
+    return DEFAULT_TTL
+
+
+class HttpCache:
+    """
+    Size-bounded response cache in a SQLite database.
+    Entries expire after the TTL of their host, and the least recently used
+    entries are evicted when the total size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = HTTP_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            status INTEGER,
+            encoding TEXT,
+            body BLOB,
+            size INTEGER,
+            expires REAL,
+            last_used REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        # key -> last use not written yet
+        self._last_used: dict[str, float] = {}
+        self._last_used_written = time.time()
+
+    def get(self, url: str, headers: Optional[dict] = None) -> Optional[CachedResponse]:
+        "Cached response for this request, None if there is none or it expired"
+        key = cache_key(url, headers)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, encoding, body, expires FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            status, encoding, body, expires = row
+            if expires < now:
+                self._delete(key)
+                return None
+            self._last_used[key] = now
+            if now - self._last_used_written > LAST_USED_WRITE_INTERVAL:
+                self._writeLastUsed()
+                self.conn.commit()
+        return CachedResponse(url, status, body, encoding)
+
+    def put(self, url: str, response: CachedResponse, headers: Optional[dict] = None) -> None:
+        key = cache_key(url, headers)
+        size = len(response.content)
+        if size > self.max_bytes or not cacheable(response.status_code):
+            return
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self.conn.execute(
+                "INSERT INTO responses(key, url, status, encoding, body, size, expires, last_used) "
+                "VALUES(?,?,?,?,?,?,?,?)",
+                (key, url, response.status_code, response.encoding, response.content, size,
+                 now + ttl_for(url, response.status_code), now))
+            self.size += size
+            self._writeLastUsed()
+            if self.size > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _writeLastUsed(self) -> None:
+        "Must be called with the lock held"
+        self.conn.executemany("UPDATE responses SET last_used=? WHERE key=?",
+                              [(last_used, key) for key, last_used in self._last_used.items()])
+        self._last_used.clear()
+        self._last_used_written = time.time()
+
+    def _delete(self, key: str) -> None:
+        "Must be called with the lock held"
+        self._last_used.pop(key, None)
+        row = self.conn.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM responses WHERE key=?", (key,))
+            self.size -= row[0]
+
+    def _evict(self) -> None:
+        "Remove expired entries, then the least recently used ones. Must be called with the lock held"
+        self.conn.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = self.max_bytes * HTTP_CACHE_EVICT_TO
+        evicted = 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if self.size <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key=?", (key,))
+            self.size -= size
+            evicted += 1
+        logger.debug(f"Evicted {evicted} responses from the HTTP cache, {self.size} bytes left")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self._last_used.clear()
+            self.size = 0
+
+
+http_cache = HttpCache(os.path.join(datapath, "http_cache.db"))
@@ -0,0 +1,100 @@
+"""
+Shared HTTP sessions for online sources, so that requests to the same host
+reuse kept-alive connections instead of opening a new one every time.
+"""
+import threading
+import time
+from typing import Optional, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .anki_connect import ActionStats
+from .global_names import logger
+
+Timeout = Union[float, tuple[float, float]]
+
+# Requests that take longer than this are logged
+SLOW_REQUEST_SECONDS = 2.0
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT: Timeout = (3.05, 10)
+# Per host (concurrency, timeout). Forvo rate limits aggressively.
+HOST_SETTINGS: dict[str, tuple[int, Timeout]] = {
+    "forvo.com": (2, (3.05, 10)),
+    "audio00.forvo.com": (4, (3.05, 10)),
+    "kaikki.org": (4, (3.05, 15)),
+}
+
+
+class HostPool:
+    '''A session with a connection pool for one host, and a limit on concurrent requests'''
+
+    def __init__(self, concurrency: int, timeout: Timeout) -> None:
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.stats = ActionStats()
+
+
+class HttpSessions:
+    """
+    One HostPool per host, created on first use.
+    Each host has its own concurrency limit and timeout, see HOST_SETTINGS and configure,
+    and the time taken by its requests is recorded.
+    """
+
+    def __init__(self) -> None:
+        self._pools: dict[str, HostPool] = {}
+        self._settings = dict(HOST_SETTINGS)
+        self._lock = threading.Lock()
+
+    def configure(self, host: str, concurrency: Optional[int] = None, timeout: Optional[Timeout] = None) -> None:
+        "Change the limits of a host. Takes effect for requests made after this"
+        with self._lock:
+            old_concurrency, old_timeout = self._settings.get(host, (DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT))
+            self._settings[host] = (concurrency or old_concurrency, timeout or old_timeout)
+            pool = self._pools.pop(host, None)
+        if pool is not None:
+            pool.session.close()
+
+    def _pool(self, host: str) -> HostPool:
+        with self._lock:
+            pool = self._pools.get(host)
+            if pool is None:
+                concurrency, timeout = self._settings.get(host, (DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT))
+                pool = self._pools[host] = HostPool(concurrency, timeout)
+            return pool
+
+    def get(self, url: str, headers: Optional[dict] = None, timeout: Optional[Timeout] = None) -> requests.Response:
+        "Same as requests.get, waiting if the host already has as many requests as it allows"
+        host = urlsplit(url).hostname or ""
+        pool = self._pool(host)
+        with pool.semaphore:
+            start = time.perf_counter()
+            failed = True
+            try:
+                res = pool.session.get(url, headers=headers, timeout=timeout or pool.timeout)
+                failed = not res.ok
+                return res
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    pool.stats.calls += 1
+                    pool.stats.errors += failed
+                    pool.stats.total_time += elapsed
+                    pool.stats.max_time = max(pool.stats.max_time, elapsed)
+                if elapsed > SLOW_REQUEST_SECONDS:
+                    logger.debug(f"Request to {host} took {elapsed:.2f} seconds")
+
+    def stats(self) -> dict[str, ActionStats]:
+        "Timing statistics per host since the start"
+        with self._lock:
+            return {host: ActionStats(**vars(pool.stats)) for host, pool in self._pools.items()}
+
+
+http_sessions = HttpSessions()
@@ -1,16 +1,18 @@
 from PyQt5.QtWidgets import (QDialog, QFormLayout, QLabel, QComboBox, QWidget,
                              QVBoxLayout, QCheckBox, QScrollArea, QPushButton,
                              QProgressBar, QSizePolicy, QApplication)
-from PyQt5.QtCore import QDateTime, QCoreApplication
+from PyQt5.QtCore import QDateTime
 from .BatchNotePreviewer import BatchNotePreviewer
 from ..ui.main_window_base import MainWindowBase
 from .models import ReadingNote
 from ..models import SRSNote
-from ..tools import prepareAnkiNoteDict, addNotes, remove_punctuations
+from ..tools import prepareAnkiNoteDict, remove_punctuations
 from .utils import truncate_middle
+from ..definition_pipeline import DefinitionPipeline, ResolvedWord
 
 import re
 import json
+import uuid
 from datetime import datetime as dt
 from ..global_names import logger, settings
 from typing import TYPE_CHECKING, Optional
@@ -19,7 +21,7 @@ if TYPE_CHECKING:
     from ..main import MainWindow
 
 
-def date_to_timestamp(datestr: str):
+def date_to_timestamp(datestr: str) -> float:
     return dt.strptime(datestr, "%Y-%m-%d %H:%M:%S").timestamp()
 
 
@@ -35,8 +37,11 @@ class GenericImporter(QDialog):
                  path: Optional[str] = None,
                  methodname: str = "generic",
                  show_selector_src: bool = True,
-                 show_selector_date: bool = True):
+                 show_selector_date: bool = True,
+                 incremental: bool = False):
         super().__init__(parent)
+        # When repeating the last import, only notes from the last import date onwards are read
+        self.incremental = incremental
         self.notes: Optional[set[tuple[str, str]]] = None  # Used for filtering
         self.lang = settings.value('target_language')
         self.methodname = methodname
@@ -53,6 +58,10 @@ class GenericImporter(QDialog):
 
         self.lookup_button = QPushButton("Look up currently selected")
         self.lookup_button.clicked.connect(self.defineWords)
+        self.pipeline: Optional[DefinitionPipeline] = None
+        self.pipeline_done = True
+        # Stop looking up words when the dialog is closed
+        self.finished.connect(self.cancelLookups)
         self.add_even_if_no_defi = QCheckBox("Add even if no definition found")
         self._layout.addRow(self.add_even_if_no_defi)
 
@@ -104,6 +113,13 @@ class GenericImporter(QDialog):
         self._layout.addRow(self.progressbar)
         self._layout.addRow(self.definition_count_label, self.anki_button)
 
+    def notesCutoff(self) -> float:
+        "Timestamp before which notes do not need to be read from the source"
+        last_import_date = settings.value(f"last_import_date_{self.methodname}", "")
+        if not (self.incremental and last_import_date):
+            return 0
+        return date_to_timestamp(last_import_date + " 00:00:00")
+
     def getNotes(self) -> list[ReadingNote]:
         """
         Returns a tuple of four tuples of equal length
@@ -144,102 +160,142 @@ class GenericImporter(QDialog):
         return new_reading_notes
 
     def defineWords(self) -> None:
+        if self.pipeline is not None and not self.pipeline_done:
+            logger.info("Cancelling definition lookups")
+            self.pipeline.cancel()
+            return
         logger.info(f"Define words triggered on {len(self.selected_reading_notes)} notes")
         self.anki_notes: list[SRSNote] = []
-        self.book_names: list[str] = []
-        self.lastDate = "1970-01-01 00:00:00"
-        defi1 = self._parent.definition
-        defi2 = self._parent.definition2
+        self.resolved_notes: dict[int, SRSNote] = {}
+        self.defining_notes = list(self.selected_reading_notes)
+        self.lastDate = max((note.date for note in self.defining_notes), default="1970-01-01 00:00:00")
         definition2_enabled = settings.value("sg2_enabled", False, type=bool)
+        audio_sources = []
+        if json.loads(settings.value("audio_sg", "[]")) != [] and self._parent.audio_selector.sg is not None:
+            audio_sources = self._parent.audio_selector.sg.sources
 
-        # No using any of these buttons to prevent race conditions
-        self.lookup_button.setEnabled(False)
+        # No using the Anki button until all words are looked up
         self.anki_button.setEnabled(False)
+        self.lookup_button.setText("Cancel")
         self.preview_widget.reset()
-        count = 0
-        for n_looked_up, note in enumerate(self.selected_reading_notes):
-            QCoreApplication.processEvents()
-            logger.debug(f"Handling reading note: {note}")
-            self.lastDate = max(note.date, self.lastDate)
-            # Remove punctuations
-            word = remove_punctuations(note.lookup_term)
-            if settings.value("bold_word", True, type=bool):
-                sentence = note.sentence.replace(word, f"<strong>{word}</strong>")
-            else:
-                sentence = note.sentence
-
-            definition1 = defi1.getFirstDefinition(word)
-            if definition2_enabled:
-                definition2 = defi2.getFirstDefinition(word)
-            else:
-                definition2 = None
-            if not (definition1 or definition2) and not self.add_even_if_no_defi.isChecked():
-                continue
-            count += 1
+        self.definition_count_label.setText("")
+        self.progressbar.setMaximum(len(self.defining_notes))
+        self.progressbar.setValue(0)
+
+        # Words are looked up on worker threads, and the notes are built here as they arrive
+        self.pipeline = DefinitionPipeline(
+            self._parent.definition.sources,
+            self._parent.definition2.sources if definition2_enabled else [],
+            audio_sources
+        )
+        self.pipeline_done = False
+        self.pipeline.resolved.connect(self.onWordResolved)
+        self.pipeline.done.connect(self.onDefineWordsDone)
+        self.pipeline.start([remove_punctuations(note.lookup_term) for note in self.defining_notes])
+
+    def onWordResolved(self, index: int, result: ResolvedWord) -> None:
+        if self.pipeline is None or self.pipeline.cancelled:
+            return
+        note = self.defining_notes[index]
+        logger.debug(f"Handling reading note: {note}")
+        self.progressbar.setValue(self.pipeline.completed)
+        self.showDefineProgress()
+        definition1, definition2 = result.definition1, result.definition2
+        if not (definition1 or definition2) and not self.add_even_if_no_defi.isChecked():
+            return
+        # Remove punctuations
+        word = remove_punctuations(note.lookup_term)
+        if settings.value("bold_word", True, type=bool):
+            sentence = note.sentence.replace(word, f"<strong>{word}</strong>")
+        else:
+            sentence = note.sentence
+
+        tags = []
+        if settings.value("tags", "vocabsieve").strip():
+            tags.extend(settings.value("tags", "vocabsieve").strip().split())
+        tags.append(self.methodname)
+        tags.append(note.book_name.replace(" ", "_"))
+
+        # replace word with headword if it exists
+        if definition1 is not None:
+            word = definition1.headword
+        elif definition2 is not None:
+            word = definition2.headword
+
+        new_note_item = SRSNote(
+            word=word,  # fine if no definition
+            sentence=sentence,  # fine if empty string
+            definition1=self._parent.definition.toAnki(definition1) if definition1 is not None else None,
+            definition2=self._parent.definition2.toAnki(definition2) if definition2 is not None else None,
+            audio_path=result.audio_path or None,
+            tags=tags
+        )
+        self.preview_widget.appendNoteItem(new_note_item)
+        self.resolved_notes[index] = new_note_item
+        self.showDefineProgress()
+
+    def showDefineProgress(self) -> None:
+        if self.pipeline is None:
+            return
+        self.definition_count_label.setText(
+            f"{len(self.resolved_notes)} notes will be sent "
+            f"({self.pipeline.completed}/{self.pipeline.total} looked up, "
+            f"{self.pipeline.throughput():.1f} words/s)")
+
+    def onDefineWordsDone(self) -> None:
+        if self.pipeline_done:
+            return
+        self.pipeline_done = True
+        # Keep the order of the reading notes, no matter in which order they were looked up
+        self.anki_notes = [self.resolved_notes[index] for index in sorted(self.resolved_notes)]
+        if self.pipeline is not None and self.pipeline.cancelled:
             self.definition_count_label.setText(
-                str(count) + " notes will be sent")
-            QCoreApplication.processEvents()
-
-            audio_path = ""
-            if json.loads(settings.value("audio_sg", "[]")) != []:
-                try:
-                    audio_definitions = self._parent.audio_selector.getDefinitions(word)
-                    if audio_definitions and audio_definitions[0].audios is not None:
-                        audios = audio_definitions[0].audios
-                    else:
-                        audios = {}
-                except Exception:
-                    audios = {}
-                if audios:
-                    # First item
-                    audio_path = audios[next(iter(audios))]
-
-            tags = []
-            if settings.value("tags", "vocabsieve").strip():
-                tags.extend(settings.value("tags", "vocabsieve").strip().split())
-            tags.append(self.methodname)
-            tags.append(note.book_name.replace(" ", "_"))
-
-            # replace word with headword if it exists
-            if definition1 is not None:
-                word = definition1.headword
-            elif definition2 is not None:
-                word = definition2.headword
-
-            new_note_item = SRSNote(
-                word=word,  # fine if no definition
-                sentence=sentence,  # fine if empty string
-                definition1=self._parent.definition.toAnki(definition1) if definition1 is not None else None,
-                definition2=self._parent.definition2.toAnki(definition2) if definition2 is not None else None,
-                audio_path=audio_path or None,
-                tags=tags
-            )
-            self.preview_widget.appendNoteItem(new_note_item)
-            self.anki_notes.append(new_note_item)
-            self.progressbar.setValue(n_looked_up + 1)
-        self.progressbar.setValue(len(self.selected_reading_notes))
+                f"{len(self.anki_notes)} notes will be sent (cancelled after "
+                f"{self.pipeline.completed}/{self.pipeline.total} words)")
+        else:
+            self.progressbar.setValue(len(self.defining_notes))
 
         # Unlock buttons again now
-        self.lookup_button.setEnabled(True)
+        self.lookup_button.setText("Look up currently selected")
         self.anki_button.setEnabled(True)
 
+    def cancelLookups(self, *_) -> None:
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+
     def to_anki(self):
         notes_data = []
         for note in self.anki_notes:
             notes_data.append(
-                prepareAnkiNoteDict(self._parent.getAnkiSettings(), note)
+                (prepareAnkiNoteDict(self._parent.getAnkiSettings(), note), note)
             )
 
-        res = addNotes(settings.value("anki_api"), notes_data)
+        # The notes are sent to Anki in the background by the outbox
+        self.batch = f"{self.methodname}:{uuid.uuid4().hex}"
+        self._parent.outbox.enqueue(notes_data, batch=self.batch)
         # Record last import data
         if self.methodname != "auto":  # don't save for auto vocab extraction
             settings.setValue("last_import_method", self.methodname)
             settings.setValue("last_import_path", self.path)
             settings.setValue(f"last_import_date_{self.methodname}", self.lastDate[:10])
 
-        self._layout.addRow(QLabel(
+        self.batch_size = len(notes_data)
+        self.progressbar.setMaximum(self.batch_size)
+        self.progressbar.setValue(0)
+        self.export_status_label = QLabel()
+        self._layout.addRow(self.export_status_label)
+        self._parent.outbox.changed.connect(self.showExportProgress)
+        self.showExportProgress()
+
+    def showExportProgress(self, *_) -> None:
+        pending, failed = self._parent.outbox.counts(self.batch)
+        added = self.batch_size - pending - failed
+        self.progressbar.setValue(added + failed)
+        self.export_status_label.setText(
             QDateTime.currentDateTime().toString('[hh:mm:ss]') + " "
-            + str(len(notes_data))
+            + str(self.batch_size)
             + " notes have been exported, of which "
-            + str(len([i for i in res if i]))
-            + " were successfully added to your collection."))
+            + str(added)
+            + " were successfully added to your collection"
+            + (f" and {failed} failed." if failed else ".")
+            + (f" {pending} are waiting for Anki." if pending else ""))
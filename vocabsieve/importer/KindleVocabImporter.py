@@ -6,6 +6,7 @@ import re
 from PyQt5.QtWidgets import QCheckBox, QLabel
 from ..tools import grouper, remove_punctuations
 from .models import ReadingNote
+from .utils import checkpoint_key, load_checkpoint, save_checkpoint
 from ..models import LookupRecord
 from ..global_names import settings
 
@@ -16,8 +17,8 @@ def remove_author(titleauthor):
 
 
 class KindleVocabImporter(GenericImporter):
-    def __init__(self, parent, path):
-        super().__init__(parent, "Kindle lookups", path, "kindle")
+    def __init__(self, parent, path, incremental: bool = False):
+        super().__init__(parent, "Kindle lookups", path, "kindle", incremental=incremental)
 
     def toggleNotesFiltering(self, enable: bool):
         if enable:
@@ -56,36 +57,46 @@ class KindleVocabImporter(GenericImporter):
         bookdata = list(cur.execute("SELECT * FROM book_info"))
         bookid2name = dict(zip(list(zip(*bookdata))[2], list(zip(*bookdata))[4]))
         reading_notes = []
+        lookups = []
         langcode = settings.value("target_language", 'en')
         count = 0
-        lookups_count_before = self._parent.rec.countLookups(langcode)
-        for _, lword, bookid, _, _, sentence, timestamp in cur.execute("SELECT * FROM lookups"):
+        # Timestamps are in milliseconds. Lookups up to the checkpoint are already recorded,
+        # and notes before the cutoff are not needed, so only newer rows are read.
+        checkpoint = checkpoint_key(self.methodname, vocab_db_path, langcode)
+        recorded_until = load_checkpoint(checkpoint) * 1000 if self.incremental else 0
+        notes_from = self.notesCutoff() * 1000
+        newest = recorded_until
+        for _, lword, bookid, _, _, sentence, timestamp in cur.execute(
+                "SELECT * FROM lookups WHERE timestamp >= ? AND word_key LIKE ?",
+                (min(recorded_until, notes_from), langcode + "%")):
             if lword.startswith(langcode):
                 #word = lword.removeprefix(langcode+":")
                 # Remove language code , which may have a suffix for region
                 word = ":".join(lword.split(":")[1:])  # maybe some languages use colons, I don't know
                 count += 1
-                self._parent.rec.recordLookup(
-                    LookupRecord(
-                        word=word,
-                        language=langcode,
-                        source="kindle",
-                    ),
-                    timestamp / 1000,
-                    commit=False
-                )
-                reading_notes.append(
-                    ReadingNote(
-                        lookup_term=word,
-                        sentence=sentence,
-                        book_name=bookid2name[bookid],
-                        date=str(dt.fromtimestamp(timestamp / 1000).astimezone())[:19]
+                newest = max(newest, timestamp)
+                if timestamp > recorded_until:
+                    lookups.append((
+                        LookupRecord(
+                            word=word,
+                            language=langcode,
+                            source="kindle",
+                        ),
+                        timestamp / 1000
+                    ))
+                if timestamp >= notes_from:
+                    reading_notes.append(
+                        ReadingNote(
+                            lookup_term=word,
+                            sentence=sentence,
+                            book_name=bookid2name[bookid],
+                            date=str(dt.fromtimestamp(timestamp / 1000).astimezone())[:19]
 
+                        )
                     )
-                )
-        lookups_count_after = self._parent.rec.countLookups(langcode)
+        added = self._parent.rec.recordLookups(lookups)
+        save_checkpoint(checkpoint, newest / 1000)
         self._layout.addRow(QLabel("Vocabulary database: " + vocab_db_path))
         self._layout.addRow(
-            QLabel(f"Found {count} lookups in {langcode}, added { lookups_count_after - lookups_count_before } to lookup database."))
-        self._parent.rec.conn.commit()
+            QLabel(f"Found {count} lookups in {langcode}, added {added} to lookup database."))
         return reading_notes
@@ -1,11 +1,12 @@
 import os
+import re
 import sqlite3
 from datetime import datetime as dt
 from PyQt5.QtWidgets import QLabel
 from slpp import slpp
 from typing import TYPE_CHECKING
 from .GenericImporter import GenericImporter
-from .utils import koreader_scandir, findDBpath, findHistoryPath
+from .utils import koreader_scandir, findDBpath, findHistoryPath, checkpoint_key, load_checkpoint, save_checkpoint
 from .models import ReadingNote
 from ..models import LookupRecord
 from ..global_names import settings, logger
@@ -15,6 +16,11 @@ import time
 if TYPE_CHECKING:
     from ..main import MainWindow
 
+# Lookup time of an entry in lookup_history.lua
+# Number of books per query, below SQLite's limit on the number of parameters
+BOOKS_PER_QUERY = 500
+HISTORY_TIME_RE = re.compile(r'\["time"\]\s*=\s*(\d+)')
+
 
 def getBookMetadata(path):
     _, ext = os.path.splitext(path)
@@ -35,9 +41,9 @@ def getBookMetadata(path):
 
 
 class KoreaderVocabImporter(GenericImporter):
-    def __init__(self, parent: "MainWindow", path):
+    def __init__(self, parent: "MainWindow", path, incremental: bool = False):
         self.splitter = parent.splitter
-        super().__init__(parent, "KOReader vocab builder", path, "koreader-vocab")
+        super().__init__(parent, "KOReader vocab builder", path, "koreader-vocab", incremental=incremental)
 
     def getNotes(self):
         bookfiles = koreader_scandir(self.path)
@@ -63,8 +69,18 @@ class KoreaderVocabImporter(GenericImporter):
                 bookmap[bookid] = bookname
 
         reading_notes = []
-        for timestamp, word, title_id, prev_context, next_context in cur.execute(
-                "SELECT create_time, word, title_id, prev_context, next_context FROM vocabulary"):
+        # Only rows from the books in the target language, and when repeating an import, from the last import date
+        book_ids = list(bookmap)
+        rows: list[tuple] = []
+        for i in range(0, len(book_ids), BOOKS_PER_QUERY):
+            chunk = book_ids[i:i + BOOKS_PER_QUERY]
+            rows.extend(cur.execute(
+                "SELECT rowid, create_time, word, title_id, prev_context, next_context FROM vocabulary "
+                f"WHERE create_time >= ? AND title_id IN ({','.join('?' * len(chunk))})",
+                (self.notesCutoff(), *chunk)))
+        # In the order of the database, as with a single query
+        rows.sort()
+        for _, timestamp, word, title_id, prev_context, next_context in rows:
             if title_id in bookmap:
                 if prev_context and next_context:
                     ctx = prev_context.strip() + f" {word} " + next_context.strip()  # ensure space before and after
@@ -93,9 +109,15 @@ class KoreaderVocabImporter(GenericImporter):
             self.histpath = findHistoryPath(self.path)
             logger.debug("KOReader history path: " + self.histpath)
             d = []
+            # Lookups up to the checkpoint are already recorded, so they are not decoded again
+            checkpoint = checkpoint_key(self.methodname, self.histpath, langcode)
+            recorded_until = load_checkpoint(checkpoint) if self.incremental else 0
+            newest = recorded_until
             with open(self.histpath, encoding="utf-8") as f:
                 content = f.read().split("LookupHistoryEntry")[1:]
                 for item in content:
+                    if (match := HISTORY_TIME_RE.search(item)) and int(match.group(1)) <= recorded_until:
+                        continue
                     d.append(slpp.decode(item))
         except Exception as e:
             logger.error("Failed to find or open lookup_history.lua. Lookups will not be tracked this time.")
@@ -106,24 +128,16 @@ class KoreaderVocabImporter(GenericImporter):
         else:
             entries = [entry['data'].get(next(iter(entry['data']))) for entry in d]
             entries = [(entry['word'], entry['book_title'], entry['time']) for entry in entries]
-            count = 0
-            lookups_count_before = self._parent.rec.countLookups(langcode)
-            for word, booktitle, timestamp in entries:
-                if booktitle in books_in_lang:
-                    count += 1
-                    self._parent.rec.recordLookup(
-                        LookupRecord(
-                            word=word,
-                            language=langcode,
-                            source="koreader"
-                        ),
-                        timestamp,
-                        commit=False
-                    )
-            self._parent.rec.conn.commit()
-            lookups_count_after = self._parent.rec.countLookups(langcode)
+            newest = max([newest, *(timestamp for _, _, timestamp in entries)])
+            lookups = [
+                (LookupRecord(word=word, language=langcode, source="koreader"), timestamp)
+                for word, booktitle, timestamp in entries
+                if booktitle in books_in_lang
+            ]
+            added = self._parent.rec.recordLookups(lookups)
+            save_checkpoint(checkpoint, newest)
             self._layout.addRow(QLabel("Lookup history: " + self.histpath))
             self._layout.addRow(
-                QLabel(f"Found {count} lookups in {langcode}, added { lookups_count_after - lookups_count_before } to lookup database."))
+                QLabel(f"Found {len(lookups)} lookups in {langcode}, added {added} to lookup database."))
 
         return reading_notes
@@ -1,7 +1,8 @@
 from datetime import datetime as dt
 import glob
+import json
 import os
-from ..global_names import logger
+from ..global_names import logger, settings
 
 
 def get_uniques(l: list):
@@ -24,6 +25,23 @@ def date_to_timestamp(datestr: str):
     return dt.strptime(datestr, "%Y-%m-%d %H:%M:%S").timestamp()
 
 
+def checkpoint_key(method: str, path: str, langcode: str) -> str:
+    "Checkpoints are kept per import method, device database and language"
+    return f"{method}:{os.path.abspath(path)}:{langcode}"
+
+
+def load_checkpoint(key: str) -> float:
+    "Timestamp of the newest lookup recorded from a source, 0 if it was never imported"
+    return float(json.loads(settings.value("internal/import_checkpoints", "{}")).get(key, 0))
+
+
+def save_checkpoint(key: str, timestamp: float) -> None:
+    checkpoints = json.loads(settings.value("internal/import_checkpoints", "{}"))
+    if timestamp > checkpoints.get(key, 0):
+        checkpoints[key] = timestamp
+        settings.setValue("internal/import_checkpoints", json.dumps(checkpoints))
+
+
 def findDBpath(path) -> str:
     # KOReader settings may be in a hidden directory
     paths = glob.glob(os.path.join(path, "**/vocabulary_builder.sqlite3"), recursive=True)\
@@ -0,0 +1,148 @@
+"""
+Random access to the lines of a Kaikki dump (https://kaikki.org), so that it can be
+used as a dictionary without importing it. The offsets of the lines are stored in the
+dictionary database, see LocalDictionary.indexKaikki, and lookups only read and decode
+the lines of the looked up word.
+Dumps can be uncompressed, or compressed with bgzip (BGZF). BGZF files are valid gzip
+files made of independently compressed blocks of at most 64 KiB, so a line can be read
+by decompressing only the blocks it is in. Other compression formats cannot be seeked.
+"""
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Iterator, Union
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+# Fixed part of a block header, up to and including XLEN
+BGZF_HEADER = struct.Struct("<4sIBBH")
+
+
+def is_bgzf(path: str) -> bool:
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if len(header) < 18 or not header.startswith(BGZF_MAGIC):
+        return False
+    # The first extra subfield is BC with the block size
+    return header[12:14] == b"BC"
+
+
+class PlainDump:
+    '''An uncompressed dump. Offsets are byte positions'''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: BinaryIO = open(path, "rb")
+        self._lock = threading.Lock()
+
+    def lines(self) -> Iterator[tuple[int, bytes]]:
+        "Offset and content of every line, reading the file from the start"
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                yield offset, line
+                offset += len(line)
+
+    def readLine(self, offset: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.readline()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BgzfDump:
+    '''
+    A dump compressed with bgzip. Offsets are virtual offsets as in BAM/tabix:
+    the position of the block in the file shifted left by 16 bits, plus the position
+    of the line in the decompressed block.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: BinaryIO = open(path, "rb")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _readBlock(f: BinaryIO) -> bytes:
+        "Decompress the block at the current position of f. Returns b'' at the end of the file"
+        header = f.read(BGZF_HEADER.size)
+        if not header:
+            return b""
+        magic, _, _, _, xlen = BGZF_HEADER.unpack(header)
+        if magic != BGZF_MAGIC:
+            raise ValueError(f"Not a BGZF block at offset {f.tell() - len(header)}")
+        extra = f.read(xlen)
+        block_size = None
+        pos = 0
+        while pos < xlen:
+            subfield, length = extra[pos:pos + 2], struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+            if subfield == b"BC":
+                block_size = struct.unpack("<H", extra[pos + 4:pos + 6])[0] + 1
+            pos += 4 + length
+        if block_size is None:
+            raise ValueError("BGZF block without block size")
+        data = f.read(block_size - BGZF_HEADER.size - xlen)
+        # The compressed data is followed by the CRC32 and size of the block
+        return zlib.decompress(data[:-8], -15)
+
+    def _blocks(self, f: BinaryIO) -> Iterator[tuple[int, bytes]]:
+        while True:
+            offset = f.tell()
+            data = self._readBlock(f)
+            if not data:
+                # Empty blocks only appear as the end of file marker
+                if f.read(1) == b"":
+                    return
+                f.seek(-1, 1)
+                continue
+            yield offset, data
+
+    def lines(self) -> Iterator[tuple[int, bytes]]:
+        "Virtual offset and content of every line, reading the file from the start"
+        with open(self.path, "rb") as f:
+            start = None
+            pending = b""
+            for block_offset, data in self._blocks(f):
+                pos = 0
+                while pos < len(data):
+                    if start is None:
+                        start = block_offset << 16 | pos
+                    newline = data.find(b"\n", pos)
+                    if newline == -1:
+                        pending += data[pos:]
+                        break
+                    yield start, pending + data[pos:newline + 1]
+                    start = None
+                    pending = b""
+                    pos = newline + 1
+            if pending:
+                yield start, pending  # type: ignore
+
+    def readLine(self, offset: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset >> 16)
+            line = self._readBlock(self._file)[offset & 0xFFFF:]
+            # Lines can continue in the following blocks
+            while b"\n" not in line:
+                data = self._readBlock(self._file)
+                if not data:
+                    break
+                line += data
+        return line.split(b"\n", 1)[0] + b"\n"
+
+    def close(self) -> None:
+        self._file.close()
+
+
+Dump = Union[PlainDump, BgzfDump]
+
+
+def open_dump(path: str) -> Dump:
+    "Open a dump for random access, raises ValueError if its compression does not allow it"
+    if is_bgzf(path):
+        return BgzfDump(path)
+    if path.endswith((".gz", ".xz", ".bz2")):
+        raise ValueError(f"{path} cannot be read without decompressing it whole. "
+                         "Decompress it, or compress it with bgzip instead.")
+    return PlainDump(path)
@@ -1,21 +1,37 @@
 
 from ast import parse
+import functools
 import sqlite3
 import os
+import threading
 
-from .dictformats import parseMDX, parseDSL, parseCSV, parseTSV, xdxf2text, zopen, parseKaikki
+from .dictformats import parseMDX, parseDSL, parseCSV, parseTSV, xdxf2text, zopen, parseKaikki, parseKaikkiMulti
+from .kaikki_index import open_dump
 from .lemmatizer import removeAccents
 from pystardict import Dictionary
 import json
 from .global_names import lock, datapath as datapath_
 
 
+def locked(method):
+    "Run a method of LocalDictionary with its lock held, as all threads share one cursor"
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class LocalDictionary():
     def __init__(self, datapath) -> None:
-        path = os.path.join(datapath, "dict.db")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.path = os.path.join(datapath, "dict.db")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Wait for maintenance and other connections instead of failing with "database is locked"
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
         self.c = self.conn.cursor()
+        # Only takes effect for new databases, existing ones are converted by maintenance run by hand
+        self.c.execute("PRAGMA auto_vacuum = INCREMENTAL")
         self.createTables()
         self.makeIndex()
 
@@ -27,6 +43,9 @@ class LocalDictionary():
             self.c.execute("""
             CREATE INDEX IF NOT EXISTS dictname_index ON dictionary(dictname)
             """)  # Faster counting of entries
+            self.c.execute("""
+            CREATE INDEX IF NOT EXISTS kaikki_index_word ON kaikki_index(dictname, language, word)
+            """)
             print("Either successfully made unique index, or there is already one")
         except sqlite3.IntegrityError:
             print("Unable to make unique index")
@@ -40,8 +59,18 @@ class LocalDictionary():
             dictname TEXT
         )
         """)
+        # Where the entries of Kaikki dumps that are used without importing them are
+        self.c.execute("""
+        CREATE TABLE IF NOT EXISTS kaikki_index (
+            word TEXT,
+            offset INTEGER,
+            language TEXT,
+            dictname TEXT
+        )
+        """)
         self.conn.commit()
 
+    @locked
     def importdict(self, data: dict[str, str], lang: str, name: str) -> None:
         for item in data.items():
             # Handle escape sequences
@@ -58,21 +87,62 @@ class LocalDictionary():
                            )
         self.conn.commit()
 
+    @locked
     def deletedict(self, name: str) -> None:
         self.c.execute("""
             DELETE FROM dictionary
             WHERE dictname=?
         """, (name,))
+        self.c.execute("""
+            DELETE FROM kaikki_index
+            WHERE dictname=?
+        """, (name,))
         self.conn.commit()
-        self.c.execute("VACUUM")
 
-    def getCognates(self, lang: str) -> sqlite3.Cursor:
+    def importKaikkiLanguages(self, path: str, names: dict[str, str]) -> None:
+        "Import several languages of a Kaikki dump in one pass, each to the dictionary named in names"
+        for lang, data in parseKaikkiMulti(path, names.keys()).items():
+            self.importdict(data, lang, names[lang])
+
+    def indexKaikki(self, path: str, lang: str, name: str) -> None:
+        "Store the offsets of the entries of a Kaikki dump in language lang"
+        dump = open_dump(path)
+        try:
+            rows = []
+            for offset, line in dump.lines():
+                data = json.loads(line)
+                if data.get("lang_code") == lang:
+                    rows.append((data['word'], offset, lang, name))
+        finally:
+            dump.close()
+        with self._lock:
+            self.c.executemany("""
+                INSERT INTO kaikki_index(word, offset, language, dictname)
+                VALUES(?, ?, ?, ?)
+                """, rows)
+            self.conn.commit()
+
+    @locked
+    def kaikkiOffsets(self, word: str, lang: str, name: str) -> list[int]:
+        "Offsets of the entries of a word in an indexed Kaikki dump, in the order of the dump"
+        self.c.execute("""
+            SELECT offset FROM kaikki_index
+            WHERE dictname=?
+            AND language=?
+            AND word=?
+            ORDER BY offset
+            """, (name, lang, word))
+        return [row[0] for row in self.c.fetchall()]
+
+    @locked
+    def getCognates(self, lang: str) -> list[tuple[str, str]]:
         return self.c.execute("""
             SELECT word, definition FROM dictionary
             WHERE language=?
             AND dictname='cognates'
-            """, (lang,))
+            """, (lang,)).fetchall()
 
+    @locked
     def hasCognatesData(self) -> bool:
         self.c.execute("""
             SELECT COUNT(*) FROM dictionary
@@ -80,6 +150,7 @@ class LocalDictionary():
             """)
         return bool(self.c.fetchone()[0] > 0)
 
+    @locked
     def define(self, word: str, lang: str, name: str) -> str:
         """
         Get definition from database
@@ -96,6 +167,7 @@ class LocalDictionary():
         else:
             raise KeyError(f"Word {word} not found in {name}")
 
+    @locked
     def getAllWords(self, lang: str, name: str) -> list[tuple[str, str]]:
         """
         Get all words from database
@@ -108,25 +180,37 @@ class LocalDictionary():
         """, (lang, name))
         return self.c.fetchall()
 
+    @locked
     def countEntries(self) -> int:
         self.c.execute("""
         SELECT COUNT(*) FROM dictionary
         """)
         return int(self.c.fetchone()[0])
 
+    @locked
     def countEntriesDict(self, name) -> int:
         self.c.execute("""
         SELECT COUNT(*) FROM dictionary
         WHERE dictname=?
         """, (name,))
-        return int(self.c.fetchone()[0])
+        count = int(self.c.fetchone()[0])
+        self.c.execute("""
+        SELECT COUNT(DISTINCT word) FROM kaikki_index
+        WHERE dictname=?
+        """, (name,))
+        return count + int(self.c.fetchone()[0])
 
+    @locked
     def countDicts(self) -> int:
         self.c.execute("""
-        SELECT COUNT(DISTINCT dictname) FROM dictionary
+        SELECT COUNT(DISTINCT dictname) FROM (
+            SELECT dictname FROM dictionary
+            UNION SELECT dictname FROM kaikki_index
+        )
         """)
         return int(self.c.fetchone()[0])
 
+    @locked
     def getNamesForLang(self, lang: str) -> list[str]:
         self.c.row_factory = lambda cursor, row: row[0]
         self.c.execute("""
@@ -137,12 +221,15 @@ class LocalDictionary():
         self.c.row_factory = None
         return res
 
+    @locked
     def purge(self) -> None:
         self.c.execute("""
         DROP TABLE IF EXISTS dictionary
         """)
+        self.c.execute("""
+        DROP TABLE IF EXISTS kaikki_index
+        """)
         self.createTables()
-        self.c.execute("VACUUM")
 
     @staticmethod
     def regularize_headword(word: str) -> str:
@@ -178,6 +265,8 @@ class LocalDictionary():
                 self.importdict(d, lang, name)
         elif dicttype == "wiktdump":
             self.importdict(parseKaikki(path, lang), lang, name)
+        elif dicttype == "wiktindex":
+            self.indexKaikki(path, lang, name)
         elif dicttype == "freq":
             with zopen(path) as f:
                 data = json.load(f)
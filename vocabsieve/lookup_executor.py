@@ -0,0 +1,107 @@
+"""
+A fixed pool of threads for source lookups, instead of a new thread per lookup.
+Tasks are queued per source, so that a slow source cannot take all the workers,
+and interactive lookups are run before speculative ones.
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Callable
+
+from .global_names import logger
+from .models import Source
+
+LOOKUP_WORKERS = 8
+# Number of lookups that may run at the same time for one online source
+ONLINE_SOURCE_CONCURRENCY = 2
+# Local sources share the dictionary database connection, so they run one at a time
+LOCAL_QUEUE = "local"
+
+
+class Priority(IntEnum):
+    '''Lower values are run first'''
+    interactive = 0
+    prefetch = 1
+
+
+def source_key(source: Source) -> str:
+    "Name of the queue a source's lookups go to"
+    return source.name if source.INTERNET else LOCAL_QUEUE
+
+
+class LookupExecutor:
+    """
+    Runs callables on a bounded pool of worker threads.
+    Each task belongs to a queue with its own concurrency limit. Among the queues
+    that are below their limit, the task with the best priority runs first,
+    and tasks of the same priority run in the order they were submitted.
+    """
+
+    def __init__(self, workers: int = LOOKUP_WORKERS) -> None:
+        self._condition = threading.Condition()
+        # queue name -> heap of (priority, sequence number, future, callable)
+        self._queues: dict[str, list[tuple[int, int, Future, Callable[[], Any]]]] = {}
+        self._running: dict[str, int] = {}
+        self._limits: dict[str, int] = {LOCAL_QUEUE: 1}
+        self._counter = itertools.count()
+        self._threads = [threading.Thread(target=self._work, name=f"LookupExecutor-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def setLimit(self, queue: str, limit: int) -> None:
+        with self._condition:
+            self._limits[queue] = limit
+            self._condition.notify_all()
+
+    def submit(self, queue: str, fn: Callable[[], Any], priority: Priority = Priority.interactive) -> Future:
+        "Run fn on a worker thread. The returned future can be cancelled until it starts"
+        future: Future = Future()
+        with self._condition:
+            heapq.heappush(self._queues.setdefault(queue, []), (priority, next(self._counter), future, fn))
+            self._condition.notify()
+        return future
+
+    def submitLookup(self, source: Source, fn: Callable[[], Any],
+                     priority: Priority = Priority.interactive) -> Future:
+        return self.submit(source_key(source), fn, priority)
+
+    def pending(self, queue: str) -> int:
+        with self._condition:
+            return len(self._queues.get(queue, []))
+
+    def _next(self):
+        "The best task of the queues below their limit. Must be called with the lock held"
+        best = None
+        for queue, heap in self._queues.items():
+            if heap and self._running.get(queue, 0) < self._limits.get(queue, ONLINE_SOURCE_CONCURRENCY):
+                if best is None or heap[0][:2] < self._queues[best][0][:2]:
+                    best = queue
+        if best is None:
+            return None
+        _, _, future, fn = heapq.heappop(self._queues[best])
+        self._running[best] = self._running.get(best, 0) + 1
+        return best, future, fn
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while (task := self._next()) is None:
+                    self._condition.wait()
+            queue, future, fn = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn())
+                    except BaseException as e:
+                        logger.debug(f"Lookup in {queue} failed: {repr(e)}")
+                        future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._running[queue] -= 1
+                    self._condition.notify_all()
+
+
+lookup_executor = LookupExecutor()
@@ -6,7 +6,8 @@ import sys
 import time
 import re
 from datetime import datetime
-from typing import Optional, cast
+from typing import Any, Callable, Optional
+from functools import partial
 import requests
 from packaging import version
 import platform
@@ -28,28 +29,34 @@ from .dictionary import preprocess_clipboard
 from .local_dictionary import dictdb
 from .importer import KindleVocabImporter, KoreaderVocabImporter, AutoTextImporter, WordListImporter
 from .reader import ReaderServer
+from .maintenance import DatabaseMaintainer
+from .duplicate_index import DuplicateIndex
+from .outbox import NoteOutbox
+from .prefetcher import Prefetcher, PREFETCH_MAX_WORDS
+from .http_cache import http_cache
+from .audio_cache import audio_cache
+from .anki_schema import anki_schema, SCHEMA_REFRESH_INTERVAL_MS
+from .anki_health import anki_health
 from .contentmanager import ContentManager
 from .tools import (
     compute_word_score,
     failCards,
     is_json,
     make_audio_source_group,
-    modelFieldNames,
     prepareAnkiNoteDict,
     is_oneword,
-    addNote,
-    findNotes,
     guiBrowse,
     make_dict_source,
-    getVersion,
     make_freq_source,
     remove_punctuations,
     unix_milliseconds_to_datetime_str,
     apply_word_rules)
 from .ui import MainWindowBase, WordMarkingDialog
+from .ui.multi_definition_widget import define_with_rules
 from .models import (AudioSourceGroup, KnownMetadata, LookupRecord, SRSNote, TrackingDataError,
-                     WordRecord, LookupTrigger)
+                     WordRecord, WordActionWeights, LookupTrigger, Source)
 from .lemmatizer import lem_word
+from .constants import NO_SPACE_LANGS
 from .uncaught_hook import ExceptionCatcher
 
 
@@ -69,10 +76,20 @@ class MainWindow(MainWindowBase):
         self.last_got_focus: float = time.time()
         self.last_target_word_id: int = -1
         self.last_added_note_id: int = -1
+        self.note_type_first_field: str = ""
+        self.duplicate_index = DuplicateIndex(self.rec, self)
+        self.duplicate_index.confirmed.connect(self.onDuplicatesConfirmed)
+        self.outbox = NoteOutbox(self.rec, self)
+        audio_cache.protected = self.rec.outboxAudioPaths
+        self.prefetcher = Prefetcher(self)
         self.previous_word: str = ""
         self.previous_trigger: LookupTrigger = LookupTrigger.double_clicked
         self.pause_polling: bool = False
         self.cognates: set[str] = set()
+        self.hovered_target: tuple[str, bool] = ("", False)
+        self.hover_timer = QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        self.hover_timer.timeout.connect(self.lookupHoveredNow)
         app.applicationStateChanged.connect(self.onApplicationStateChanged)
         self.setupMenu()
         self.setupButtons()
@@ -86,9 +103,27 @@ class MainWindow(MainWindowBase):
         self.setupClipboardMonitor()
         self.setMinimumWidth(settings.value("minimum_width", 550, type=int))
 
-        if not settings.value("internal/configured"):
-            self.configure()
-            settings.setValue("internal/configured", True)
+        self.configureFirstRun()
+
+    def configureFirstRun(self) -> None:
+        "Open the configuration on the first run, once the health monitor knows whether Anki is reachable"
+        if settings.value("internal/configured"):
+            return
+        if settings.value("enable_anki", True, type=bool) and anki_health.available is None:
+            # The first probe always emits stateChanged
+            anki_health.stateChanged.connect(self.onFirstProbe)
+            if anki_health.available is None:
+                return
+            anki_health.stateChanged.disconnect(self.onFirstProbe)
+        settings.setValue("internal/configured", True)
+        self.configure()
+
+    def onFirstProbe(self, available: bool, version: Optional[int]) -> None:
+        try:
+            anki_health.stateChanged.disconnect(self.onFirstProbe)
+        except TypeError:
+            pass  # Already disconnected by configureFirstRun
+        self.configureFirstRun()
 
     def onApplicationStateChanged(self, state):
         if state == Qt.ApplicationActive:
@@ -225,6 +260,7 @@ class MainWindow(MainWindowBase):
         self.view_last_note_button.clicked.connect(self.viewLastNote)
         self.read_button.clicked.connect(lambda: self.clipboardChanged(even_when_focused=True))
 
+        self.status_bar.addPermanentWidget(self.outbox_label)
         self.status_bar.addPermanentWidget(self.stats_label)
 
     def setupMenu(self) -> None:
@@ -277,6 +313,10 @@ class MainWindow(MainWindowBase):
 
         self.export_notes_csv_action = QAction("Export &notes to CSV")
         self.export_lookups_csv_action = QAction("Export &lookup data to CSV")
+        self.retry_failed_notes_action = QAction("Retry notes that failed to be added to Anki")
+        self.retry_failed_notes_action.setEnabled(False)
+        self.discard_failed_notes_action = QAction("Discard notes that failed to be added to Anki")
+        self.discard_failed_notes_action.setEnabled(False)
 
         self.content_manager_action.triggered.connect(self.onContentManager)
 
@@ -293,6 +333,8 @@ class MainWindow(MainWindowBase):
         self.import_auto_text_action.triggered.connect(self.importAutoText)
         self.export_notes_csv_action.triggered.connect(self.exportNotes)
         self.export_lookups_csv_action.triggered.connect(self.exportLookups)
+        self.retry_failed_notes_action.triggered.connect(self.outbox.retryFailed)
+        self.discard_failed_notes_action.triggered.connect(self.outbox.discardFailed)
         self.stats_action.triggered.connect(self.onStats)
         self.analyze_book_action.triggered.connect(self.onAnalyzeBook)
         self.export_known_words_action.triggered.connect(self.exportKnownWords)
@@ -318,6 +360,13 @@ class MainWindow(MainWindowBase):
                 self.export_word_scores_action
             ]
         )
+        exportmenu.addSeparator()
+        exportmenu.addActions(
+            [
+                self.retry_failed_notes_action,
+                self.discard_failed_notes_action
+            ]
+        )
 
         self.setMenuBar(self.menu)
 
@@ -403,14 +452,24 @@ class MainWindow(MainWindowBase):
         with open(path, 'w', encoding='utf-8') as file:
             json.dump(known_words, file, indent=4, ensure_ascii=False)
 
+    def onAnkiStateChanged(self, available: bool, version: Optional[int]) -> None:
+        if available:
+            self.status(f"Connected to AnkiConnect (version {version})")
+            # Catch up on what could not be done while Anki was unreachable
+            self.outbox.sendNow()
+            anki_schema.refreshInBackground()
+            self.getKnownDataOnThread()
+        elif settings.value("enable_anki", True, type=bool):
+            self.status("Cannot reach AnkiConnect")
+
     def checkDataAvailability(self) -> TrackingDataError:
         # Check is Anki enabled
         # Can proceed is anki is disabled
         if not settings.value("enable_anki", True, type=bool):
             return TrackingDataError.no_errors
         # Anki is enabled
-        # Check if AnkiConnect is running
-        if not self.checkAnkiConnect() == 1:
+        # Check if AnkiConnect is running, as last seen by the health monitor
+        if not anki_health.available:
             return TrackingDataError.anki_enabled_but_not_running
         # AnkiConnect is running
         # Check if fieldmap is set
@@ -431,6 +490,7 @@ class MainWindow(MainWindowBase):
     def _refreshKnownData(self) -> None:
         with lock:
             self.known_data, self.known_metadata = self.rec.getKnownData()
+            self.duplicate_index.reload()
             self.known_data_timestamp = time.time()
             self.status("Known data is ready")
 
@@ -522,13 +582,17 @@ class MainWindow(MainWindowBase):
         QDesktopServices.openUrl(QUrl(url))
 
     def checkAnkiConnect(self) -> int:
-        api = settings.value('anki_api', 'http://127.0.0.1:8765')
+        """Check whether AnkiConnect is reachable according to the health monitor,
+        and ask the user how to proceed if it is not"""
         if settings.value('enable_anki', True, type=bool):
-            try:
-                _ = getVersion(api)
+            if anki_health.available:
                 return 1
-            except Exception as e:
-                print(repr(e))
+            elif anki_health.available is None:
+                # The first probe after startup has not finished yet, and the UI does not wait for it
+                self.status("Still checking whether AnkiConnect is reachable, please try again in a moment")
+                return 0
+            else:
+                anki_health.probeNow()
                 answer = QMessageBox.question(
                     self,
                     "Could not reach AnkiConnect",
@@ -558,7 +622,9 @@ class MainWindow(MainWindowBase):
         if self.checkAnkiConnect():
             settings_dialog = ConfigDialog(self)
             settings_dialog.exec()
+            settings_dialog.deleteLater()
             self.initSources()
+            anki_health.probeNow()
         self.pause_polling = False
 
     def importKindle(self):
@@ -624,10 +690,11 @@ class MainWindow(MainWindowBase):
                 "You have not imported notes before",
                 "Use any one of the other two options on the menu, and you will be able to use this one next time.")
             return
+        # Only read what was added to the device since the last import
         if method == "kindle":
-            KindleVocabImporter(self, path).exec()
+            KindleVocabImporter(self, path, incremental=True).exec()
         elif method == "koreader-vocab":
-            KoreaderVocabImporter(self, path).exec()
+            KoreaderVocabImporter(self, path, incremental=True).exec()
         else:
             # Nightly users, clear it for them
             settings.setValue("last_import_method", "")
@@ -688,6 +755,14 @@ class MainWindow(MainWindowBase):
     def lookupHovered(self, target, no_lemma=False) -> None:
         if not self.shift_pressed:
             return
+        # Only look up the word once the cursor stays on it, not every word it passes over
+        self.hovered_target = (target, no_lemma)
+        self.hover_timer.start(settings.value("hover_lookup_delay", 200, type=int))
+
+    def lookupHoveredNow(self) -> None:
+        if not self.shift_pressed:
+            return
+        target, no_lemma = self.hovered_target
         self.lookup(target, no_lemma, trigger=LookupTrigger.hovered)
 
     @pyqtSlot()
@@ -729,45 +804,47 @@ class MainWindow(MainWindowBase):
         """Check for duplicates of note in Anki
         We support using either sentence or word as first field
         word is already lemmatized
-        Returns note ids if card with word found in Anki, None if not found"""
-        if self.checkAnkiConnect() == 0:
+        Returns note ids of notes with the same first field from the local duplicate index
+        without waiting for Anki. Anki is asked in the background, see onDuplicatesConfirmed"""
+        self.note_type_first_field = ""
+        if not settings.value("enable_anki", True, type=bool):
             return []
         api = settings.value("anki_api", "http://127.0.0.1:8765")
 
         note_type = settings.value("note_type")
         logger.debug(f'Trying to obtain fields for note type "{note_type}"')
 
-        fields = modelFieldNames(api, note_type)
+        fields = anki_schema.cachedFields(note_type)
         logger.debug(f'Fields for note type "{note_type}": {fields}')
         if not fields:
-            logger.error(f"Could not obtain fields for note type {note_type}")
-            self.note_type_first_field = ""
+            # Anki refuses duplicates anyway, and onNoteFailed asks what to do with them
+            logger.error(f"Fields of note type {note_type} are not known yet, skipping checking for duplicates")
+            anki_schema.refreshInBackground()
             return []
         if fields[0] == settings.value("word_field"):
             logger.info(
                 f'First field is word field, trying to find a note with field "{fields[0]}" having value "{word}"')
-            find_query = f"\"{fields[0]}:{word}\""
+            value = word
             self.note_type_first_field = "word"
         elif fields[0] == settings.value("sentence_field"):
             logger.info(
                 f'First field is sentence field, trying to find a note with field "{fields[0]}" having value "{sentence}"')
-            find_query = f"\"{fields[0]}:{sentence}\""
+            value = sentence
             self.note_type_first_field = "sentence"
         else:
             logger.error(f"First field is neither word field nor sentence field, skipping checking for duplicates")
             return []
-        try:
-            notes_found = findNotes(api, find_query)
+        notes_found = self.duplicate_index.lookup(api, note_type, value)
+        if notes_found:
+            logger.debug(f"Found notes for \"{value}\": {notes_found}")
+        else:
+            logger.debug("Did not find Anki note")
+        return notes_found
 
-            if notes_found:
-                logger.debug(f"Found notes for \"{word}\": {notes_found}")
-                return cast(list[int], notes_found)
-            else:
-                logger.debug("Did not find Anki note")
-                return []
-        except Exception:
-            logger.debug("Did not find Anki note with query: " + find_query)
-            return []
+    def onDuplicatesConfirmed(self, note_type: str, value: str, note_ids: list[int]) -> None:
+        "Anki knows notes that were not in the duplicate index"
+        if note_ids:
+            self.status(f'Anki already has {len(note_ids)} note(s) with "{value}"')
 
     def lookup(self, target: str, no_lemma=False, trigger=LookupTrigger.double_clicked) -> None:
         target = target.strip()
@@ -779,6 +856,10 @@ class MainWindow(MainWindowBase):
         if target == self.previous_word and trigger == self.previous_trigger:
             logger.debug("Same word and trigger as previous, skipping look up")
             return
+        self.maintainer.notifyActivity()
+        if trigger != LookupTrigger.hovered:
+            # A pending hover lookup would replace this one
+            self.hover_timer.stop()
         self.boldWordInSentence(target)
         langcode = settings.value("target_language", "en")
         lemma = lem_word(target, langcode)
@@ -794,15 +875,9 @@ class MainWindow(MainWindowBase):
                 lemma,
                 WordRecord(lemma=lemma, language=langcode)
             )
-            threshold = settings.value(
-                "tracking/known_threshold",
-                100,
-                type=int) if lemma not in self.cognates else settings.value(
-                "tracking/known_threshold_cognate",
-                25,
-                type=int)
             modifier = self.rec.getModifier(langcode, lemma)
-            self.word_record_display.setWordRecord(word_record, self.getWordActionWeights(), threshold, modifier)
+            self.word_record_display.setWordRecord(
+                word_record, self.getWordActionWeights(), self.knownThreshold(lemma), modifier)
 
         rules = json.loads(settings.value("word_regex", "[]"))
 
@@ -818,6 +893,51 @@ class MainWindow(MainWindowBase):
 
     def setSentence(self, content) -> None:
         self.sentence.setText(str.strip(content))
+        self.prefetchSentence(content)
+
+    def knownThreshold(self, lemma: str) -> int:
+        "Score from which a word counts as known, lower for cognates"
+        if lemma in self.cognates:
+            return int(settings.value("tracking/known_threshold_cognate", 25, type=int))
+        return int(settings.value("tracking/known_threshold", 100, type=int))
+
+    def isKnown(self, word: str, waw: WordActionWeights) -> bool:
+        "Whether a word counts as known according to the tracking data"
+        if not self.known_data:
+            return False
+        lemma = lem_word(word, settings.value("target_language", "en"))
+        word_record = self.known_data.get(lemma)
+        if word_record is None:
+            return False
+        return bool(compute_word_score(word_record, waw) >= self.knownThreshold(lemma))
+
+    def prefetchSentence(self, sentence: str) -> None:
+        "Look up the unknown words of the sentence in the online sources in the background"
+        if not settings.value("prefetch_enabled", False, type=bool):
+            self.prefetcher.cancel()
+            return
+        if self.getLanguage() in NO_SPACE_LANGS:
+            # There is no tokenizer for these, and the whole sentence would be looked up as one word
+            self.prefetcher.cancel()
+            return
+        waw = self.getWordActionWeights()
+        words: list[str] = []
+        for token in sentence.split():
+            word = remove_punctuations(token)
+            if word and word not in words and not self.isKnown(word, waw):
+                words.append(word)
+        words = words[:PREFETCH_MAX_WORDS]
+        rules = json.loads(settings.value("word_regex", "[]"))
+        dict_sources = [source for source in self.definition.sources + self.definition2.sources
+                        if source.INTERNET]
+        audio_sources = [source for source in self.audio_sg.sources if source.INTERNET]
+        # Words in sentence order, so that the first words of the sentence are ready first
+        tasks: list[tuple[Source, Callable[[], Any]]] = []
+        for word in words:
+            tasks.extend((source, partial(define_with_rules, source, word, False, rules))
+                         for source in dict_sources)
+            tasks.extend((source, partial(source.define, word)) for source in audio_sources)
+        self.prefetcher.replace(tasks)
 
     def setWord(self, content) -> None:
         self.word.setText(content)
@@ -915,9 +1035,6 @@ class MainWindow(MainWindowBase):
         return settings.value("lem_greedily", False, type=bool)  # type: ignore
 
     def createNote(self) -> None:
-        if self.checkAnkiConnect() == 0:
-            return
-
         allow_duplicates = False
         sentence = self.sentence.toAnki()
         if note_ids := self.findDuplicates(self.word.text(), sentence):
@@ -966,26 +1083,89 @@ class MainWindow(MainWindowBase):
 
         content = prepareAnkiNoteDict(anki_settings, note)
         logger.debug("Prepared Anki note json" + json.dumps(content, indent=4, ensure_ascii=False))
-        try:
-            self.last_added_note_id = addNote(
-                settings.value("anki_api", "http://127.0.0.1:8765"),
-                content,
-                allow_duplicates
-            )
+        if allow_duplicates:
+            content['options'] = {"allowDuplicate": True}
+        if settings.value("enable_anki", True, type=bool):
+            # Sent to Anki in the background, so that Anki being slow or closed does not block
+            self.outbox.enqueue([(content, note)])
+            self.status("Note queued for Anki")
+        else:
             self.rec.recordNote(note, json.dumps(content, indent=4, ensure_ascii=False))
-            self.status("Added note to Anki")
-            # Clear fields
-            self.setImage(None)
-            self.sentence.setText("")
-            self.word.setText("")
-            self.definition.reset()
-            self.definition2.reset()
-            self.audio_selector.clear()
-            self.previous_word = ""
-            logger.info("Note added to Anki")
-        except Exception as e:
-            logger.error("Failed to add note to Anki: " + repr(e))
+            self.status("Note saved")
+        # Clear fields
+        self.setImage(None)
+        self.sentence.setText("")
+        self.word.setText("")
+        self.definition.reset()
+        self.definition2.reset()
+        self.audio_selector.clear()
+        self.previous_word = ""
+
+    def onNoteAdded(self, note_id: int, content: dict) -> None:
+        self.last_added_note_id = note_id
+        model = content.get("modelName", "")
+        fields = anki_schema.cachedFields(model) or []
+        if fields and (first_field := content.get("fields", {}).get(fields[0])):
+            self.duplicate_index.add(model, first_field, note_id)
+        self.status("Added note to Anki")
+        logger.info("Note added to Anki")
+
+    def onNoteFailed(self, id_: int, content: dict, error: str) -> None:
+        self.status("Failed to add note to Anki: " + error)
+        if "duplicate" not in error:
             return
+        model = content.get("modelName", "")
+        fields = anki_schema.cachedFields(model) or []
+        first_field = content.get("fields", {}).get(fields[0], "") if fields else ""
+        api = settings.value("anki_api", "http://127.0.0.1:8765")
+        if self.rec.getOutboxBatch(id_) != "":
+            # Imported notes can be retried or discarded together from the Export menu
+            if first_field:
+                # The duplicate index missed this note, so bring it up to date
+                self.duplicate_index.confirmInBackground(api, model, first_field)
+            return
+        msgBox = QMessageBox()
+        msgBox.setIcon(QMessageBox.Warning)
+        msgBox.setText(
+            f'A note with {fields[0] if fields else "the same first field"} "{first_field}" '
+            "already exists in your Anki database.\n"
+            "Do you still want to add the note?")
+        msgBox.setWindowTitle("Note already exists")
+        msgBox.addButton("Add anyway", QMessageBox.AcceptRole)
+        msgBox.addButton("Keep for later", QMessageBox.RejectRole)
+        msgBox.addButton("Discard", QMessageBox.DestructiveRole)
+        msgBox.addButton("View note(s)", QMessageBox.HelpRole)
+        msgBox.exec()
+        result = msgBox.buttonRole(msgBox.clickedButton())
+        if result == QMessageBox.AcceptRole:
+            logger.info("User decided to add duplicate note")
+            self.outbox.addAnyway(id_)
+        elif result == QMessageBox.DestructiveRole:
+            logger.info("User discarded duplicate note")
+            self.outbox.discard(id_)
+        elif result == QMessageBox.HelpRole:
+            # The note is kept as failed, like with "Keep for later", to be retried or discarded from the Export menu
+            logger.info("User pressed view while adding duplicate note")
+            note_ids = []
+            if first_field:
+                try:
+                    # Also brings the duplicate index up to date, as it missed this note
+                    note_ids = self.duplicate_index.confirm(api, model, first_field)
+                except Exception as e:
+                    logger.error(f"Could not find duplicates of \"{first_field}\": {repr(e)}")
+            if note_ids:
+                self.guiBrowseNotes(note_ids)
+
+    def showOutboxStatus(self, pending: int, failed: int) -> None:
+        parts = []
+        if pending:
+            parts.append(f"{pending} note{'s' if pending > 1 else ''} waiting for Anki")
+        if failed:
+            parts.append(f"{failed} failed")
+        self.outbox_label.setText(", ".join(parts))
+        self.outbox_label.setToolTip(self.rec.lastOutboxError() if failed else "")
+        self.retry_failed_notes_action.setEnabled(bool(failed))
+        self.discard_failed_notes_action.setEnabled(bool(failed))
 
     def viewLastNote(self) -> None:
         self.guiBrowseNote(self.last_added_note_id)
@@ -1059,6 +1239,24 @@ class MainWindow(MainWindowBase):
         timer_known_data.start()
         self.getKnownDataOnThread()
 
+        self.maintainer = DatabaseMaintainer([self.rec.path, dictdb.path, http_cache.path], self)
+        self.maintainer.maintained.connect(lambda _: self.status("Database maintenance finished"))
+        self.maintainer.failed.connect(lambda e: self.status("Database maintenance failed: " + e))
+
+        timer_anki_schema = QTimer(self)
+        timer_anki_schema.setInterval(SCHEMA_REFRESH_INTERVAL_MS)
+        timer_anki_schema.timeout.connect(anki_schema.refreshInBackground)
+        timer_anki_schema.start()
+        anki_schema.refreshInBackground()
+
+        self.outbox.changed.connect(self.showOutboxStatus)
+        self.outbox.noteAdded.connect(self.onNoteAdded)
+        self.outbox.noteFailed.connect(self.onNoteFailed)
+        self.outbox.start()
+
+        anki_health.stateChanged.connect(self.onAnkiStateChanged)
+        anki_health.start()
+
     def showStats(self) -> None:
         lookups = self.rec.countLookupsToday()
         notes = self.rec.countNotesToday()
@@ -1108,3 +1306,6 @@ def main():
     app.exec()
     if not w.is_wayland:
         w.monitor.stop_monitoring()
+    anki_health.stop()
+    w.outbox.stop()
+    w.rec.close()
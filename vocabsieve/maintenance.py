@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from .global_names import settings, logger
+
+# Only run automatic maintenance if the user has not done anything for this long
+IDLE_SECONDS = 120
+# How often to check whether maintenance is due
+CHECK_INTERVAL_MS = 5 * 60 * 1000
+# Minimum time between two automatic maintenance runs
+MAINTENANCE_INTERVAL = 24 * 60 * 60
+# Maximum number of free pages to give back to the filesystem per run
+INCREMENTAL_VACUUM_PAGES = 5000
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def maintain_database(path: str, convert: bool = False) -> None:
+    """
+    Run maintenance on a SQLite database using its own connection,
+    so that it can be called from a background thread.
+    With convert, databases created before incremental auto-vacuum was enabled are
+    converted once. This requires a full VACUUM, which holds the write lock for a long
+    time on large databases, so it is only done when the user asks for it.
+    """
+    start = time.time()
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL and convert:
+            logger.info(f"Switching {path} to incremental auto-vacuum, this only happens once")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        elif auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+            logger.debug(f"{path} does not use incremental auto-vacuum, it is converted by maintenance run by hand")
+        has_stats = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name='sqlite_stat1'").fetchone()[0]
+        if not has_stats:
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages:
+            # Each row returned is one step of the vacuum, so it must be consumed fully
+            conn.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})").fetchall()
+        conn.commit()
+        logger.debug(f"Maintained {path} in {time.time() - start:.2f} seconds, "
+                     f"{free_pages} free pages before vacuum")
+    finally:
+        conn.close()
+
+
+class DatabaseMaintainer(QObject):
+    """
+    Runs database maintenance in a background thread when the application is idle,
+    instead of running blocking VACUUMs on startup and after deletions.
+    """
+    maintained = pyqtSignal(float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, paths: list[str], parent=None) -> None:
+        super().__init__(parent)
+        self.paths = paths
+        self.last_activity = time.time()
+        self._running = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.setInterval(CHECK_INTERVAL_MS)
+        self.timer.timeout.connect(self.runIfIdle)
+        self.timer.start()
+
+    @staticmethod
+    def lastMaintained() -> float:
+        "Timestamp of the last successful maintenance, 0 if never"
+        return float(settings.value("internal/last_maintained", 0.0, type=float))
+
+    @classmethod
+    def lastMaintainedText(cls) -> str:
+        if last := cls.lastMaintained():
+            return datetime.fromtimestamp(last).strftime("%Y-%m-%d %H:%M:%S")
+        return "Never"
+
+    def notifyActivity(self) -> None:
+        "Postpone automatic maintenance, the user is doing something"
+        self.last_activity = time.time()
+
+    def runIfIdle(self) -> None:
+        if time.time() - self.last_activity < IDLE_SECONDS:
+            return
+        if time.time() - self.lastMaintained() < MAINTENANCE_INTERVAL:
+            return
+        self.runNow(convert=False)
+
+    def runNow(self, convert: bool = True) -> bool:
+        """
+        Start maintenance on a background thread. Returns False if it is already running.
+        See maintain_database for convert.
+        """
+        if not self._running.acquire(blocking=False):
+            logger.debug("Database maintenance is already running")
+            return False
+        threading.Thread(target=self._run, args=(convert,), daemon=True).start()
+        return True
+
+    def _run(self, convert: bool) -> None:
+        try:
+            for path in self.paths:
+                maintain_database(path, convert)
+        except sqlite3.Error as e:
+            logger.error(f"Database maintenance failed: {repr(e)}")
+            self.failed.emit(repr(e))
+        else:
+            now = time.time()
+            settings.setValue("internal/last_maintained", now)
+            self.maintained.emit(now)
+        finally:
+            self._running.release()
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+import requests
+from PyQt5.QtCore import QObject, pyqtSignal
+from .anki_connect import AnkiConnectError, get_client
+from .global_names import settings, logger
+if TYPE_CHECKING:
+    from .record import Record
+
+# Number of notes sent to Anki in one request
+OUTBOX_CHUNK_SIZE = 25
+# Seconds to wait before retrying after Anki could not be reached, doubled on every attempt
+OUTBOX_BASE_DELAY = 5
+OUTBOX_MAX_DELAY = 10 * 60
+
+
+def drop_missing_audio(content: dict) -> None:
+    "Remove audio files that do not exist anymore from an AnkiConnect note, instead of failing the note"
+    audios = content.get("audio", [])
+    kept = [audio for audio in audios if "path" not in audio or os.path.exists(audio["path"])]
+    if len(kept) != len(audios):
+        logger.warning(f"Dropped missing audio files from note: {[a['path'] for a in audios if a not in kept]}")
+        content["audio"] = kept
+
+
+def retry_delay(attempts: int) -> float:
+    return float(min(OUTBOX_BASE_DELAY * 2 ** attempts, OUTBOX_MAX_DELAY))
+
+
+class NoteOutbox(QObject):
+    """
+    Persistent queue of notes to be added to Anki.
+    Notes are stored in the records database right away, and a background thread
+    sends them to AnkiConnect in chunks. If Anki cannot be reached, they are retried
+    later with exponential backoff. Notes that Anki refuses, such as duplicates,
+    are kept as failed until retryFailed or discardFailed is called.
+    """
+    changed = pyqtSignal(int, int)  # pending, failed
+    noteAdded = pyqtSignal(int, object)  # note id, AnkiConnect note
+    noteFailed = pyqtSignal(int, object, str)  # outbox id, AnkiConnect note, error
+
+    def __init__(self, rec: "Record", parent=None) -> None:
+        super().__init__(parent)
+        self.rec = rec
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="NoteOutbox", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        self._emitCounts()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def enqueue(self, notes, batch: str = "") -> int:
+        "Queue (AnkiConnect note, SRSNote) pairs. Returns the number of queued notes"
+        count = self.rec.enqueueNotes(notes, batch)
+        self._emitCounts()
+        self._wake.set()
+        return count
+
+    def sendNow(self) -> None:
+        "Send pending notes immediately, for example when Anki becomes available"
+        self._wake.set()
+
+    def retryFailed(self) -> None:
+        self.rec.retryFailedOutbox()
+        self._emitCounts()
+        self._wake.set()
+
+    def discardFailed(self) -> None:
+        self.rec.discardFailedOutbox()
+        self._emitCounts()
+
+    def discard(self, id_: int) -> None:
+        self.rec.removeFromOutbox([id_])
+        self._emitCounts()
+
+    def addAnyway(self, id_: int) -> None:
+        "Send a note that was refused as a duplicate again, allowing the duplicate"
+        self.rec.allowDuplicateOutbox(id_)
+        self._emitCounts()
+        self._wake.set()
+
+    def counts(self, batch=None) -> tuple[int, int]:
+        return self.rec.countOutbox(batch)
+
+    def _emitCounts(self) -> None:
+        self.changed.emit(*self.rec.countOutbox())
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            due = []
+            if settings.value("enable_anki", True, type=bool):
+                due = self.rec.getDueOutbox(OUTBOX_CHUNK_SIZE)
+            if not due:
+                next_attempt = self.rec.nextOutboxAttempt()
+                timeout = None if next_attempt is None else max(1.0, next_attempt - time.time())
+                self._wake.wait(timeout)
+                self._wake.clear()
+                continue
+            try:
+                self._send(due)
+            except Exception as e:
+                # Never let the worker die, the notes are still in the database
+                logger.exception(f"Unexpected error while sending notes to Anki: {repr(e)}")
+                self.rec.postponeOutbox([item[0] for item in due], OUTBOX_MAX_DELAY, repr(e))
+            self._emitCounts()
+
+    def _send(self, due) -> None:
+        api = settings.value("anki_api", "http://127.0.0.1:8765")
+        start = time.time()
+        for _, content, _, _ in due:
+            drop_missing_audio(content)
+        try:
+            # addNotes fails the whole request if one note is refused, even though the
+            # other notes were added, so each note is sent as its own action of one multi request
+            results = get_client(api).multi([("addNote", {"note": content}) for _, content, _, _ in due],
+                                            raise_errors=False)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError, AnkiConnectError) as e:
+            attempts = min(attempts for _, _, _, attempts in due)
+            delay = retry_delay(attempts)
+            logger.info(f"Could not reach Anki, retrying {len(due)} notes in {delay} seconds: {repr(e)}")
+            self.rec.postponeOutbox([id_ for id_, _, _, _ in due], delay, repr(e))
+            return
+        self._finish(due, [str(result) if isinstance(result, AnkiConnectError)
+                           else result if isinstance(result, int)
+                           else "Anki could not add this note"
+                           for result in results])
+        logger.debug(f"Sent {len(due)} notes to Anki in {time.time() - start:.2f} seconds")
+
+    def _finish(self, due, results) -> None:
+        """
+        Handle the results of sending notes: an int is the id of the added note,
+        and a str is the error Anki returned
+        """
+        delivered = []
+        for (id_, content, sn, _), result in zip(due, results):
+            if isinstance(result, int):
+                delivered.append(id_)
+                # Committed together with the removal from the outbox
+                self.rec.recordNote(sn, json.dumps(content, indent=4, ensure_ascii=False), commit=False)
+                self.noteAdded.emit(result, content)
+            elif isinstance(result, str):
+                logger.error(f"Failed to add note to Anki: {result}")
+                self.rec.failOutbox(id_, result)
+                self.noteFailed.emit(id_, content, result)
+        self.rec.removeFromOutbox(delivered)
@@ -0,0 +1,53 @@
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable
+from PyQt5.QtCore import QObject, QTimer
+from .global_names import settings, logger
+from .lookup_executor import lookup_executor, Priority
+from .models import Source
+
+# Words of a sentence that are prefetched at most
+PREFETCH_MAX_WORDS = 15
+# Default number of lookups started per minute, to leave the bandwidth to the user
+PREFETCH_RATE = 120
+
+
+class Prefetcher(QObject):
+    """
+    Warms the caches of online sources with lookups the user is likely to do next.
+    Lookups are submitted to the lookup executor at prefetch priority, so that they
+    never delay interactive lookups, and at a limited rate, so that they do not
+    use up the bandwidth or trigger rate limits.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._tasks: deque[tuple[Source, Callable[[], Any]]] = deque()
+        self._futures: list[Future] = []
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._submitNext)
+
+    def replace(self, tasks: list[tuple[Source, Callable[[], Any]]]) -> None:
+        "Prefetch these (source, lookup) pairs in order, instead of what was not prefetched yet"
+        self.cancel()
+        self._tasks.extend(tasks)
+        if self._tasks:
+            rate = max(settings.value("prefetch_rate", PREFETCH_RATE, type=int), 1)
+            logger.debug(f"Prefetching {len(self._tasks)} lookups at {rate} per minute")
+            self._timer.start(60000 // rate)
+            self._submitNext()
+
+    def cancel(self) -> None:
+        self._timer.stop()
+        self._tasks.clear()
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+
+    def _submitNext(self) -> None:
+        if not self._tasks:
+            self._timer.stop()
+            return
+        source, fn = self._tasks.popleft()
+        self._futures = [future for future in self._futures if not future.done()]
+        self._futures.append(lookup_executor.submitLookup(source, fn, Priority.prefetch))
@@ -1,30 +1,187 @@
 import sqlite3
 import os
+import queue
+import threading
+import weakref
+from pathlib import Path
 import time
 import re
 from bidict import bidict
-from typing import Optional, cast
+from typing import Optional, Iterable, Union
+from functools import partial
 import json
+from dataclasses import asdict
 from PyQt5.QtCore import QSettings
 from datetime import datetime
 from .constants import langcodes
 from .lemmatizer import lem_word
 from .models import LookupRecord, WordRecord, KnownMetadata, SRSNote
-from .tools import findNotes, notesInfo
+from .tools import findNotes, iterNotesInfo, notesModTime
+from .anki_collection import AnkiCollection, UnsupportedQuery
 from .global_names import logger, settings
 
+# The writer commits queued records at least this often (seconds)
+WRITER_FLUSH_INTERVAL = 2.0
+# ... or as soon as this many records are queued
+WRITER_BATCH_SIZE = 200
+# Attempts to write a batch when the database is busy, waiting this long (doubled every time) in between
+WRITER_MAX_ATTEMPTS = 3
+WRITER_RETRY_DELAY = 1.0
+
+
+class RecordWriter(threading.Thread):
+    """
+    Write-behind thread for records that are written often, such as lookups.
+    Queued statements are coalesced into a single transaction, so the UI thread
+    does not wait for a disk sync on every lookup.
+    """
+
+    def __init__(self, rec: "Record") -> None:
+        super().__init__(name="RecordWriter", daemon=True)
+        self.rec = rec
+        self.queue: queue.Queue = queue.Queue()
+
+    def put(self, sql: str, params: tuple) -> None:
+        self.queue.put((sql, params))
+
+    def flush(self) -> None:
+        "Block until everything queued so far is committed"
+        if not self.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def stop(self) -> None:
+        "Commit everything still queued and end the thread"
+        if self.is_alive():
+            self.queue.put(None)
+            self.join()
+
+    def run(self) -> None:
+        stopping = False
+        # Records that could not be written because the database was busy
+        retry: list[tuple[str, tuple]] = []
+        while not stopping:
+            batch, retry = retry, []
+            events = []
+            try:
+                item = self.queue.get(timeout=WRITER_FLUSH_INTERVAL if batch else None)
+            except queue.Empty:
+                item = threading.Event()  # Write the records to retry
+            deadline = time.time() + WRITER_FLUSH_INTERVAL
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= WRITER_BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+            if not self._write(batch):
+                if stopping:
+                    logger.error(f"Lost {len(batch)} records that could not be written")
+                else:
+                    retry = batch
+            for event in events:
+                event.set()
+
+    def _execute(self, batch: list[tuple[str, tuple]]) -> None:
+        """
+        Execute the statements in a savepoint and commit. If one fails, only this batch
+        is rolled back: the connection is shared, so other writes may be in the same transaction.
+        """
+        with self.rec._write_lock:
+            self.rec.c.execute("SAVEPOINT record_writer")
+            try:
+                for sql, params in batch:
+                    self.rec.c.execute(sql, params)
+            except sqlite3.Error:
+                self.rec.c.execute("ROLLBACK TO record_writer")
+                self.rec.c.execute("RELEASE record_writer")
+                raise
+            self.rec.c.execute("RELEASE record_writer")
+            try:
+                self.rec.conn.commit()
+            except sqlite3.Error as e:
+                # The records stay in the transaction and are committed with the next write
+                logger.warning(f"Failed to commit {len(batch)} records: {repr(e)}")
+
+    def _write(self, batch: list[tuple[str, tuple]]) -> bool:
+        "Write a batch, returns False if the database stayed locked and it should be retried later"
+        if not batch:
+            return True
+        start = time.time()
+        for attempt in range(WRITER_MAX_ATTEMPTS):
+            try:
+                self._execute(batch)
+                logger.debug(f"Wrote {len(batch)} records in {time.time() - start:.3f} seconds")
+                return True
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    return self._writeEach(batch, e)
+                # Another connection has been writing for longer than the busy timeout
+                if attempt < WRITER_MAX_ATTEMPTS - 1:
+                    delay = WRITER_RETRY_DELAY * 2 ** attempt
+                    logger.warning(f"Failed to write {len(batch)} records, retrying in {delay} seconds: {repr(e)}")
+                    time.sleep(delay)
+                else:
+                    logger.error(f"Failed to write {len(batch)} records, retrying later: {repr(e)}")
+            except sqlite3.Error as e:
+                return self._writeEach(batch, e)
+        return False
+
+    def _writeEach(self, batch: list[tuple[str, tuple]], error: sqlite3.Error) -> bool:
+        "Write the records one by one, so that a bad record does not lose the others"
+        logger.error(f"Failed to write {len(batch)} records, writing them one by one: {repr(error)}")
+        for sql, params in batch:
+            try:
+                self._execute([(sql, params)])
+            except sqlite3.Error as e:
+                logger.error(f"Dropped record {params}: {repr(e)}")
+        return True
+
+
+class ReaderConnection:
+    """
+    Read-only connection of one thread. It is kept in thread-local storage, so it is
+    closed when the thread ends, and short-lived threads do not leak connections.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True, timeout=30,
+                                    check_same_thread=False)
+        self.close = weakref.finalize(self, self.conn.close)
+
 
 class Record():
-    """Class to store user data"""
+    """
+    Class to store user data.
+    The database runs in WAL mode: all writes go through a single connection
+    guarded by a lock, while each thread reads through its own read-only
+    connection, so long reads never block writes or each other.
+    Lookups and notes are written behind by a RecordWriter thread.
+    """
 
     def __init__(self, parent_settings: QSettings, datapath):
-        self.conn = sqlite3.connect(
-            os.path.join(
-                datapath,
-                "records.db"),
-            check_same_thread=False)
+        self.path = os.path.join(datapath, "records.db")
+        # Wait for maintenance and other connections instead of failing with "database is locked"
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
         self.c = self.conn.cursor()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers: weakref.WeakSet[ReaderConnection] = weakref.WeakSet()
         self.c.execute("PRAGMA foreign_keys = ON")
+        # Only takes effect for new databases, existing ones are converted by maintenance run by hand
+        self.c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.c.execute("PRAGMA journal_mode = WAL")
+        self.c.execute("PRAGMA synchronous = NORMAL")
         self._createTables()
         if not parent_settings.value("internal/lookup_unique_index"):
             self._makeLookupUnique()
@@ -33,6 +190,37 @@ class Record():
 
         self.last_known_data: Optional[tuple[dict[str, WordRecord], KnownMetadata]] = None
         self.last_known_data_date: float = 0.0  # 1970-01-01
+        # language -> {lemma: modifier}, loaded lazily per language
+        self.modifiers: dict[str, dict[str, float]] = {}
+        self.writer = RecordWriter(self)
+        self.writer.start()
+
+    def _reader(self) -> sqlite3.Connection:
+        "Read-only connection belonging to the calling thread"
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = self._local.reader = ReaderConnection(self.path)
+            with self._write_lock:
+                self._readers.add(reader)
+        return reader.conn
+
+    def commit(self):
+        "Commit writes made with commit=False"
+        with self._write_lock:
+            self.conn.commit()
+
+    def flush(self):
+        "Wait for the writer thread to commit queued lookups and notes"
+        self.writer.flush()
+
+    def close(self):
+        self.writer.stop()
+        with self._write_lock:
+            self.conn.commit()
+            for reader in list(self._readers):
+                reader.close()
+            self._readers.clear()
+            self.conn.close()
 
     def _createTables(self):
         self.c.execute("""
@@ -89,11 +277,39 @@ class Record():
         self.c.execute("""
                        CREATE UNIQUE INDEX IF NOT EXISTS modifier_index ON modifiers (language, lemma)
         """)
+        self.c.execute("""
+        CREATE TABLE IF NOT EXISTS anki_notes (
+            note_id INTEGER,
+            language TEXT,
+            mod INTEGER,
+            model TEXT,
+            fields TEXT,
+            tgt_lemma TEXT,
+            ctx_lemmas TEXT,
+            first_field TEXT,
+            PRIMARY KEY(note_id, language)
+        )
+        """)
+        if "first_field" not in (row[1] for row in self.c.execute("PRAGMA table_info(anki_notes)")):
+            self.c.execute("ALTER TABLE anki_notes ADD COLUMN first_field TEXT")
+        self.c.execute("CREATE INDEX IF NOT EXISTS anki_notes_model ON anki_notes (model)")
+        self.c.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL,
+            content TEXT,
+            note TEXT,
+            batch TEXT,
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            error TEXT
+        )
+        """)
         # Non-unique index for seen_new
         self.c.execute("""CREATE INDEX IF NOT EXISTS seen_index_lang ON seen_new (language)""")
         # Clean up old seen table
         self.c.execute("""DROP TABLE IF EXISTS seen""")
-        self.c.execute("""VACUUM""")
         self.conn.commit()
 
     def _makeLookupUnique(self):
@@ -116,69 +332,84 @@ class Record():
 
     def _seenContent(self, name, content, language):
         start = time.time()
-        for word in content.replace("\\n", "\n").replace("\\N", "\n").split():
-            lemma = lem_word(word, language)
-            self.c.execute("""
-                    INSERT INTO seen_new(language, lemma) VALUES(?,?)
-                    ON CONFLICT(language, lemma) DO UPDATE SET count = count + 1
-            """, (language, lemma))
-        self.conn.commit()
+        lemmas = [lem_word(word, language)
+                  for word in content.replace("\\n", "\n").replace("\\N", "\n").split()]
+        with self._write_lock:
+            for lemma in lemmas:
+                self.c.execute("""
+                        INSERT INTO seen_new(language, lemma) VALUES(?,?)
+                        ON CONFLICT(language, lemma) DO UPDATE SET count = count + 1
+                """, (language, lemma))
+            self.conn.commit()
         logger.info("Lemmatized", name, "in", time.time() - start, "seconds")
 
     def importContent(self, name: str, content: str, language: str, jd: int):
         start = time.time()
-        self.c.execute('SELECT * FROM contents WHERE (name=?)', (name,))
-        exists = self.c.fetchone()
+        with self._write_lock:
+            self.c.execute('SELECT * FROM contents WHERE (name=?)', (name,))
+            exists = self.c.fetchone()
+            if not exists:
+                sql = """INSERT INTO contents(name, content, language, jd)
+                        VALUES(?,?,?,?)"""
+                self.c.execute(
+                    sql,
+                    (name, content, language, jd))
+
+                self.c.execute("SELECT last_insert_rowid()")
+                source = self.c.fetchone()[0]
+                logger.debug("ID for content", name, "is", source)
+                self._seenContent(name, content, language)
+                self.conn.commit()
         if not exists:
-            sql = """INSERT INTO contents(name, content, language, jd)
-                    VALUES(?,?,?,?)"""
-            self.c.execute(
-                sql,
-                (name, content, language, jd))
-
-            self.c.execute("SELECT last_insert_rowid()")
-            source = self.c.fetchone()[0]
-            logger.debug("ID for content", name, "is", source)
-            self._seenContent(name, content, language)
-            self.conn.commit()
             logger.debug("Recorded", name, "in", time.time() - start, "seconds")
             return True
         logger.info(name, "already exists")
         return False
 
     def getContents(self, language):
-        return self.c.execute('''
+        return self._reader().execute('''
             SELECT name, content, jd
             FROM contents
             WHERE language=?''', (language,))
 
+    def _loadModifiers(self, language: str) -> dict[str, float]:
+        """Load all modifiers of a language into memory, once per session"""
+        if language not in self.modifiers:
+            cursor = self._reader().cursor()
+            cursor.execute('''
+                SELECT lemma, value
+                FROM modifiers
+                WHERE language=?''', (language,))
+            self.modifiers[language] = dict(cursor.fetchall())
+            logger.debug(f"Loaded {len(self.modifiers[language])} modifiers for {language}")
+        return self.modifiers[language]
+
     def getModifier(self, language, lemma) -> float:
-        self.c.execute('''
-            SELECT value
-            FROM modifiers
-            WHERE language=? AND lemma=?''', (language, lemma))
-        value = self.c.fetchone()
-        if value:
-            return cast(float, value[0])
-        else:
-            return 1.0
+        return self._loadModifiers(language).get(lemma, 1.0)
+
+    def getModifiers(self, language, lemmas) -> dict[str, float]:
+        "Get modifiers for many lemmas at once. Lemmas without a modifier get 1.0"
+        modifiers = self._loadModifiers(language)
+        return {lemma: modifiers.get(lemma, 1.0) for lemma in lemmas}
 
     def setModifier(self, language, lemma, value):
-        self.c.execute('''
-            INSERT OR REPLACE INTO modifiers(language, lemma, value)
-            VALUES(?,?,?)''', (language, lemma, value))
-        self.conn.commit()
+        with self._write_lock:
+            self.c.execute('''
+                INSERT OR REPLACE INTO modifiers(language, lemma, value)
+                VALUES(?,?,?)''', (language, lemma, value))
+            self.conn.commit()
+        self._loadModifiers(language)[lemma] = value
 
     def rebuildSeen(self):
-        self.c.execute("DELETE FROM seen_new")
-        self.c.execute('SELECT id, name, content, language, jd FROM contents')
-        for _, name, content, language, _ in self.c.fetchall():
-            self._seenContent(name, content, language)
-        self.conn.commit()
-        self.c.execute("VACUUM")
+        with self._write_lock:
+            self.c.execute("DELETE FROM seen_new")
+            self.c.execute('SELECT id, name, content, language, jd FROM contents')
+            for _, name, content, language, _ in self.c.fetchall():
+                self._seenContent(name, content, language)
+            self.conn.commit()
 
     def getSeen(self, language):
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         return cursor.execute('''
             SELECT lemma, count
             FROM seen_new
@@ -186,48 +417,79 @@ class Record():
             ''', (language,))
 
     def countSeen(self, language):
-        self.c.execute('''
+        return self._reader().execute('''
             SELECT SUM (count), COUNT (DISTINCT lemma)
             FROM seen_new
-            WHERE language=?''', (language,))
-        return self.c.fetchone()
+            WHERE language=?''', (language,)).fetchone()
 
     def deleteContent(self, name: str):
-        self.c.execute("""
-            DELETE FROM contents
-            WHERE name=?
-        """, (name,))
-        self.conn.commit()
-        self.c.execute("VACUUM")
+        with self._write_lock:
+            self.c.execute("""
+                DELETE FROM contents
+                WHERE name=?
+            """, (name,))
+            self.conn.commit()
 
     def deleteModifiers(self, langcode: str):
         "Drop all modifiers for given language"
-        self.c.execute("""
-            DELETE FROM modifiers
-            WHERE language=?
-        """, (langcode,))
-        self.conn.commit()
-        self.c.execute("VACUUM")
+        with self._write_lock:
+            self.c.execute("""
+                DELETE FROM modifiers
+                WHERE language=?
+            """, (langcode,))
+            self.conn.commit()
+        self.modifiers[langcode] = {}
 
     def recordLookup(self, lr: LookupRecord, timestamp: Optional[float] = None, commit: bool = True):
+        """
+        Record a lookup. With commit=True, it is handed to the writer thread and
+        committed shortly after. With commit=False, it is written in the current
+        transaction, which the caller must commit with commit().
+        """
         if timestamp is None:
             timestamp = time.time()
         sql = """INSERT OR IGNORE INTO lookups(timestamp, word, lemma, language, lemmatization, source, success)
                 VALUES(?,?,?,?,?,?,?)"""
-        self.c.execute(
-            sql,
-            (
-                timestamp,
-                lr.word,
-                lem_word(lr.word, lr.language),
-                lr.language,
-                True,
-                lr.source,
-                True
-            )
+        params = (
+            timestamp,
+            lr.word,
+            lem_word(lr.word, lr.language),
+            lr.language,
+            True,
+            lr.source,
+            True
         )
         if commit:
+            self.writer.put(sql, params)
+            return
+        with self._write_lock:
+            self.c.execute(sql, params)
+
+    def recordLookups(self, lookups: Iterable[tuple[LookupRecord, float]]) -> int:
+        """
+        Record many (lookup, timestamp) pairs in one transaction.
+        Each distinct word is only lemmatized once.
+        Returns the number of lookups that were not already recorded.
+        """
+        lookups = list(lookups)
+        start = time.time()
+        lemmas = {(lr.word, lr.language): "" for lr, _ in lookups}
+        for word, language in lemmas:
+            lemmas[(word, language)] = lem_word(word, language)
+        rows = [
+            (timestamp, lr.word, lemmas[(lr.word, lr.language)], lr.language, True, lr.source, True)
+            for lr, timestamp in lookups
+        ]
+        with self._write_lock:
+            changes_before = self.conn.total_changes
+            self.c.executemany(
+                """INSERT OR IGNORE INTO lookups(timestamp, word, lemma, language, lemmatization, source, success)
+                VALUES(?,?,?,?,?,?,?)""", rows)
             self.conn.commit()
+            inserted = self.conn.total_changes - changes_before
+        logger.debug(f"Recorded {inserted} of {len(rows)} lookups ({len(lemmas)} distinct words) "
+                     f"in {time.time() - start:.2f} seconds")
+        return inserted
 
     def recordNote(self, sn: SRSNote, content: str, commit: bool = True):
         timestamp = time.time()
@@ -235,45 +497,144 @@ class Record():
             timestamp, data, sentence, word, definition, definition2, pronunciation, image, tags, success
             )
             VALUES(?,?,?,?,?,?,?,?,?,?)"""
-        self.c.execute(sql,
-                       (
-                           timestamp,
-                           content,
-                           sn.sentence or "",
-                           sn.word or "",
-                           sn.definition1 or "",
-                           sn.definition2 or "",
-                           sn.audio_path or "",
-                           sn.image or "",
-                           " ".join(sn.tags) if sn.tags else "",
-                           1
-                       )
-                       )
+        params = (
+            timestamp,
+            content,
+            sn.sentence or "",
+            sn.word or "",
+            sn.definition1 or "",
+            sn.definition2 or "",
+            sn.audio_path or "",
+            sn.image or "",
+            " ".join(sn.tags) if sn.tags else "",
+            1
+        )
         if commit:
+            self.writer.put(sql, params)
+            return
+        with self._write_lock:
+            self.c.execute(sql, params)
+
+    def enqueueNotes(self, notes: Iterable[tuple[dict, SRSNote]], batch: str = "") -> int:
+        "Add (AnkiConnect note, note) pairs to the outbox. Returns the number of notes added"
+        rows = [(time.time(), json.dumps(content, ensure_ascii=False), json.dumps(asdict(sn), ensure_ascii=False), batch)
+                for content, sn in notes]
+        with self._write_lock:
+            self.c.executemany("INSERT INTO outbox(timestamp, content, note, batch) VALUES(?,?,?,?)", rows)
+            self.conn.commit()
+        return len(rows)
+
+    def getDueOutbox(self, limit: int) -> list[tuple[int, dict, SRSNote, int]]:
+        "Notes in the outbox that should be sent now, as (id, AnkiConnect note, note, attempts)"
+        rows = self._reader().execute("""
+            SELECT id, content, note, attempts FROM outbox
+            WHERE failed = 0 AND next_attempt <= ?
+            ORDER BY id LIMIT ?""", (time.time(), limit)).fetchall()
+        return [(id_, json.loads(content), SRSNote(**json.loads(note)), attempts)
+                for id_, content, note, attempts in rows]
+
+    def nextOutboxAttempt(self) -> Optional[float]:
+        "Time when the next pending note should be sent, None if there are none"
+        next_attempt: Optional[float] = self._reader().execute(
+            "SELECT MIN(next_attempt) FROM outbox WHERE failed = 0").fetchone()[0]
+        return next_attempt
+
+    def removeFromOutbox(self, ids: list[int]) -> None:
+        with self._write_lock:
+            self.c.executemany("DELETE FROM outbox WHERE id=?", [(id_,) for id_ in ids])
+            self.conn.commit()
+
+    def postponeOutbox(self, ids: list[int], delay: float, error: str) -> None:
+        "Try sending these notes again after delay seconds"
+        with self._write_lock:
+            self.c.executemany("UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, error = ? WHERE id=?",
+                               [(time.time() + delay, error, id_) for id_ in ids])
             self.conn.commit()
 
+    def failOutbox(self, id_: int, error: str) -> None:
+        "Mark a note that Anki refused, so that it is not sent again automatically"
+        with self._write_lock:
+            self.c.execute("UPDATE outbox SET attempts = attempts + 1, failed = 1, error = ? WHERE id=?", (error, id_))
+            self.conn.commit()
+
+    def retryFailedOutbox(self) -> None:
+        with self._write_lock:
+            self.c.execute("UPDATE outbox SET failed = 0, next_attempt = 0, attempts = 0 WHERE failed = 1")
+            self.conn.commit()
+
+    def discardFailedOutbox(self) -> None:
+        with self._write_lock:
+            self.c.execute("DELETE FROM outbox WHERE failed = 1")
+            self.conn.commit()
+
+    def allowDuplicateOutbox(self, id_: int) -> None:
+        "Send a note that Anki refused as a duplicate again, allowing the duplicate"
+        with self._write_lock:
+            row = self.c.execute("SELECT content FROM outbox WHERE id=?", (id_,)).fetchone()
+            if row is None:
+                return
+            content = json.loads(row[0])
+            content['options'] = {"allowDuplicate": True}
+            self.c.execute("UPDATE outbox SET content = ?, failed = 0, next_attempt = 0, attempts = 0 WHERE id=?",
+                           (json.dumps(content, ensure_ascii=False), id_))
+            self.conn.commit()
+
+    def getOutboxBatch(self, id_: int) -> Optional[str]:
+        "Batch of a note in the outbox, empty for notes added by hand. None if it is not in the outbox"
+        row = self._reader().execute("SELECT batch FROM outbox WHERE id=?", (id_,)).fetchone()
+        return row[0] if row else None
+
+    def countOutbox(self, batch: Optional[str] = None) -> tuple[int, int]:
+        "Number of pending and failed notes in the outbox, optionally only from one batch"
+        if batch is None:
+            row = self._reader().execute(
+                "SELECT COUNT(*) - COALESCE(SUM(failed), 0), COALESCE(SUM(failed), 0) FROM outbox").fetchone()
+        else:
+            row = self._reader().execute(
+                "SELECT COUNT(*) - COALESCE(SUM(failed), 0), COALESCE(SUM(failed), 0) FROM outbox WHERE batch=?",
+                (batch,)).fetchone()
+        return row[0], row[1]
+
+    def lastOutboxError(self) -> str:
+        row = self._reader().execute(
+            "SELECT error FROM outbox WHERE error IS NOT NULL ORDER BY failed DESC, id DESC LIMIT 1").fetchone()
+        return row[0] if row else ""
+
+    def outboxAudioPaths(self) -> set[str]:
+        "Local audio files of the notes in the outbox, which must be kept until the notes are sent"
+        paths = set()
+        for (note,) in self._reader().execute("SELECT note FROM outbox"):
+            audio_path = json.loads(note).get("audio_path")
+            if audio_path and not audio_path.startswith(("http://", "https://")):
+                paths.add(audio_path)
+        return paths
+
     def getAllLookups(self):
-        return self.c.execute("SELECT timestamp, word, lemma, language, lemmatization, source, success FROM lookups")
+        self.flush()
+        return self._reader().execute("SELECT timestamp, word, lemma, language, lemmatization, source, success FROM lookups")
 
     def getAllNotes(self):
-        return self.c.execute("SELECT * FROM notes")
+        self.flush()
+        return self._reader().execute("SELECT * FROM notes")
 
     def countLemmaLookups(self, word, language):
-        self.c.execute(
+        self.flush()
+        return self._reader().execute(
             '''SELECT COUNT (DISTINCT date(timestamp, "unixepoch")) FROM lookups WHERE lemma=?''',
             (lem_word(
                 word,
                 language),
-             ))
-        return self.c.fetchone()[0]
+             )).fetchone()[0]
 
     def countLookups(self, language):
-        cursor = self.conn.cursor()
+        self.flush()
+        cursor = self._reader().cursor()
         cursor.execute('''SELECT COUNT (*) FROM lookups WHERE language=?''', (language,))
         return cursor.fetchone()[0]
 
     def countAllLemmaLookups(self, language):
-        cursor = self.conn.cursor()
+        self.flush()
+        cursor = self._reader().cursor()
         return cursor.execute(
             '''SELECT lemma, COUNT (DISTINCT date(timestamp, "unixepoch"))
                FROM lookups
@@ -297,13 +658,13 @@ class Record():
             microsecond=0).timestamp()
         end = day.replace(hour=23, minute=59, second=59,
                           microsecond=999999).timestamp()
+        self.flush()
         try:
-            self.c.execute("""SELECT COUNT (DISTINCT word)
+            return self._reader().execute("""SELECT COUNT (DISTINCT word)
                             FROM lookups
                             WHERE timestamp
                             BETWEEN ? AND ?
-                            AND success = 1 """, (start, end))
-            return self.c.fetchone()[0]
+                            AND success = 1 """, (start, end)).fetchone()[0]
         except sqlite3.ProgrammingError:
             return -1
 
@@ -315,22 +676,22 @@ class Record():
             microsecond=0).timestamp()
         end = day.replace(hour=23, minute=59, second=59,
                           microsecond=999999).timestamp()
+        self.flush()
         try:
-            self.c.execute("""SELECT COUNT (timestamp)
+            return self._reader().execute("""SELECT COUNT (timestamp)
                             FROM notes
                             WHERE timestamp
                             BETWEEN ? AND ?
-                            AND success = 1 """, (start, end))
-            return self.c.fetchone()[0]
+                            AND success = 1 """, (start, end)).fetchone()[0]
         except sqlite3.ProgrammingError:
             return -1
 
     def purge(self):
-        self.c.execute("""
-        DROP TABLE IF EXISTS lookups,notes,contents,seen_new,seen
-        """)
-        self._createTables()
-        self.c.execute("VACUUM")
+        with self._write_lock:
+            self.c.execute("""
+            DROP TABLE IF EXISTS lookups,notes,contents,seen_new,seen
+            """)
+            self._createTables()
 
     def getKnownData(self) -> tuple[dict[str, WordRecord], KnownMetadata]:
         lifetime = settings.value('tracking/known_data_lifetime', 1800, type=int)  # Seconds
@@ -353,42 +714,116 @@ class Record():
                 return self.last_known_data
 
     @staticmethod
-    def process_notes_info(notes_info: dict,
-                           result: dict[str, WordRecord],
-                           tgt_key: str,
-                           ctx_key: str,
-                           fieldmap: dict[str, list[str]],
-                           langcode: str) -> tuple[list[str], list[str]]:
-        tgt_lemmas = []
-        ctx_lemmas = []
-        for info in notes_info:
-            model = info['modelName']
-            word_field, ctx_field = fieldmap.get(model) or ("<Ignore>", "<Ignore>")
-            word = ""
-            ctx = ""
-            lemma = ""
-            if word_field != "<Ignore>":
-                word = info['fields'][word_field]['value']
-            if ctx_field != "<Ignore>":
-                ctx = info['fields'][ctx_field]['value']
-            if word:
-                lemma = word  # word field is assumed to be already lemmatized
-                tgt_lemmas.append(lemma)
-                try:
-                    setattr(result[lemma], tgt_key, getattr(result[lemma], tgt_key) + 1)
-                except KeyError:
-                    result[lemma] = WordRecord(lemma=lemma, language=langcode, **{tgt_key: 1})
-            if ctx:
-                this_ctx_lemmas = set(map(lambda w: lem_word(w, langcode), re.sub(r"<.*?>", " ", ctx).split()))
-                if lemma:  # Don't count if already counted as word
-                    this_ctx_lemmas.discard(lemma)
-                for ctx_lemma in this_ctx_lemmas:
-                    ctx_lemmas.append(ctx_lemma)
-                    try:
-                        setattr(result[ctx_lemma], ctx_key, getattr(result[ctx_lemma], ctx_key) + 1)
-                    except KeyError:
-                        result[ctx_lemma] = WordRecord(lemma=ctx_lemma, language=langcode, **{ctx_key: 1})
-        return tgt_lemmas, ctx_lemmas
+    def extract_note_lemmas(info: dict,
+                            fieldmap: dict[str, list[str]],
+                            langcode: str) -> tuple[str, list[str]]:
+        """
+        Get the target lemma and the context lemmas of a note from its notesInfo.
+        The word field is assumed to be already lemmatized.
+        """
+        word_field, ctx_field = fieldmap.get(info['modelName']) or ("<Ignore>", "<Ignore>")
+        lemma = ""
+        ctx_lemmas: set[str] = set()
+        if word_field != "<Ignore>":
+            lemma = info['fields'][word_field]['value']
+        if ctx_field != "<Ignore>":
+            ctx = info['fields'][ctx_field]['value']
+            ctx_lemmas = set(map(lambda w: lem_word(w, langcode), re.sub(r"<.*?>", " ", ctx).split()))
+            if lemma:  # Don't count if already counted as word
+                ctx_lemmas.discard(lemma)
+        return lemma, sorted(ctx_lemmas)
+
+    @staticmethod
+    def apply_note_lemmas(result: dict[str, WordRecord],
+                          lemma: str,
+                          ctx_lemmas: list[str],
+                          tgt_key: str,
+                          ctx_key: str,
+                          langcode: str) -> None:
+        "Count the lemmas of one note into the known data"
+        if lemma:
+            try:
+                setattr(result[lemma], tgt_key, getattr(result[lemma], tgt_key) + 1)
+            except KeyError:
+                result[lemma] = WordRecord(lemma=lemma, language=langcode, **{tgt_key: 1})
+        for ctx_lemma in ctx_lemmas:
+            try:
+                setattr(result[ctx_lemma], ctx_key, getattr(result[ctx_lemma], ctx_key) + 1)
+            except KeyError:
+                result[ctx_lemma] = WordRecord(lemma=ctx_lemma, language=langcode, **{ctx_key: 1})
+
+    @staticmethod
+    def first_field_value(info: dict) -> str:
+        "Value of the first field of a note from its notesInfo, which Anki uses to detect duplicates"
+        fields = sorted(info['fields'].values(), key=lambda field: field.get('order', 0))
+        return fields[0]['value'] if fields else ""
+
+    def getAnkiFirstFields(self, model: str) -> list[tuple[int, str]]:
+        "(note id, first field value) of the cached notes of a note type"
+        return self._reader().execute(
+            "SELECT DISTINCT note_id, first_field FROM anki_notes WHERE model=? AND first_field IS NOT NULL",
+            (model,)).fetchall()
+
+    def getAnkiNoteLemmas(self,
+                          anki: Union[str, AnkiCollection],
+                          note_ids: list[int],
+                          fieldmap: dict[str, list[str]],
+                          langcode: str) -> dict[int, tuple[str, list[str]]]:
+        """
+        Get the target lemma and context lemmas of each note, from either
+        an AnkiConnect address or an open Anki collection.
+        Results are cached in the database along with each note's modification time,
+        so only notes that were added or changed since the last call are downloaded.
+        """
+        start = time.time()
+        if isinstance(anki, AnkiCollection):
+            get_mod_times, iter_notes_info = anki.notesModTime, anki.iterNotesInfo
+        else:
+            get_mod_times, iter_notes_info = partial(notesModTime, anki), partial(iterNotesInfo, anki)
+        try:
+            mod_times = get_mod_times(note_ids)
+        except Exception as e:
+            logger.warning(f"Could not get note modification times, cannot use the note cache: {repr(e)}")
+            mod_times = {}
+
+        wanted = set(note_ids)
+        lemmas: dict[int, tuple[str, list[str]]] = {}
+        unused = []
+        for note_id, mod, model, fields, tgt_lemma, ctx_lemmas, first_field in self._reader().execute(
+                """SELECT note_id, mod, model, fields, tgt_lemma, ctx_lemmas, first_field
+                FROM anki_notes WHERE language=?""",
+                (langcode,)):
+            if note_id not in wanted:
+                unused.append((note_id, langcode))
+            elif (mod is not None and mod == mod_times.get(note_id)
+                  and fields == json.dumps(fieldmap.get(model)) and first_field is not None):
+                lemmas[note_id] = (tgt_lemma, json.loads(ctx_lemmas))
+        stale = [note_id for note_id in note_ids if note_id not in lemmas]
+        logger.debug(f"{len(lemmas)} of {len(note_ids)} notes are cached, fetching {len(stale)}")
+
+        for notes_info in iter_notes_info(stale):
+            rows = []
+            for info in notes_info:
+                if not info:  # Note was deleted in the meantime
+                    continue
+                note_id = info['noteId']
+                tgt_lemma, ctx_lemmas = self.extract_note_lemmas(info, fieldmap, langcode)
+                lemmas[note_id] = (tgt_lemma, ctx_lemmas)
+                rows.append((note_id, langcode, info.get('mod', mod_times.get(note_id)), info['modelName'],
+                             json.dumps(fieldmap.get(info['modelName'])), tgt_lemma, json.dumps(ctx_lemmas),
+                             self.first_field_value(info)))
+            with self._write_lock:
+                self.c.executemany("""
+                    INSERT OR REPLACE INTO anki_notes(
+                        note_id, language, mod, model, fields, tgt_lemma, ctx_lemmas, first_field)
+                    VALUES(?,?,?,?,?,?,?,?)""", rows)
+                self.conn.commit()
+        if unused:
+            with self._write_lock:
+                self.c.executemany("DELETE FROM anki_notes WHERE note_id=? AND language=?", unused)
+                self.conn.commit()
+        logger.debug(f"Got lemmas of {len(lemmas)} notes in {time.time() - start:.2f} seconds")
+        return lemmas
 
     def _refreshKnownData(self) -> tuple[dict[str, WordRecord], KnownMetadata]:
 
@@ -424,43 +859,49 @@ class Record():
             return result, metadata
         fieldmap = json.loads(settings.value("tracking/fieldmap", "{}"))
 
-        anki_api = settings.value("anki_api", "http://127.0.0.1:8765")
-
-        mature_notes = findNotes(
-            anki_api,
-            settings.value("tracking/anki_query_mature")
-        )
-        young_notes = findNotes(
-            anki_api,
-            settings.value("tracking/anki_query_young")
-        )
-        young_notes = [note for note in young_notes if note not in mature_notes]
+        anki: Union[str, AnkiCollection] = settings.value("anki_api", "http://127.0.0.1:8765")
+        collection = None
+        if settings.value("tracking/source", "AnkiConnect") == "Collection file":
+            try:
+                collection = AnkiCollection(settings.value("tracking/anki_collection_path", ""))
+                mature_notes = collection.findNotes(settings.value("tracking/anki_query_mature"))
+                young_notes = collection.findNotes(settings.value("tracking/anki_query_young"))
+                anki = collection
+            except (OSError, sqlite3.Error, UnsupportedQuery) as e:
+                logger.warning(f"Cannot use the Anki collection for tracking, using AnkiConnect instead: {repr(e)}")
+                if collection is not None:
+                    collection.close()
+                    collection = None
+        if collection is None:
+            mature_notes = findNotes(
+                anki,
+                settings.value("tracking/anki_query_mature")
+            )
+            young_notes = findNotes(
+                anki,
+                settings.value("tracking/anki_query_young")
+            )
+        mature_note_ids = set(mature_notes)
+        young_notes = [note for note in young_notes if note not in mature_note_ids]
 
-        logger.debug(f"Received anki data from AnkiConnect in {time.time() - start:.2f} seconds")
+        logger.debug(f"Received anki data from {'collection' if collection else 'AnkiConnect'} "
+                     f"in {time.time() - start:.2f} seconds")
         start = time.time()
-        mature_notes_info = notesInfo(anki_api, mature_notes)
-        young_notes_info = notesInfo(anki_api, young_notes)
-
-        mature_tgt_lemmas, mature_ctx_lemmas = self.process_notes_info(
-            mature_notes_info,
-            result,
-            "anki_mature_tgt",
-            "anki_mature_ctx",
-            fieldmap,
-            langcode
-        )
-        young_tgt_lemmas, young_ctx_lemmas = self.process_notes_info(
-            young_notes_info,
-            result,
-            "anki_young_tgt",
-            "anki_young_ctx",
-            fieldmap,
-            langcode
-        )
-        metadata.n_mature_ctx = len(mature_ctx_lemmas)
-        metadata.n_mature_tgt = len(mature_tgt_lemmas)
-        metadata.n_young_ctx = len(young_ctx_lemmas)
-        metadata.n_young_tgt = len(young_tgt_lemmas)
+        try:
+            note_lemmas = self.getAnkiNoteLemmas(anki, mature_notes + young_notes, fieldmap, langcode)
+        finally:
+            if collection is not None:
+                collection.close()
+        for note_id in mature_notes:
+            lemma, ctx_lemmas = note_lemmas.get(note_id, ("", []))
+            self.apply_note_lemmas(result, lemma, ctx_lemmas, "anki_mature_tgt", "anki_mature_ctx", langcode)
+            metadata.n_mature_tgt += bool(lemma)
+            metadata.n_mature_ctx += len(ctx_lemmas)
+        for note_id in young_notes:
+            lemma, ctx_lemmas = note_lemmas.get(note_id, ("", []))
+            self.apply_note_lemmas(result, lemma, ctx_lemmas, "anki_young_tgt", "anki_young_ctx", langcode)
+            metadata.n_young_tgt += bool(lemma)
+            metadata.n_young_ctx += len(ctx_lemmas)
 
         logger.debug(f"Processed anki data in {time.time() - start:.2f} seconds")
 
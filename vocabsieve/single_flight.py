@@ -0,0 +1,39 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: while a call for a key is running, other callers
+    with the same key wait for it and get its result, or its exception, instead of
+    making the same call again. Results are not kept after the call finished.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            leader = key not in self._calls
+            if leader:
+                self._calls[key] = Future()
+            future = self._calls[key]
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def inFlight(self) -> int:
+        with self._lock:
+            return len(self._calls)
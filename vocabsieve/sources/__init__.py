@@ -3,4 +3,5 @@ from .local_freq_source import LocalFreqSource
 from .local_audio_source import LocalAudioSource
 from .local_dictionary_source import LocalDictionarySource
 from .wiktionary_source import WiktionarySource
+from .kaikki_file_source import KaikkiFileSource
 from .google_translate_source import GoogleTranslateSource
@@ -1,19 +1,25 @@
 # mypy: ignore-errors
 from ..cached_get import cached_get
+from ..http_cache import http_cache, CachedResponse
 from ..models import AudioSource, LemmaPolicy, AudioLookupResult
 
 from bs4 import BeautifulSoup
 from typing import List, Dict
-import requests
 from os import path
 import os
 import re
 import base64
+import json
 from urllib.parse import quote, unquote
 from dataclasses import dataclass
 from ..global_names import settings
 from loguru import logger
 
+# Parsed pronunciation lists are cached instead of the pages, which are large and slow
+# to parse. They are stored in the HTTP cache under the page URL with this extra header
+# and the language and audio format, so that they expire and are evicted like the pages would be.
+LIST_CACHE_HEADER = "X-Vocabsieve-Forvo-List"
+
 
 @dataclass
 class Pronunciation:
@@ -38,12 +44,11 @@ class Forvo:
     def __init__(self, word, lang, accent=""):
         self.url = "https://forvo.com/word/" + quote(word)
         self.pronunciations = []
-        self.session = requests.Session()
         self.language = lang
         self.accent = accent
 
     def get_pronunciations(self):
-        res = cached_get(self.url, forvo_headers=True)
+        res = cached_get(self.url, forvo_headers=True, cache=False)
         if res.status_code == 200:
             page = res.text
         else:
@@ -144,14 +149,17 @@ class Forvo:
 
 
 def fetch_audio_all(word: str, lang: str) -> dict[str, str]:
-    sounds = Forvo(word, lang).get_pronunciations().pronunciations
+    forvo = Forvo(word, lang)
+    cache_headers = {LIST_CACHE_HEADER: f"{lang}/{settings.value('audio_format', 'mp3')}"}
+    if (cached := http_cache.get(forvo.url, cache_headers)) is not None:
+        return cached.json()
+    sounds = forvo.get_pronunciations().pronunciations
     result: dict[str, str] = {}
-    if len(sounds) == 0:
-        return result
     for item in sounds:
         file_extension = item.download_url.rsplit(".", 1)[-1]
         accent = f"({item.accent})" if item.accent else ""
         result[f"{item.origin}{accent}/{item.headword}.{file_extension}"] = item.download_url
+    http_cache.put(forvo.url, CachedResponse(forvo.url, 200, json.dumps(result).encode(), "utf-8"), cache_headers)
     return result
 
 
@@ -0,0 +1,42 @@
+import json
+import threading
+from typing import Optional
+from loguru import logger
+from ..models import DictionarySource, SourceOptions, LookupResult
+from ..local_dictionary import dictdb
+from ..dictformats import kaikki_line_to_textdef
+from ..kaikki_index import open_dump, Dump
+
+
+class KaikkiFileSource(DictionarySource):
+    '''A Kaikki dump on disk, looked up through the offsets stored by dictdb.indexKaikki'''
+    INTERNET = False
+
+    def __init__(self, langcode: str, options: SourceOptions, dictname: str, path: str) -> None:
+        super().__init__(dictname, langcode, options)
+        self.path = path
+        self._dump: Optional[Dump] = None
+        # Lookups run on executor threads, which must not open the dump twice
+        self._lock = threading.Lock()
+
+    def _openDump(self) -> Dump:
+        "Open the dump on first use, so that a missing file only fails its lookups"
+        with self._lock:
+            if self._dump is None:
+                self._dump = open_dump(self.path)
+            return self._dump
+
+    def _lookup(self, word: str) -> LookupResult:
+        offsets = dictdb.kaikkiOffsets(word, self.langcode, self.name)
+        if not offsets:
+            return LookupResult(error=f"Word {word} not found in {self.name}")
+        try:
+            dump = self._openDump()
+            entries = [json.loads(dump.readLine(offset)) for offset in offsets]
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read {self.path}: {repr(e)}")
+            return LookupResult(error=repr(e))
+        if any(entry.get("word") != word for entry in entries):
+            return LookupResult(error=f"{self.path} changed since it was added, please add it again")
+        # Same format as imported Kaikki dumps
+        return LookupResult(definition="\n\n".join(kaikki_line_to_textdef(entry) for entry in entries))
@@ -1,4 +1,3 @@
-import requests
 from bs4 import BeautifulSoup
 from ..models import DictionarySource, SourceOptions, LookupResult
 from loguru import logger
@@ -1,10 +1,11 @@
 from functools import lru_cache
 import json
-import urllib.request
 import os
 import re
 import unicodedata
 from itertools import zip_longest, islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 import time
 
 from .constants import FORVO_HEADERS
@@ -24,7 +25,7 @@ from charset_normalizer import from_bytes, from_path
 from ebooklib import epub, ITEM_DOCUMENT
 from .sources import (WiktionarySource, GoogleTranslateSource,
                       LocalDictionarySource, LocalFreqSource,
-                      LocalAudioSource, ForvoAudioSource
+                      LocalAudioSource, ForvoAudioSource, KaikkiFileSource
                       )
 from .models import (LemmaPolicy, DisplayMode, SRSNote,
                      SourceOptions, DictionarySource, FreqSource, AnkiSettings,
@@ -34,6 +35,15 @@ from .models import (LemmaPolicy, DisplayMode, SRSNote,
 from .format import markdown_nop
 from .global_names import settings, logger
 from .local_dictionary import dictdb
+from .anki_connect import get_client
+
+
+# Number of notes requested in a single notesInfo call when fetching many notes
+NOTES_INFO_CHUNK_SIZE = 1000
+# Modification times are small, so many more can be requested at once
+NOTES_MOD_TIME_CHUNK_SIZE = 20000
+# Maximum number of notesInfo calls running at the same time
+NOTES_INFO_MAX_REQUESTS = 3
 
 
 def profile(func):
@@ -50,18 +60,12 @@ def request(action, **params):
 
 
 def invoke(action, server, **params):
-    requestJson = json.dumps(request(action, **params)).encode('utf-8')
-    with urllib.request.urlopen(urllib.request.Request(server, requestJson)) as response:
-        response = json.load(response)
-    if len(response) != 2:
-        raise Exception('response has an unexpected number of fields')
-    if 'error' not in response:
-        raise Exception('response is missing required error field')
-    if 'result' not in response:
-        raise Exception('response is missing required result field')
-    if response['error'] is not None:
-        raise Exception(response['error'])
-    return response['result']
+    return get_client(server).invoke(action, **params)
+
+
+def invokeMulti(server, calls: list[tuple[str, dict]]) -> list:
+    "Run several independent AnkiConnect actions in one request"
+    return get_client(server).multi(calls)
 
 
 def getDeckList(server) -> list:
@@ -79,6 +83,12 @@ def getFields(server, name) -> list:
     return list(result)
 
 
+def getFieldsOfModels(server, names: list[str]) -> dict[str, list]:
+    "Get the fields of many note types in a single request"
+    results = invokeMulti(server, [('modelFieldNames', {'modelName': name}) for name in names])
+    return {name: list(result) for name, result in zip(names, results)}
+
+
 def prepareAnkiNoteDict(anki_settings: AnkiSettings, note: SRSNote) -> dict:
     """
     Helper function to create a json to be sent to AnkiConnect
@@ -151,6 +161,34 @@ def notesInfo(server, notes):
     return invoke('notesInfo', server, notes=notes)
 
 
+def notesModTime(server, notes) -> dict[int, int]:
+    "Get the modification time of each note"
+    result = {}
+    for i in range(0, len(notes), NOTES_MOD_TIME_CHUNK_SIZE):
+        for item in invoke('notesModTime', server, notes=notes[i:i + NOTES_MOD_TIME_CHUNK_SIZE]):
+            result[item['noteId']] = item['mod']
+    return result
+
+
+def iterNotesInfo(server, notes, chunk_size=NOTES_INFO_CHUNK_SIZE, max_requests=NOTES_INFO_MAX_REQUESTS):
+    """
+    Yield notesInfo results in chunks of at most chunk_size notes, in order.
+    Up to max_requests chunks are fetched concurrently, so that the next chunks
+    are downloaded while the current one is processed, while the memory used
+    does not depend on the number of notes.
+    """
+    chunks = (notes[i:i + chunk_size] for i in range(0, len(notes), chunk_size))
+    with ThreadPoolExecutor(max_workers=max_requests) as executor:
+        pending: deque[Future] = deque()
+        for chunk in islice(chunks, max_requests):
+            pending.append(executor.submit(notesInfo, server, chunk))
+        while pending:
+            result = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(notesInfo, server, chunk))
+            yield result
+
+
 def getVersion(server) -> str:
     result = invoke('version', server)
     return str(result)
@@ -190,6 +228,11 @@ def findNotes(server, query):
     return invoke('findNotes', server, query=query)
 
 
+def escape_search(text: str) -> str:
+    "Escape text to be matched literally in an Anki search, for example in \"field:text\""
+    return re.sub(r'([\\"*_:])', r"\\\1", text)
+
+
 def findCards(server, query):
     return invoke('findCards', server, query=query)
 
@@ -434,8 +477,11 @@ def make_dict_source(src_name: str) -> DictionarySource:
             settings.value("gtrans_api", "https://lingva.lunar.icu"),
             settings.value("gtrans_lang", "en")
         )
-    else:  # Local, /TODO error handling
-        return LocalDictionarySource(langcode, options, src_name)
+    for item in json.loads(settings.value("custom_dicts", '[]')):
+        if item['name'] == src_name and item['type'] == "wiktindex":
+            return KaikkiFileSource(langcode, options, src_name, item['path'])
+    # Local, /TODO error handling
+    return LocalDictionarySource(langcode, options, src_name)
 
 
 def compute_word_score(wr: WordRecord, waw: WordActionWeights):
@@ -4,13 +4,17 @@ from PyQt5.QtWidgets import QStyle
 from typing import Optional
 
 from ..audio_player import AudioPlayer
+from ..audio_cache import prefetch_audios
 from ..global_names import MOD, settings
-from ..models import AudioDefinition, AudioSourceGroup, Definition
-import threading
+from ..models import AudioDefinition, AudioSource, AudioSourceGroup, Definition
+from ..lookup_executor import lookup_executor
+from functools import partial
+from concurrent.futures import Future
+from loguru import logger
 
 
 class AudioSelector(QListWidget):
-    audio_fetched = pyqtSignal(AudioDefinition)
+    audio_fetched = pyqtSignal(int, AudioDefinition)  # generation, definition
 
     def __init__(self) -> None:
         super().__init__()
@@ -30,7 +34,12 @@ class AudioSelector(QListWidget):
         self.current_audio_path = ""
         self.audios: dict[str, str] = {}
         self.sg: Optional[AudioSourceGroup] = None
-        self.audio_fetched.connect(self.appendDefinition)
+        # Each lookup has a new generation, and results of older generations are dropped
+        self.generation = 0
+        self.pending_lookups: list[Future] = []
+        self.pending_downloads: list[Future] = []
+        self.audio_fetched.connect(self.receiveDefinition)
+        self.audio_player.played.connect(self.onPlayed)
         self.connect_signals()
 
     def setSourceGroup(self, sg: AudioSourceGroup) -> None:
@@ -41,10 +50,25 @@ class AudioSelector(QListWidget):
             return []
         return self.sg.define(word)
 
-    def lookup_on_thread(self, word: str):
-        self.clear()
-        for definition in self.getDefinitions(word):
-            self.audio_fetched.emit(definition)
+    def lookup_in_source(self, generation: int, source: AudioSource, word: str):
+        "Runs on a lookup executor thread"
+        if generation != self.generation:
+            return
+        try:
+            definitions = source.define(word)
+        except Exception as e:
+            logger.error(f"Failed to look up audio for {word} in {source.name}: {repr(e)}")
+            return
+        for definition in definitions:
+            self.audio_fetched.emit(generation, definition)
+
+    def receiveDefinition(self, generation: int, defi: AudioDefinition):
+        if generation == self.generation:
+            if defi.audios:
+                # Started before the first item is selected and played
+                self.pending_downloads.extend(
+                    prefetch_audios(defi.audios, settings.value("target_language", "en")))
+            self.appendDefinition(defi)
 
     def appendDefinition(self, defi: AudioDefinition):
         if defi.audios is None:
@@ -56,23 +80,25 @@ class AudioSelector(QListWidget):
         super().clear()
         self.audios = {}
         self.current_audio_path = ""
+        # Audio that is still downloading is not played anymore
+        self.audio_player.waiting_for = ""
 
     def lookup(self, word: str):
-        # check if all sources are online
+        self.clear()
+        self.generation += 1
+        for future in self.pending_lookups + self.pending_downloads:
+            future.cancel()
+        self.pending_lookups = []
+        self.pending_downloads = []
         if self.sg is not None:
-            all_online = all(not source.INTERNET for source in self.sg.sources)
-            if all_online:
-                # Use threads only if all online because sqlite cursor
-                # can't be accessed from multiple threads
-                threading.Thread(
-                    target=self.lookup_on_thread,
-                    args=(word,)).start()
-            else:
-                self.lookup_on_thread(word)
+            for source in self.sg.sources:
+                self.pending_lookups.append(lookup_executor.submitLookup(
+                    source, partial(self.lookup_in_source, self.generation, source, word)))
 
     def play_audio_if_exists(self, x):
         if x is not None:
             audio_name = x.text()[2:]
+            # Online files are added to notes by URL until the local copy is played, see onPlayed
             self.current_audio_path = self.audios.get(audio_name, "")
             self.play_audio(audio_name)
         else:
@@ -97,7 +123,12 @@ class AudioSelector(QListWidget):
         if name is None:
             return
 
-        self.audio_path = self.audio_player.play_audio(name, self.audios, settings.value("target_language", "en"))
+        self.audio_player.play_audio(name, self.audios, settings.value("target_language", "en"))
+
+    def onPlayed(self, path: str) -> None:
+        "The selected file is available locally"
+        if self.current_audio_path:
+            self.current_audio_path = path
 
     def connect_signals(self):
         self.currentItemChanged.connect(self.play_audio_if_exists)
@@ -125,6 +125,7 @@ class MainWindowBase(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.stats_label = QLabel()
+        self.outbox_label = QLabel()
 
         self.single_word = QCheckBox("Single word lookups")
         self.single_word.setToolTip(
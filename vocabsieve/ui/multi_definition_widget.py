@@ -1,14 +1,17 @@
 from PyQt5.QtGui import QWheelEvent
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout
-from PyQt5.QtCore import Qt, pyqtSignal, QThread, QObject, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 
 from .searchable_text_edit import SearchableTextEdit
 from ..models import Definition, DisplayMode, DictionarySource
 from ..tools import process_defi_anki, apply_word_rules
 from loguru import logger
-from typing import Optional
+from typing import Callable, Optional
 import time
 from ..global_names import MOD
+from ..lookup_executor import lookup_executor
+from concurrent.futures import Future
+from functools import partial
 
 
 DEFAULT_PLACEHOLDER_TEXT = f"Look up a word by double clicking it or by selecting it, then pressing {MOD}+D.\nUse Shift-{MOD}+D to look up the word without lemmatization."
@@ -45,34 +48,27 @@ class ButtonsBoxWidget(QWidget):
         event.accept()
 
 
-class LookupWorker(QObject):
-    got_definitions = pyqtSignal(list)
-    finished = pyqtSignal()
-
-    def __init__(self, source: DictionarySource, word: str, no_lemma: bool, rules: list[tuple[str, str]]):
-        super().__init__()
-        self.source = source
-        self.word = word
-        self.no_lemma = no_lemma
-        self.rules = rules
-
-    def run(self):
-        start = time.time()
-        definitions = self.source.define(self.word, no_lemma=self.no_lemma)
-        any_definitions = any(defi.definition is not None for defi in definitions)
-        if not any_definitions and self.rules:
-            logger.info(f"No definitions found for {self.word} in {self.source.name}, applying word rules")
-            definitions = self.source.define(
-                apply_word_rules(self.word, self.rules),
-                no_lemma=self.no_lemma
-            )
-        self.got_definitions.emit(definitions)
-        logger.debug(f"LookupWorker: looked up {self.word} in {self.source.name} in {time.time()-start:.2f} seconds")
-        self.finished.emit()
+def define_with_rules(source: DictionarySource, word: str, no_lemma: bool,
+                      rules: list[tuple[str, str]],
+                      superseded: Callable[[], bool] = lambda: False) -> list[Definition]:
+    """Look up a word, and if nothing is found, the word with the word rules applied.
+    The second lookup is skipped if superseded() returns True"""
+    start = time.time()
+    definitions = source.define(word, no_lemma=no_lemma)
+    any_definitions = any(defi.definition is not None for defi in definitions)
+    if not any_definitions and rules and not superseded():
+        logger.info(f"No definitions found for {word} in {source.name}, applying word rules")
+        definitions = source.define(
+            apply_word_rules(word, rules),
+            no_lemma=no_lemma
+        )
+    logger.debug(f"Looked up {word} in {source.name} in {time.time()-start:.2f} seconds")
+    return definitions
 
 
 class MultiDefinitionWidget(SearchableTextEdit):
     nextDefinitionScrollTransitionCounter = 0
+    got_definitions = pyqtSignal(int, list)  # generation, definitions
 
     def __init__(self, word_widget: Optional[QLineEdit] = None):
         super().__init__()
@@ -102,8 +98,11 @@ class MultiDefinitionWidget(SearchableTextEdit):
         prev_button.clicked.connect(self.back)
         next_button.clicked.connect(self.forward)
 
-        self.threads: list[QThread] = []
-        self.workers: list[LookupWorker] = []
+        # Results arrive from the lookup executor's threads. Each lookup has a new generation,
+        # and results of older generations are dropped.
+        self.generation = 0
+        self.pending_lookups: list[Future] = []
+        self.got_definitions.connect(self.receiveDefinitions)
 
     def wheelEvent(self, event):
         if self.verticalScrollBar().value() == self.verticalScrollBar().minimum() and event.angleDelta().y() > 0:
@@ -131,6 +130,11 @@ class MultiDefinitionWidget(SearchableTextEdit):
 
     def lookup(self, word: str, no_lemma: bool, rules: list[tuple[str, str]]):
         self.reset()
+        self.generation += 1
+        # Lookups of the previous word that have not started yet are not needed anymore
+        for future in self.pending_lookups:
+            future.cancel()
+        self.pending_lookups = []
         self.current_target = word
         logger.debug(f"Looking up {word} in {self.sources}")
         for source in self.sources:
@@ -138,23 +142,32 @@ class MultiDefinitionWidget(SearchableTextEdit):
 
     def _lookup_in_source(self, source: DictionarySource, word: str,
                           no_lemma: bool, rules: list[tuple[str, str]]) -> None:
+        generation = self.generation
         if source.INTERNET:
-            lookup_thread = QThread()
-            lookup_worker = LookupWorker(source, word, no_lemma, rules)
-            lookup_worker.moveToThread(lookup_thread)
-            lookup_thread.started.connect(lookup_worker.run)
-            lookup_worker.got_definitions.connect(self.appendDefinition)
-            lookup_worker.finished.connect(lookup_thread.quit)
-            lookup_worker.finished.connect(lookup_worker.deleteLater)
-            lookup_thread.finished.connect(lookup_thread.deleteLater)
-            lookup_thread.start()
-
-            # Keep references to avoid garbage collection, otherwise this crashes
-            self.threads.append(lookup_thread)
-            self.workers.append(lookup_worker)
-
-        else:  # Local source, no thread
-            self.appendDefinition(source.define(word, no_lemma=no_lemma))
+            lookup = partial(define_with_rules, source, word, no_lemma, rules, lambda: generation != self.generation)
+        else:  # Local sources are only looked up once, they run one at a time on the local queue
+            lookup = partial(source.define, word, no_lemma=no_lemma)
+        future = lookup_executor.submitLookup(source, lookup)
+        future.add_done_callback(partial(self._emitDefinitions, generation, source, word))
+        self.pending_lookups.append(future)
+
+    def _emitDefinitions(self, generation: int, source: DictionarySource, word: str, future: Future) -> None:
+        "Called on a lookup executor thread when a lookup finished"
+        if future.cancelled():
+            return
+        try:
+            definitions = future.result()
+        except Exception as e:
+            logger.error(f"Failed to look up {word} in {source.name}: {repr(e)}")
+            definitions = [Definition(headword=word, source=source.name, error=repr(e), lookup_term=word)]
+        self.got_definitions.emit(generation, definitions)
+
+    @pyqtSlot(int, list)
+    def receiveDefinitions(self, generation: int, definitions: list[Definition]):
+        if generation != self.generation:
+            logger.debug(f"Dropping {len(definitions)} definitions of a superseded lookup")
+            return
+        self.appendDefinition(definitions)
 
     @pyqtSlot(list)
     def appendDefinition(self, definitions: list[Definition]):
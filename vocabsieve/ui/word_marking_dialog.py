@@ -25,7 +25,7 @@ class TogglableLabel(QLabel):
         self.modifier = 1.0
         self.known = False
 
-    def setText(self, text: str):
+    def setText(self, text: str, modifier: Optional[float] = None):
         self.score = compute_word_score(
             self.known_data.get(
                 text,
@@ -40,7 +40,7 @@ class TogglableLabel(QLabel):
             "tracking/known_threshold_cognate",
             25,
             type=int)  # type: ignore
-        self.modifier = self.rec.getModifier(self.langcode, text)
+        self.modifier = modifier if modifier is not None else self.rec.getModifier(self.langcode, text)
         self.known = False
         stylesheet = "border: 2px solid transparent; border-radius: 5px; padding: 4px;"
         if self.score >= self.threshold * self.modifier:
@@ -117,9 +117,11 @@ class WordGridWidget(QWidget):
     def update(self):
         offset = (self.page - 1) * self.page_size
         self.index_offset_label.setText(f"<b>Rank {offset}</b>")
+        page_words = self.words[offset:offset + self.page_size]
+        modifiers = self.rec.getModifiers(settings.value("target_language", "en"), page_words)
         for i in range(self.page_size):
             try:
-                self.word_labels[i].setText(self.words[offset + i])
+                self.word_labels[i].setText(page_words[i], modifiers[page_words[i]])
             except IndexError:
                 self.word_labels[i].setText("")
         self.parent_.counter.setText(f"{self.page}/{self.last_page}")